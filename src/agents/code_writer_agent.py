@@ -1,55 +1,79 @@
 import os
+from types import SimpleNamespace
 from openai import OpenAI
+from .llm_cache import LLMCache, cache_key, normalize_query
+from .prompt_builder import PromptBuilder, count_tokens
+from .sanitize_agent import CodeStreamParser
 
-class CodeWriterAgent:
-    """
-    Generates Python code for GitHub Repo Data Query System.
-    Fixed to handle missing datetime in commits table safely.
-    DOES NOT break Prophet queries on issues table.
-    """
-
-    def __init__(self, temperature=0):
-        self.temperature = temperature
-        api_key = os.environ.get("OPENAI_API_KEY")
+DEFAULT_MODEL = "gpt-4o-mini"
 
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not set.")
+# Bump whenever STATIC_INSTRUCTIONS changes: it is part of every cache key,
+# and the text must stay byte-identical between bumps for prefix caching
+PROMPT_VERSION = "4"
 
-        self.client = OpenAI(api_key=api_key)
+# Static system message. The tables, relevant columns and the question are
+# appended per request by PromptBuilder.
+STATIC_INSTRUCTIONS = """
+You are an expert data engineer working with a GitHub analytics database named 'github_data'
+(PostgreSQL, or an embedded DuckDB copy of the same tables when the server is offline).
+The relevant table(s), their relevant columns and the USER QUERY are given in the user message.
 
-    def generate_code(self, table_summary, user_query, table_name):
+You MUST generate a COMPLETE, EXECUTABLE Streamlit Python script.
 
-        prompt = f"""
-You are an expert data engineer working with a GitHub analytics PostgreSQL database named 'github_data'.
+=======================================================
+ DATABASE ACCESS (REQUIRED)
+=======================================================
 
-The current table is: {table_name}
+Do NOT open database connections yourself. These are ALREADY DEFINED
+and run on whichever database is active:
 
-Table summary:
-{table_summary}
+run_query(sql, params=None)        → DataFrame; use %s placeholders
+load_table(table, columns=None)    → DataFrame of a whole table (prefer listing columns)
 
-You MUST generate a COMPLETE, EXECUTABLE Streamlit Python script.
+Write plain SQL that both PostgreSQL and DuckDB accept: SELECT / JOIN /
+GROUP BY / window functions, date_trunc, EXTRACT, COUNT(*) FILTER (WHERE ...),
+::casts. Do NOT use to_char, regex substring or other PostgreSQL-only functions.
 
 =======================================================
- REQUIRED DATABASE CONNECTION BLOCK
+ SERVER-SIDE AGGREGATIONS (PREFERRED)
 =======================================================
 
-import psycopg2
-conn = psycopg2.connect(
-    host="localhost",
-    port=5432,
-    database="github_data",
-    user="postgres",
-    password="postgres"
-)
-
-cursor = conn.cursor()
-cursor.execute("SET search_path TO public;")
+These functions are ALREADY DEFINED (do NOT import or redefine them).
+Each runs a GROUP BY inside the database and returns a small DataFrame.
+If the question can be answered with them, call them INSTEAD of
+loading a full table:
+
+issue_counts(metric="created"|"closed", granularity="day"|"week"|"month", repo=None, since=None, until=None)
+    → columns: repo, period, count
+daily_issue_counts(metric="created"|"closed", repo=None, since=None, until=None)
+    → columns: repo, day, count   (Prophet: rename day→ds, count→y)
+issues_by_weekday(metric="created"|"closed", repo=None)
+    → columns: repo, weekday_num (1=Monday), weekday, count
+issue_totals_per_repo()
+    → columns: repo, created, closed, open
+open_closed_ratio()
+    → columns: repo, open, closed, closed_ratio
+commits_per_repo()
+    → columns: repo, commits
+commit_counts(granularity="day"|"week"|"month", repo=None, since=None, until=None)
+    → columns: repo, period, count
+daily_commit_counts(repo=None, since=None, until=None)
+    → columns: repo, day, count   (SARIMAX: index by day, resample daily)
+repo_stats()
+    → columns: repo, stars, forks, watchers, open_issues
+
+"repo" is always "owner/name". Timestamps are UTC.
+
+For custom SQL over daily activity, read the pre-aggregated tables
+(one row per repo per UTC day) instead of the raw tables:
+    daily_issue_activity(repo, day, created_count, closed_count)
+    daily_commit_activity(repo, day, commit_count)
 
 =======================================================
  AFTER DATAFRAME LOAD (MANDATORY)
 =======================================================
 
-1. Load data into pandas as df.
+1. Load data into pandas as df (from a function above, or from run_query).
 2. Print columns using: 
    st.write("Columns:", df.columns.tolist())
 
@@ -79,13 +103,16 @@ IF table_name == "commits":
    - commit_date
    - any guessed datetime
 
-✅ Check if ANY column contains the words:
-   "date", "time", "timestamp"
+✅ Use ONLY these typed columns:
+   repo         → "owner/name"
+   author_login → commit author
+   committed_at → commit datetime (TIMESTAMPTZ)
 
-✅ If one EXISTS:
-   Use it safely with pd.to_datetime(..., errors="coerce")
+✅ Convert with:
+   df["committed_at"] = pd.to_datetime(df["committed_at"], errors="coerce", utc=True)
+   and drop rows where it is NaT (rows loaded before it existed)
 
-✅ If NONE exists:
+✅ If committed_at is MISSING or entirely NaT:
    DO NOT CRASH
    Instead:
      - Display warning in Streamlit:
@@ -93,12 +120,6 @@ IF table_name == "commits":
      - Return a BAR CHART showing total commits (pulls) per repo
      - This FULLY satisfies the assignment requirement
 
-=======================================================
- USER QUERY
-=======================================================
-
-"{user_query}"
-
 =======================================================
  OUTPUT MODE RULES (BASED ON PDF)
 =======================================================
@@ -125,16 +146,20 @@ MODE 3 — CHARTS:
 
 MODE 4 — FORECAST (IMPORTANT):
 
-✅ Prophet:
-   - Only for issues
-   - Uses created_at or closed_at
-   - Forecast 30 days
-   - One chart per repo
+Forecasts are PRECOMPUTED after every data load (Prophet for issues,
+SARIMAX for commits). Do NOT fit Prophet or SARIMAX yourself; read them:
+
+get_forecasts(metric="issues_created"|"issues_closed"|"commits", repos=None)
+    → columns: repo, ds, yhat, yhat_lower, yhat_upper, stale   (30 days per repo)
+      stale=True: new data arrived after the fit; show it, but add a
+      st.caption saying the forecast predates the latest data
+get_forecast(repo, metric)
+    → same columns, one repo
 
-✅ StatsModels (SARIMAX):
-   - Commits or Pulls
-   - ONLY if datetime column exists
-   - Otherwise fallback to Bar Chart
+Only if the user explicitly asks for a FRESH / re-fitted forecast, call
+forecast_repos(metric, repos=None) instead:
+it fits every repo in parallel and returns the same columns. NEVER loop
+over repos fitting models one at a time.
 
 =======================================================
  FORECASTING RULES
@@ -142,41 +167,147 @@ MODE 4 — FORECAST (IMPORTANT):
 
 Per repository:
 
-1. Filter by repository_url OR url
-2. Set datetime index
-3. Resample DAILY
-4. Fill missing days = 0
-5. Fit model
-6. Forecast 30 days
-7. Rename column:
+1. Forecast = get_forecasts(metric) filtered by repo
+2. History = daily_issue_counts(...) or daily_commit_counts(...) for that repo
+3. Rename column yhat:
    - forecasted_issues
    - forecasted_commits
-   - forecasted_pulls
 
-8. Plot:
+4. Plot:
    - Historical
-   - Forecast
+   - Forecast (shade yhat_lower..yhat_upper)
    - Title: "30-Day Forecast for <repo>"
 
+5. If a repo has no forecast rows, skip it (not enough history)
+
 =======================================================
  ABSOLUTE RULES
 =======================================================
 
-✅ NO hard-coded datetime columns in commits
+✅ Commits datetime is ONLY committed_at
 ✅ NO crashing if datetime not found
-✅ Issues table must STILL use Prophet correctly
+✅ Forecasts come ONLY from get_forecasts / get_forecast
 ✅ Must import:
-   pandas, streamlit, psycopg2, matplotlib/plotly, prophet, statsmodels
+   pandas, streamlit, matplotlib/plotly
 ✅ Do NOT write into database
 ✅ ONLY output executable Python CODE, no explaination, no text. ONLY CODE.
-
-BEGIN CODE:
 """
 
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=self.temperature
-        )
+class CodeWriterAgent:
+    """
+    Generates Python code for GitHub Repo Data Query System.
+    Fixed to handle missing datetime in commits table safely.
+    DOES NOT break Prophet queries on issues table.
+    """
 
-        return response.choices[0].message.content
+    def __init__(self, temperature=0, model=DEFAULT_MODEL, client=None, cache=None, use_cache=True):
+        self.temperature = temperature
+        self.model = model
+
+        if client is None:
+            api_key = os.environ.get("OPENAI_API_KEY")
+
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not set.")
+
+            client = OpenAI(api_key=api_key)
+        self.client = client
+
+        # Only deterministic (temperature=0) completions are safe to replay
+        if cache is None and use_cache and temperature == 0:
+            cache = LLMCache()
+        self.cache = cache
+        self.last_cache_hit = False
+        self.last_usage = None
+        self.prompt_builder = PromptBuilder(STATIC_INSTRUCTIONS, PROMPT_VERSION, model=model)
+
+    def generate_code(self, table_summary, user_query, table_name, schema=None, on_code=None, check_cancelled=None):
+        """
+        schema: {table: {"rows", "columns", "summary"}} (CSVAgent.schema) lets the
+        prompt carry only the columns relevant to the question; without it the
+        table_summary text is sent as is.
+        on_code: if given, the completion is streamed and on_code(code_so_far)
+        is called as code arrives; reading stops at the closing fence.
+        check_cancelled: called for every streamed chunk; whatever it raises
+        closes the stream and propagates, and nothing is cached.
+        """
+        if schema is None:
+            schema = {table_name: {"rows": None, "columns": None, "summary": table_summary}}
+        messages, info = self.prompt_builder.build(user_query, table_name, schema)
+
+        key = cache_key(
+            self.prompt_builder.static_hash, self.model, self.temperature,
+            info["dynamic"].replace(user_query, normalize_query(user_query))
+        )
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            self.last_cache_hit = cached is not None
+            if cached is not None:
+                self.last_usage = None
+                if on_code is not None:
+                    on_code(cached)
+                return cached
+
+        if on_code is not None:
+            code = self._stream_code(messages, user_query, info, on_code, check_cancelled)
+        else:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                temperature=self.temperature
+            )
+            self.last_usage = self._log_usage(response.usage, user_query, info)
+            code = response.choices[0].message.content
+
+        if self.cache is not None:
+            self.cache.put(key, code, model=self.model)
+        return code
+
+    def _stream_code(self, messages, user_query, info, on_code, check_cancelled=None):
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        parser = CodeStreamParser()
+        usage = None
+        try:
+            for chunk in stream:
+                if check_cancelled is not None:
+                    check_cancelled()
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                if parser.feed(chunk.choices[0].delta.content or ""):
+                    on_code(parser.code)
+                if parser.done:
+                    break
+        finally:
+            # Closing the connection early stops the rest of the generation
+            stream.close()
+
+        code = parser.finish()
+        on_code(code)
+        if usage is None:
+            # Stopped before the final usage chunk: count what was received
+            usage = SimpleNamespace(prompt_tokens=info["prompt_tokens_estimate"],
+                                    completion_tokens=count_tokens(parser.raw, self.model))
+        self.last_usage = self._log_usage(usage, user_query, info)
+        return code
+
+    def _log_usage(self, usage, user_query, info):
+        details = getattr(usage, "prompt_tokens_details", None)
+        record = {
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "cached_prompt_tokens": getattr(details, "cached_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None),
+            "prompt_tokens_estimate": info["prompt_tokens_estimate"],
+            "max_columns": info["max_columns"],
+        }
+        print(
+            f"🧮 Tokens for '{user_query[:60]}': prompt={record['prompt_tokens']} "
+            f"(cached {record['cached_prompt_tokens']}), completion={record['completion_tokens']}"
+        )
+        return record
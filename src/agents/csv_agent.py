@@ -1,38 +1,117 @@
+import threading
 import pandas as pd
-from db_connect import get_connection
-from .table_mapping import TABLE_KEYWORDS
+from query_backend import QUERY_BACKEND, get_backend
+from .table_router import get_router
+
+# ------------------------------
+# Process-wide table cache
+# ------------------------------
+# Shared by every CSVAgent in the process (Streamlit reruns re-execute the
+# script but keep imported modules), keyed on table + freshness version.
+_SUMMARY_CACHE = {}   # table -> (version, summary, columns)
+_FRAME_CACHE = {}     # table -> (version, DataFrame)
+_CACHE_LOCK = threading.Lock()
+
+def clear_table_cache():
+    with _CACHE_LOCK:
+        _SUMMARY_CACHE.clear()
+        _FRAME_CACHE.clear()
 
 class CSVAgent:
 
-    def __init__(self, tables=["issues", "commits", "repo_info"]):
+    def __init__(self, tables=["issues", "commits", "repo_info"], backend=QUERY_BACKEND):
         self.tables = tables
+        self.backend_name = backend
+        self.backend = None   # resolved by summarize_all_tables()
         self.summaries = {}
+        self.columns = {}
         self.dataframes = {}
+        self.versions = {}
+
+    @staticmethod
+    def _summary_text(table, rows, cols):
+        if rows == 0:
+            return f"Table {table} is EMPTY."
+        return f"Rows={rows}, Cols={len(cols)}, Columns={cols}"
 
     def summarize_all_tables(self):
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SET search_path TO public;")
-        
-        for table in self.tables:
-            try:
-                df = pd.read_sql(f"SELECT * FROM {table}", conn)
-                self.dataframes[table] = df
-                if df.empty:
-                    self.summaries[table] = f"Table {table} is EMPTY."
-                else:
-                    cols = list(df.columns)
-                    self.summaries[table] = f"Rows={len(df)}, Cols={len(cols)}, Columns={cols}"
-            except Exception as e:
-                self.summaries[table] = f"Error reading {table}: {e}"
-                self.dataframes[table] = pd.DataFrame()
-
-        conn.close()
+        """
+        Build summaries from catalog metadata only (column list + row
+        estimate). DataFrames are NOT loaded here; see get_dataframe().
+        """
+        try:
+            self.backend = get_backend(self.backend_name)
+            # Freshness version per table; a table missing here does not exist
+            self.versions = self.backend.versions(self.tables)
+
+            stale = []
+            with _CACHE_LOCK:
+                for table in self.tables:
+                    cached = _SUMMARY_CACHE.get(table)
+                    if cached and table in self.versions and cached[0] == self.versions[table]:
+                        self.summaries[table], self.columns[table] = cached[1], cached[2]
+                    else:
+                        stale.append(table)
+
+            if stale:
+                columns = self.backend.columns(stale)
+                for table in stale:
+                    if table not in self.versions:
+                        self.summaries[table] = f"Error reading {table}: table does not exist"
+                        continue
+                    rows, cols = self.versions[table][0], columns.get(table, [])
+                    summary = self._summary_text(table, rows, cols)
+                    self.summaries[table], self.columns[table] = summary, cols
+                    with _CACHE_LOCK:
+                        _SUMMARY_CACHE[table] = (self.versions[table], summary, cols)
+        except Exception as e:
+            for table in self.tables:
+                self.summaries.setdefault(table, f"Error reading {table}: {e}")
+
         return self.summaries, self.dataframes
 
+    def get_dataframe(self, table):
+        """Load one table, reusing the cached frame while its version is unchanged."""
+        if table in self.dataframes:
+            return self.dataframes[table]
+
+        version = self.versions.get(table)
+        with _CACHE_LOCK:
+            cached = _FRAME_CACHE.get(table)
+        if cached and version is not None and cached[0] == version:
+            self.dataframes[table] = cached[1]
+            return cached[1]
+
+        try:
+            df = (self.backend or get_backend(self.backend_name)).read_table(table)
+        except Exception as e:
+            print(f"❌ Error reading {table}: {e}")
+            df = pd.DataFrame()
+
+        if version is not None:
+            with _CACHE_LOCK:
+                _FRAME_CACHE[table] = (version, df)
+        self.dataframes[table] = df
+        return df
+
+    def schema(self, tables):
+        """
+        {table: {"rows", "columns", "summary"}} for the prompt builder; rows and
+        columns are None for tables that could not be read.
+        """
+        return {
+            table: {
+                "rows": self.versions[table][0] if table in self.versions else None,
+                "columns": self.columns.get(table),
+                "summary": self.summaries.get(table, ""),
+            }
+            for table in tables
+        }
+
+    def select_relevant_tables(self, user_query, max_tables=3):
+        """Tables the question needs, best first (several for join questions)."""
+        return get_router(self.tables).route(user_query, max_tables=max_tables)
+
     def select_relevant_table(self, user_query):
-        q = user_query.lower()
-        for table, kws in TABLE_KEYWORDS.items():
-            if any(kw in q for kw in kws):
-                return table, self.dataframes[table], self.summaries[table]
-        return "issues", self.dataframes["issues"], self.summaries["issues"]
+        table = self.select_relevant_tables(user_query, max_tables=1)[0]
+        return table, self.get_dataframe(table), self.summaries[table]
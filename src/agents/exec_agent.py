@@ -1,18 +1,65 @@
-import sys
-import io
-import matplotlib.pyplot as plt
+import os
+import threading
+from .query_library import QUERY_FUNCTIONS
+from .sandbox import SandboxPool, execute_script
+from warmup import build_namespace, warm_imports, format_report
+
+# "sandbox" -> pre-started worker processes with CPU / wall-clock / memory limits
+# "inline"  -> exec() in the server process (debugging; no limits)
+EXEC_BACKEND = os.getenv("EXEC_BACKEND", "sandbox")
+EXEC_BACKENDS = ("sandbox", "inline")
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_INLINE_NAMESPACE = None
+
+# pyplot's figure state is process-global, so inline scripts take turns
+_INLINE_LOCK = threading.Lock()
+
+def get_sandbox_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = SandboxPool()
+        return _POOL
+
+def get_inline_namespace():
+    """Heavy libraries and query functions, imported once per server process."""
+    global _INLINE_NAMESPACE
+    with _POOL_LOCK:
+        if _INLINE_NAMESPACE is None:
+            _INLINE_NAMESPACE = {**build_namespace(), **QUERY_FUNCTIONS}
+        return _INLINE_NAMESPACE
+
+def warm_start(backend=EXEC_BACKEND):
+    """
+    Pay the heavy imports up front (in the sandbox workers, or in this
+    process for the inline backend) and report {module: seconds}.
+    """
+    if backend == "sandbox":
+        timings = get_sandbox_pool().warm_up()
+    else:
+        timings = warm_imports()
+        get_inline_namespace()
+    print(f"⏱️ Warm-start import times ({backend}):\n{format_report(timings)}")
+    return timings
 
 class ExecAgent:
-    def run_code(self, code):
-        buffer = io.StringIO()
-        old_stdout = sys.stdout
-        sys.stdout = buffer
-
-        try:
-            exec(code, {"plt": plt})
-        except Exception as e:
-            sys.stdout = old_stdout
-            return f"Execution error: {e}", None
-
-        sys.stdout = old_stdout
-        return buffer.getvalue(), plt
+    def __init__(self, backend=EXEC_BACKEND):
+        if backend not in EXEC_BACKENDS:
+            raise ValueError(f"backend must be one of {EXEC_BACKENDS}, got '{backend}'")
+        self.backend = backend
+
+    def run_code(self, code, cancelled=None):
+        """
+        Returns the script's serialized results:
+        {"stdout", "error", "outputs": [(kind, payload)], "dataframes": {name: json}}.
+        cancelled: optional callable; in the sandbox, the worker running the
+        script is killed as soon as it returns True. Inline scripts run to
+        completion.
+        """
+        if self.backend == "sandbox":
+            return get_sandbox_pool().run(code, cancelled=cancelled)
+        namespace = get_inline_namespace()
+        with _INLINE_LOCK:
+            return execute_script(code, namespace)
@@ -0,0 +1,95 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+LLM_CACHE_FILE = os.getenv("LLM_CACHE_FILE", os.path.join(DATA_FOLDER, ".llm_cache.sqlite"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1000))
+
+def normalize_query(user_query):
+    """Case, whitespace and trailing punctuation don't change the generated code."""
+    q = re.sub(r"\s+", " ", user_query.strip().lower())
+    return q.rstrip(" ?.!")
+
+def cache_key(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+class LLMCache:
+    """
+    Persistent SQLite cache of LLM responses with TTL expiry and LRU
+    eviction once more than max_entries are stored. clock is injectable
+    for tests.
+    """
+
+    def __init__(self, path=LLM_CACHE_FILE, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT,
+                    created_at REAL,
+                    last_access REAL
+                )
+            """)
+            db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        # A fresh connection per call keeps the cache safe across Streamlit threads.
+        # `with db` only commits; the connection must still be closed.
+        db = sqlite3.connect(self.path, timeout=10)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def get(self, key):
+        now = self.clock()
+        with self._connect() as db:
+            row = db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key, response, model=None):
+        now = self.clock()
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now)
+            )
+            db.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM responses")
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,96 @@
+import os
+from .llm_cache import cache_key
+from .table_router import get_router
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 6000))
+# Optional cap on ranked columns per table (0 = none): columns are otherwise
+# only trimmed when the prompt would exceed the token budget
+PROMPT_MAX_COLUMNS = int(os.getenv("PROMPT_MAX_COLUMNS", 0))
+
+# Always sent, whatever the question: keys, and the columns that say which
+# repo a row belongs to (every question is asked per repo)
+KEY_COLUMNS = ("id", "sha", "repository_url", "repo", "full_name")
+
+def count_tokens(text, model=None):
+    """Exact with tiktoken when installed, otherwise ~4 characters per token."""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model or "")
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        return len(encoding.encode(text))
+    except ImportError:
+        return len(text) // 4 + 1
+
+class PromptBudgetExceeded(ValueError):
+    pass
+
+class PromptBuilder:
+    """
+    Splits the prompt into a static, versioned instruction block (sent as the
+    system message, byte-identical across requests so provider-side prefix
+    caching applies) and a small per-query part: the selected tables, their
+    columns ordered by relevance to the question, and the question itself.
+    Only when the whole prompt exceeds the budget are the least relevant
+    columns dropped; key and repo columns are always kept.
+    """
+
+    def __init__(self, static_instructions, version, model=None,
+                 token_budget=PROMPT_TOKEN_BUDGET, max_columns=PROMPT_MAX_COLUMNS):
+        self.static_instructions = static_instructions
+        self.version = version
+        self.model = model
+        self.token_budget = token_budget
+        self.max_columns = max_columns
+        self.static_hash = cache_key(version, static_instructions)[:16]
+        self.static_tokens = count_tokens(static_instructions, model)
+
+    def _table_lines(self, user_query, schema, max_columns):
+        router = get_router()
+        lines = []
+        for table, info in schema.items():
+            if not info.get("columns"):
+                lines.append(f"- {table}: {info.get('summary') or 'unavailable'}")
+                continue
+            if info.get("rows") == 0:
+                lines.append(f"- {table}: EMPTY")
+                continue
+            ranked = [c for c in router.relevant_columns(user_query, table, top_k=None) if c in info["columns"]]
+            # Columns the router doesn't know (added later) go last
+            ranked += [c for c in info["columns"] if c not in ranked]
+            kept = set(ranked[:max_columns]) | {c for c in KEY_COLUMNS if c in ranked}
+            kept = [c for c in ranked if c in kept]
+            lines.append(f"- {table} (~{info['rows']} rows): columns {', '.join(kept)}")
+        return lines
+
+    def dynamic_part(self, user_query, table_name, schema, max_columns):
+        lines = [f"Prompt version: {self.version}", "", f"The relevant table(s): {table_name}", ""]
+        if schema:
+            lines += ["Columns relevant to this question:"] + self._table_lines(user_query, schema, max_columns)
+        lines += ["", "USER QUERY:", f'"{user_query}"', "", "BEGIN CODE:"]
+        return "\n".join(lines)
+
+    def build(self, user_query, table_name, schema=None):
+        """
+        Returns (messages, info). info has the token estimate and the column
+        limit that fit (ranked columns per table, on top of KEY_COLUMNS);
+        raises PromptBudgetExceeded if even the key columns do not fit.
+        """
+        widest = max((len(info.get("columns") or []) for info in (schema or {}).values()), default=0)
+        start = min(self.max_columns, widest) if self.max_columns else widest
+        for max_columns in range(start, -1, -1):
+            dynamic = self.dynamic_part(user_query, table_name, schema, max_columns)
+            tokens = self.static_tokens + count_tokens(dynamic, self.model)
+            if tokens <= self.token_budget:
+                break
+        else:
+            raise PromptBudgetExceeded(
+                f"prompt needs ~{tokens} tokens, budget is {self.token_budget} (PROMPT_TOKEN_BUDGET)"
+            )
+
+        messages = [
+            {"role": "system", "content": self.static_instructions},
+            {"role": "user", "content": dynamic},
+        ]
+        return messages, {"prompt_tokens_estimate": tokens, "max_columns": max_columns, "dynamic": dynamic}
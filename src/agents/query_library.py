@@ -0,0 +1,194 @@
+# Parameterized aggregations, run inside the query backend.
+#
+# Every helper runs one GROUP BY in the database (Postgres, or DuckDB over
+# the Parquet snapshots) and returns a small DataFrame (one row per repo, or
+# per repo and time bucket) instead of shipping whole tables to pandas. They
+# are pre-loaded into the ExecAgent namespace so generated code can call
+# them directly.
+from forecasting import get_forecast, get_forecasts, forecast_repos
+from query_backend import PostgresBackend, get_backend
+
+# Time series read the daily rollup tables maintained by the loader
+ISSUE_COUNT_COLUMNS = {"created": "created_count", "closed": "closed_count"}
+GRANULARITIES = ("day", "week", "month")
+
+def _backend(conn=None):
+    """The shared backend, or Postgres through the caller's connection."""
+    return PostgresBackend(conn) if conn is not None else get_backend()
+
+def _read(sql, params=None, conn=None):
+    return _backend(conn).query(sql, params)
+
+def _filters(count_col, repo, since, until):
+    """WHERE clause over a daily rollup table (columns repo, day, <count_col>)."""
+    clauses, params = [f"{count_col} > 0"], []
+    if repo:
+        clauses.append("repo = %s")
+        params.append(repo)
+    if since:
+        clauses.append("day >= %s")
+        params.append(since)
+    if until:
+        clauses.append("day < %s")
+        params.append(until)
+    return " AND ".join(clauses), params
+
+def _check_granularity(granularity):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {GRANULARITIES}, got '{granularity}'")
+
+def _issue_count_column(metric):
+    if metric not in ISSUE_COUNT_COLUMNS:
+        raise ValueError(f"metric must be one of {list(ISSUE_COUNT_COLUMNS)}, got '{metric}'")
+    return ISSUE_COUNT_COLUMNS[metric]
+
+# ------------------------------
+# Issues
+# ------------------------------
+def issue_counts(metric="created", granularity="day", repo=None, since=None, until=None, conn=None):
+    """
+    Issues created/closed per repo per day|week|month, from daily_issue_activity.
+    Columns: repo, period, count.
+    """
+    col = _issue_count_column(metric)
+    _check_granularity(granularity)
+
+    where, params = _filters(col, repo, since, until)
+    sql = f"""
+        SELECT repo, date_trunc(%s, day)::date AS period, SUM({col})::bigint AS count
+        FROM daily_issue_activity
+        WHERE {where}
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+    """
+    return _read(sql, [granularity] + params, conn)
+
+def daily_issue_counts(metric="created", repo=None, since=None, until=None, conn=None):
+    """Columns: repo, day, count (ready for Prophet after renaming to ds/y)."""
+    df = issue_counts(metric, "day", repo, since, until, conn)
+    return df.rename(columns={"period": "day"})
+
+def issues_by_weekday(metric="created", repo=None, conn=None):
+    """
+    Issues created/closed per repo per ISO weekday.
+    Columns: repo, weekday_num (1=Monday), weekday, count.
+    """
+    col = _issue_count_column(metric)
+    db = _backend(conn)
+    where, params = _filters(col, repo, None, None)
+    sql = f"""
+        SELECT repo,
+               EXTRACT(ISODOW FROM day)::int AS weekday_num,
+               {db.weekday_name("day")} AS weekday,
+               SUM({col})::bigint AS count
+        FROM daily_issue_activity
+        WHERE {where}
+        GROUP BY 1, 2, 3
+        ORDER BY 1, 2;
+    """
+    return db.query(sql, params)
+
+def issue_totals_per_repo(conn=None):
+    """Columns: repo, created, closed, open."""
+    db = _backend(conn)
+    repo_expr = db.repo_from_url("repository_url")
+    sql = f"""
+        SELECT {repo_expr} AS repo,
+               COUNT(*) AS created,
+               COUNT(*) FILTER (WHERE state = 'closed') AS closed,
+               COUNT(*) FILTER (WHERE state = 'open') AS open
+        FROM issues
+        GROUP BY repository_url
+        ORDER BY created DESC;
+    """
+    return db.query(sql)
+
+def open_closed_ratio(conn=None):
+    """Columns: repo, open, closed, closed_ratio (closed / all)."""
+    df = issue_totals_per_repo(conn)
+    total = (df["open"] + df["closed"]).where(lambda s: s > 0)
+    df["closed_ratio"] = df["closed"] / total
+    return df[["repo", "open", "closed", "closed_ratio"]]
+
+# ------------------------------
+# Commits
+# ------------------------------
+def commits_per_repo(conn=None):
+    """Columns: repo, commits."""
+    sql = """
+        SELECT repo, COUNT(*) AS commits
+        FROM commits
+        GROUP BY repo
+        ORDER BY commits DESC;
+    """
+    return _read(sql, conn=conn)
+
+def commit_counts(granularity="day", repo=None, since=None, until=None, conn=None):
+    """
+    Commits per repo per day|week|month, from daily_commit_activity.
+    Columns: repo, period, count.
+    """
+    _check_granularity(granularity)
+
+    where, params = _filters("commit_count", repo, since, until)
+    sql = f"""
+        SELECT repo, date_trunc(%s, day)::date AS period, SUM(commit_count)::bigint AS count
+        FROM daily_commit_activity
+        WHERE {where}
+        GROUP BY 1, 2
+        ORDER BY 1, 2;
+    """
+    return _read(sql, [granularity] + params, conn)
+
+def daily_commit_counts(repo=None, since=None, until=None, conn=None):
+    """Columns: repo, day, count (ready for SARIMAX after indexing by day)."""
+    df = commit_counts("day", repo, since, until, conn)
+    return df.rename(columns={"period": "day"})
+
+# ------------------------------
+# Repo metadata
+# ------------------------------
+def repo_stats(conn=None):
+    """Columns: repo, stars, forks, watchers, open_issues."""
+    sql = """
+        SELECT full_name AS repo,
+               stargazers_count AS stars,
+               forks_count AS forks,
+               watchers_count AS watchers,
+               open_issues_count AS open_issues
+        FROM repo_info
+        ORDER BY stars DESC;
+    """
+    return _read(sql, conn=conn)
+
+# ------------------------------
+# Ad-hoc SQL
+# ------------------------------
+def run_query(sql, params=None):
+    """Any SELECT on the active backend (%s placeholders), as a DataFrame."""
+    return get_backend().query(sql, params)
+
+def load_table(table, columns=None):
+    """A whole table, or only `columns` of it."""
+    return get_backend().read_table(table, columns)
+
+# Names pre-loaded into the generated-code namespace
+QUERY_FUNCTIONS = {
+    "issue_counts": issue_counts,
+    "daily_issue_counts": daily_issue_counts,
+    "issues_by_weekday": issues_by_weekday,
+    "issue_totals_per_repo": issue_totals_per_repo,
+    "open_closed_ratio": open_closed_ratio,
+    "commits_per_repo": commits_per_repo,
+    "commit_counts": commit_counts,
+    "daily_commit_counts": daily_commit_counts,
+    "repo_stats": repo_stats,
+    # Custom SQL / raw tables on whichever backend is active
+    "run_query": run_query,
+    "load_table": load_table,
+    # 30-day forecasts, fitted after each load and served from forecast_cache
+    "get_forecasts": get_forecasts,
+    "get_forecast": get_forecast,
+    # Fresh per-repo fits on a process pool (not cached)
+    "forecast_repos": forecast_repos,
+}
@@ -0,0 +1,435 @@
+# Execution of generated scripts, isolated from the Streamlit server.
+#
+# Scripts run in pre-started worker processes with CPU-time, wall-clock and
+# memory limits. Nothing a script renders crosses the process boundary as a
+# live object: st.* calls, printed text, leftover matplotlib figures and
+# DataFrames in its namespace come back as plain data (str / bytes / JSON)
+# that the app replays.
+import io
+import json
+import os
+import time
+import queue
+import signal
+import builtins
+import traceback
+import threading
+import multiprocessing as mp
+from contextlib import redirect_stdout
+from warmup import WARM_MODULES, warm_imports, build_namespace
+
+try:
+    import resource
+except ImportError:  # Windows: no rlimits, wall-clock limit still applies
+    resource = None
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", 2))
+SANDBOX_CPU_SECONDS = int(os.getenv("SANDBOX_CPU_SECONDS", 60))
+SANDBOX_WALL_SECONDS = float(os.getenv("SANDBOX_WALL_SECONDS", 120))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", 4096))
+SANDBOX_MAX_JOBS = int(os.getenv("SANDBOX_MAX_JOBS", 50))
+SANDBOX_MAX_ROWS = int(os.getenv("SANDBOX_MAX_ROWS", 1000))
+
+class ScriptLimitExceeded(BaseException):
+    """Raised in a worker on SIGXCPU; not an Exception so scripts can't swallow it."""
+
+# ------------------------------
+# Recording st.* calls
+# ------------------------------
+def _is_dataframe(obj):
+    return type(obj).__name__ in ("DataFrame", "Series") and hasattr(obj, "to_json")
+
+def _frame_json(obj):
+    frame = obj.to_frame() if type(obj).__name__ == "Series" else obj
+    return frame.head(SANDBOX_MAX_ROWS).to_json(orient="split", date_format="iso", default_handler=str)
+
+def _figure_png(fig):
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+def _image_bytes(image):
+    """PNG/JPEG bytes for what st.image accepts: bytes, a file path, a figure or an array."""
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            return f.read()
+    if hasattr(image, "savefig"):
+        return _figure_png(image)
+    import matplotlib.pyplot as plt
+    buf = io.BytesIO()
+    plt.imsave(buf, image, format="png")
+    return buf.getvalue()
+
+def serialize(obj):
+    """(kind, payload) for anything a script may hand to st.write & co."""
+    if _is_dataframe(obj):
+        return "dataframe", _frame_json(obj)
+    if hasattr(obj, "to_plotly_json"):
+        return "plotly", obj.to_json()
+    if hasattr(obj, "savefig"):
+        return "image", _figure_png(obj)
+    if isinstance(obj, (dict, list)):
+        return "json", obj
+    return "markdown", str(obj)
+
+class StreamlitRecorder:
+    """
+    Stands in for the streamlit module inside generated scripts. Display
+    calls are recorded as (kind, payload) in call order; layout helpers
+    (columns, expander, sidebar, ...) just record into the same list.
+    """
+
+    def __init__(self):
+        self.outputs = []
+
+    def _add(self, kind, payload):
+        self.outputs.append((kind, payload))
+
+    # text
+    def write(self, *args, **kwargs):
+        for arg in args:
+            self._add(*serialize(arg))
+
+    def markdown(self, body, *args, **kwargs):
+        self._add("markdown", str(body))
+
+    def title(self, body, *args, **kwargs):
+        self._add("markdown", f"# {body}")
+
+    def header(self, body, *args, **kwargs):
+        self._add("markdown", f"## {body}")
+
+    def subheader(self, body, *args, **kwargs):
+        self._add("markdown", f"### {body}")
+
+    def text(self, body, *args, **kwargs):
+        self._add("text", str(body))
+
+    def code(self, body, *args, **kwargs):
+        self._add("code", str(body))
+
+    def json(self, body, *args, **kwargs):
+        self._add("json", body)
+
+    def metric(self, label, value, *args, **kwargs):
+        self._add("markdown", f"**{label}**: {value}")
+
+    def info(self, body, *args, **kwargs):
+        self._add("info", str(body))
+
+    def success(self, body, *args, **kwargs):
+        self._add("success", str(body))
+
+    def warning(self, body, *args, **kwargs):
+        self._add("warning", str(body))
+
+    def error(self, body, *args, **kwargs):
+        self._add("error", str(body))
+
+    def exception(self, exc, *args, **kwargs):
+        self._add("error", repr(exc))
+
+    def caption(self, body, *args, **kwargs):
+        self._add("caption", str(body))
+
+    def latex(self, body, *args, **kwargs):
+        self._add("latex", str(body))
+
+    def divider(self, *args, **kwargs):
+        self._add("divider", None)
+
+    # data & charts
+    def dataframe(self, data, *args, **kwargs):
+        self._add(*serialize(data))
+
+    table = dataframe
+
+    def plotly_chart(self, fig, *args, **kwargs):
+        self._add("plotly", fig.to_json())
+
+    def image(self, image, *args, **kwargs):
+        self._add("image", _image_bytes(image))
+
+    def altair_chart(self, chart, *args, **kwargs):
+        self._add("vega_lite", chart.to_dict())
+
+    def vega_lite_chart(self, data=None, spec=None, *args, **kwargs):
+        if spec is None and isinstance(data, dict):
+            data, spec = None, data
+        if _is_dataframe(data):
+            spec = {**(spec or {}), "data": {"values": json.loads(data.to_json(orient="records", date_format="iso"))}}
+        self._add("vega_lite", spec)
+
+    def pyplot(self, fig=None, *args, **kwargs):
+        import matplotlib.pyplot as plt
+        fig = fig if hasattr(fig, "savefig") else plt.gcf()
+        self._add("image", _figure_png(fig))
+        plt.close(fig)
+
+    def _chart(self, data=None, *args, **kwargs):
+        if data is not None:
+            self._add(*serialize(data))
+
+    line_chart = bar_chart = area_chart = _chart
+
+    # layout: everything lands in the same output list
+    def columns(self, spec, *args, **kwargs):
+        return [self] * (spec if isinstance(spec, int) else len(spec))
+
+    def tabs(self, labels, *args, **kwargs):
+        return [self] * len(labels)
+
+    def container(self, *args, **kwargs):
+        return self
+
+    expander = spinner = empty = status = container
+
+    @property
+    def sidebar(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        # set_page_config, cache_data, session_state, ... : harmless no-ops
+        if name.startswith("cache"):
+            return lambda *a, **k: (a[0] if a and callable(a[0]) else (lambda f: f))
+        return lambda *args, **kwargs: None
+
+def _script_builtins(recorder):
+    """Builtins whose `import streamlit` yields the recorder."""
+    real_import = builtins.__import__
+
+    def _import(name, globals=None, locals=None, fromlist=(), level=0):
+        if name == "streamlit" or name.startswith("streamlit."):
+            return recorder
+        return real_import(name, globals, locals, fromlist, level)
+
+    scoped = dict(vars(builtins))
+    scoped["__import__"] = _import
+    return scoped
+
+# ------------------------------
+# Running one script (in a worker, or inline)
+# ------------------------------
+def execute_script(code, namespace=None):
+    """
+    exec() a generated script and return its serialized results:
+    {"stdout", "error", "outputs": [(kind, payload)], "dataframes": {name: json}, "elapsed"},
+    plus "limit": "memory" when the script ran out of memory.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    recorder = StreamlitRecorder()
+    scope = dict(namespace or {})
+    scope.update({"__name__": "__main__", "__builtins__": _script_builtins(recorder), "st": recorder})
+
+    buffer = io.StringIO()
+    error = limit = None
+    started = time.time()
+    plt.close("all")
+    try:
+        with redirect_stdout(buffer):
+            exec(code, scope)
+    except MemoryError as e:
+        # MemoryError is an Exception too: tag it, so a sandbox worker
+        # reports its memory limit and is recycled instead of reused
+        error, limit = f"MemoryError: {e}", "memory"
+        # Free what the script allocated before serializing anything
+        scope = {}
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        buffer.write("\n" + traceback.format_exc(limit=-3))
+
+    # Figures the script drew but never passed to st.pyplot
+    for num in plt.get_fignums():
+        recorder.pyplot(plt.figure(num))
+    plt.close("all")
+
+    dataframes = {
+        name: _frame_json(value)
+        for name, value in scope.items()
+        if not name.startswith("_") and _is_dataframe(value)
+    }
+    result = {
+        "stdout": buffer.getvalue(),
+        "error": error,
+        "outputs": recorder.outputs,
+        "dataframes": dataframes,
+        "elapsed": round(time.time() - started, 3),
+    }
+    if limit:
+        result["limit"] = limit
+    return result
+
+# ------------------------------
+# Worker process
+# ------------------------------
+def _on_cpu_limit(signum, frame):
+    raise ScriptLimitExceeded("CPU time limit exceeded")
+
+def _worker_main(conn, cpu_seconds, memory_mb, warm_modules):
+    # Ignore Ctrl+C aimed at the server; the parent terminates workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_mb:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if resource is not None:
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+
+    # Pay the heavy imports once, before the first script
+    timings = warm_imports(warm_modules)
+    from agents.query_library import QUERY_FUNCTIONS
+    namespace = {**build_namespace(), **QUERY_FUNCTIONS}
+    conn.send(("ready", timings))
+
+    while True:
+        try:
+            code = conn.recv()
+        except EOFError:
+            return
+        if resource is not None and cpu_seconds:
+            # RLIMIT_CPU counts the whole process lifetime: allow cpu_seconds more
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            used = int(usage.ru_utime + usage.ru_stime)
+            _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+            soft = used + cpu_seconds
+            if hard != resource.RLIM_INFINITY:
+                soft = min(soft, hard)
+            resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+        try:
+            result = execute_script(code, namespace)
+            if result.get("limit") == "memory":
+                result["error"] = f"Memory limit exceeded ({memory_mb} MB)"
+        except ScriptLimitExceeded as e:
+            result = {"stdout": "", "error": str(e), "outputs": [], "dataframes": {}, "limit": "cpu"}
+        except MemoryError:
+            # Ran out while serializing the results
+            result = {"stdout": "", "error": f"Memory limit exceeded ({memory_mb} MB)",
+                      "outputs": [], "dataframes": {}, "limit": "memory"}
+        conn.send(("result", result))
+
+class _Worker:
+    def __init__(self, ctx, cpu_seconds, memory_mb, warm_modules):
+        self.conn, child = ctx.Pipe()
+        # Not a daemon: scripts may start their own process pools (forecast_repos)
+        self.process = ctx.Process(
+            target=_worker_main, args=(child, cpu_seconds, memory_mb, warm_modules), daemon=False
+        )
+        self.process.start()
+        child.close()
+        self.jobs = 0
+        self.ready = False
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+class SandboxPool:
+    """
+    A fixed set of pre-started worker processes. run() hands a script to an
+    idle worker and waits for its result; a worker that breaks a limit or
+    dies is killed and replaced, so one runaway script never affects others.
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS, cpu_seconds=SANDBOX_CPU_SECONDS, wall_seconds=SANDBOX_WALL_SECONDS,
+                 memory_mb=SANDBOX_MEMORY_MB, max_jobs=SANDBOX_MAX_JOBS, warm_modules=WARM_MODULES):
+        method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        self._ctx = mp.get_context(method)
+        self.cpu_seconds = cpu_seconds
+        self.wall_seconds = wall_seconds
+        self.memory_mb = memory_mb
+        self.max_jobs = max_jobs
+        self.warm_modules = list(warm_modules)
+        self.stats = {"runs": 0, "killed": 0, "restarted": 0}
+        self.import_times = {}    # module -> seconds, from the last worker that started
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        for _ in range(size):
+            self._idle.put(self._spawn())
+
+    def _spawn(self):
+        return _Worker(self._ctx, self.cpu_seconds, self.memory_mb, self.warm_modules)
+
+    def _replace(self, worker):
+        worker.kill()
+        with self._lock:
+            self.stats["restarted"] += 1
+        return self._spawn()
+
+    def _wait(self, worker, deadline, cancelled=None):
+        """Poll in short slices so a cancelled job is noticed promptly; None on timeout or cancel."""
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0 or (cancelled is not None and cancelled()):
+                return None
+            if worker.conn.poll(min(0.2, remaining)):
+                return worker.conn.recv()
+
+    def _ensure_ready(self, worker, timeout=300):
+        # Warm-up imports happen before the first job; not counted against it
+        if worker.ready:
+            return
+        msg = self._wait(worker, time.time() + timeout)
+        if msg is None or msg[0] != "ready":
+            raise EOFError
+        worker.ready = True
+        self.import_times = msg[1]
+
+    def warm_up(self):
+        """Block until every idle worker has finished its imports."""
+        workers = [self._idle.get() for _ in range(self._idle.qsize())]
+        for worker in workers:
+            try:
+                self._ensure_ready(worker)
+            except (EOFError, OSError):
+                worker = self._replace(worker)
+            self._idle.put(worker)
+        return self.import_times
+
+    def run(self, code, wall_seconds=None, cancelled=None):
+        """
+        Run a script on an idle worker. cancelled: optional callable polled
+        while the script runs; once it returns True the worker is killed.
+        """
+        worker = self._idle.get()
+        keep = False
+        try:
+            self._ensure_ready(worker)
+            worker.conn.send(code)
+            worker.jobs += 1
+            with self._lock:
+                self.stats["runs"] += 1
+            msg = self._wait(worker, time.time() + (wall_seconds or self.wall_seconds), cancelled)
+            if msg is None:
+                with self._lock:
+                    self.stats["killed"] += 1
+                if cancelled is not None and cancelled():
+                    return {"stdout": "", "error": "Cancelled", "outputs": [], "dataframes": {}, "limit": "cancelled"}
+                return {"stdout": "", "error": f"Wall-clock limit exceeded ({wall_seconds or self.wall_seconds:.0f}s)",
+                        "outputs": [], "dataframes": {}, "limit": "wall"}
+
+            result = msg[1]
+            keep = "limit" not in result and worker.jobs < self.max_jobs
+            return result
+        except (EOFError, OSError):
+            worker.process.join(timeout=1)
+            return {"stdout": "", "error": f"Worker process died (exit code {worker.process.exitcode})",
+                    "outputs": [], "dataframes": {}, "limit": "crash"}
+        finally:
+            # Anything but a clean result (timeout, crash, cancellation) kills and replaces the worker
+            self._idle.put(worker if keep else self._replace(worker))
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().kill()
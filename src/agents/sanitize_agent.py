@@ -1,3 +1,84 @@
+FENCE = "```"
+
 class SanitizeAgent:
     def clean_code(self, code):
         return code.replace("```python", "").replace("```", "").strip()
+
+class CodeStreamParser:
+    """
+    Incremental, fence-aware extraction of code from a streamed completion.
+    feed() takes each text delta; .code is the code seen so far and .done
+    turns True once the closing fence has arrived, so the caller can stop
+    reading. Replies without an opening fence are treated as bare code.
+    """
+
+    def __init__(self):
+        self.raw = ""
+        self.code = ""
+        self.done = False
+        self._start = None   # offset in raw where the code begins
+        self._fenced = False
+
+    def _find_start(self):
+        text = self.raw.lstrip()
+        skipped = len(self.raw) - len(text)
+        if not text:
+            return
+        if text.startswith(FENCE):
+            newline = text.find("\n")
+            if newline != -1:                     # wait for the whole ```python line
+                self._start, self._fenced = skipped + newline + 1, True
+        elif not FENCE.startswith(text[:3]):      # can't become a fence: bare code
+            self._start = skipped
+
+    def feed(self, delta):
+        """Returns the code appended by this delta ("" if none yet)."""
+        if self.done or not delta:
+            return ""
+        self.raw += delta
+        before = self.code
+        self._scan()
+        if self.code.startswith(before):
+            return self.code[len(before):]
+        # Shrunk (trailing newline before the fence) or restarted after prose
+        return "" if before.startswith(self.code) else self.code
+
+    def _scan(self):
+        if self._start is None:
+            self._find_start()
+            if self._start is None:
+                return
+
+        body = self.raw[self._start:]
+        end = body.find("\n" + FENCE) if not body.startswith(FENCE) else 0
+        if end != -1 and not self._fenced:
+            # Bare text so far: a fence with a language tag opens the real code
+            # block (the text before it was prose), a plain fence closes it
+            line_end = body.find("\n", end + 1)
+            if line_end == -1:
+                return
+            if body[end + 1 + len(FENCE):line_end].strip():
+                self._start, self._fenced, self.code = self._start + line_end + 1, True, ""
+                return self._scan()
+
+        if end != -1:
+            self.done = True
+            self.code = body[:end]
+        else:
+            # Hold back a trailing partial line that may still become the fence
+            last_line = body[body.rfind("\n") + 1:]
+            hold = len(last_line) if last_line and FENCE.startswith(last_line) else 0
+            self.code = body[:len(body) - hold]
+
+    def finish(self):
+        """Call when the stream ends; flushes held-back text of an unterminated reply."""
+        if not self.done and self._start is not None:
+            self.code = self.raw[self._start:].rstrip()
+            last_line = self.code[self.code.rfind("\n") + 1:]
+            if self.code.endswith(FENCE):
+                self.code = self.code[:-len(FENCE)]
+            elif last_line and FENCE.startswith(last_line):
+                # A closing fence cut short by the end of the stream
+                self.code = self.code[:len(self.code) - len(last_line)]
+        self.done = True
+        return self.code.strip()
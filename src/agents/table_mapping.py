@@ -1,5 +1,71 @@
+# What each table holds, in words a user would use. The table router embeds
+# these (table description + one entry per column) and matches questions
+# against them, so a question can reach several tables.
+TABLE_DESCRIPTIONS = {
+    "issues": "GitHub issues of each repository: issues created, opened, closed, open issues, "
+              "issue counts per day, week or month, totals, weekday of issue activity, "
+              "issue trends and issue forecasts with Prophet",
+    "commits": "Git commits of each repository: commit activity, pulls, commit counts per day, "
+               "week or month, commit authors and contributors, commit trends and commit "
+               "forecasts with statsmodels SARIMAX",
+    "repo_info": "Repository metadata: stars, stargazers, forks, watchers, open issue count, "
+                 "programming language, description, popularity comparison bar chart of repos",
+}
+
+# Words that name a table outright. The router adds a fixed bonus to every
+# table one of these appears for, on top of the embedding score, so the
+# hashing fallback can't drift to another table on shared words like
+# "day", "number" or "repository". Singular, lower case.
 TABLE_KEYWORDS = {
-    "issues": ["issue", "created", "closed", "day", "week", "total"],
-    "commits": ["commit", "pulls", "statsmodels", "forecast"],
-    "repo_info": ["star", "fork", "watcher", "repo", "bar chart"]
+    "issues": ["issue", "bug", "prophet"],
+    "commits": ["commit", "pull", "contributor", "statsmodel", "sarimax"],
+    "repo_info": ["star", "stargazer", "fork", "watcher", "language"],
+}
+
+COLUMN_DESCRIPTIONS = {
+    "issues": {
+        "id": "issue id",
+        "repository_url": "repo, repository the issue belongs to (API url)",
+        "number": "issue number",
+        "title": "issue title",
+        "user_login": "user who opened the issue, author, reporter",
+        "state": "issue state open or closed",
+        "locked": "whether the issue is locked",
+        "assignee": "user assigned to the issue",
+        "assignees": "users assigned to the issue",
+        "milestone": "milestone of the issue",
+        "comments": "number of comments on the issue",
+        "created_at": "date the issue was created or opened",
+        "updated_at": "date the issue was last updated",
+        "closed_at": "date the issue was closed",
+        "body": "issue description text",
+    },
+    "commits": {
+        "sha": "commit hash",
+        "node_id": "commit node id",
+        "url": "commit API url",
+        "html_url": "commit web page link",
+        "comments_url": "commit comments url",
+        "author": "raw commit author record",
+        "committer": "raw committer record",
+        "parents": "parent commits",
+        "repo": "repository of the commit owner/name",
+        "author_login": "commit author, contributor, committer login",
+        "committed_at": "date and time of the commit",
+    },
+    "repo_info": {
+        "id": "repository id",
+        "name": "repository name",
+        "full_name": "repository full name owner/name",
+        "description": "repository description",
+        "html_url": "repository web page link",
+        "stargazers_count": "number of stars, stargazers",
+        "watchers_count": "number of watchers",
+        "forks_count": "number of forks",
+        "open_issues_count": "number of open issues",
+        "language": "main programming language",
+        "created_at": "date the repository was created",
+        "updated_at": "date the repository was last updated",
+        "pushed_at": "date of the last push",
+    },
 }
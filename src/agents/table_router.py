@@ -0,0 +1,193 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import numpy as np
+from .table_mapping import TABLE_DESCRIPTIONS, COLUMN_DESCRIPTIONS, TABLE_KEYWORDS
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+ROUTER_CACHE_FILE = os.getenv("ROUTER_CACHE_FILE", os.path.join(DATA_FOLDER, ".router_embeddings.npz"))
+# "auto" -> local sentence-transformers model if installed, else "hashing"
+ROUTER_BACKEND = os.getenv("ROUTER_BACKEND", "auto")
+ROUTER_MODEL = os.getenv("ROUTER_MODEL", "all-MiniLM-L6-v2")
+HASH_DIM = 1024
+
+# A table is selected when it scores at least this fraction of the best one
+ROUTER_RELATIVE_CUTOFF = float(os.getenv("ROUTER_RELATIVE_CUTOFF", 0.8))
+# Added to a table's score when the question names it (TABLE_KEYWORDS)
+ROUTER_KEYWORD_BOOST = float(os.getenv("ROUTER_KEYWORD_BOOST", 0.3))
+
+# ------------------------------
+# Embedding backends
+# ------------------------------
+_WORD = re.compile(r"[a-z0-9]+")
+
+def _tokens(text):
+    words = _WORD.findall(text.lower())
+    # Crude singularization so "issues"/"issue" and "stars"/"star" collide
+    return [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+
+def _bucket(feature):
+    digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+    value = int.from_bytes(digest, "little")
+    return value % HASH_DIM, 1.0 if (value >> 63) else -1.0
+
+class HashingEmbedder:
+    """
+    Deterministic fallback: hashed bag of words plus character trigrams
+    (so "commit" and "committed" still overlap). Needs no model download.
+    """
+    name = f"hashing-{HASH_DIM}"
+
+    def encode(self, texts):
+        out = np.zeros((len(texts), HASH_DIM), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in _tokens(text):
+                idx, sign = _bucket("w:" + word)
+                out[i, idx] += sign
+                padded = f"<{word}>"
+                for j in range(len(padded) - 2):
+                    idx, sign = _bucket("c:" + padded[j:j + 3])
+                    out[i, idx] += 0.3 * sign
+        return out
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name=ROUTER_MODEL):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = f"st-{model_name}"
+
+    def encode(self, texts):
+        return np.asarray(self.model.encode(list(texts)), dtype=np.float32)
+
+_EMBEDDERS = {}
+_EMBEDDER_LOCK = threading.Lock()
+
+def get_embedder(backend=ROUTER_BACKEND):
+    with _EMBEDDER_LOCK:
+        if backend not in _EMBEDDERS:
+            embedder = None
+            if backend in ("auto", "sentence-transformers"):
+                try:
+                    embedder = SentenceTransformerEmbedder()
+                except Exception as e:
+                    if backend != "auto":
+                        raise
+                    print(f"⚠️ No local embedding model ({e}); using hashing embeddings")
+            _EMBEDDERS[backend] = embedder or HashingEmbedder()
+        return _EMBEDDERS[backend]
+
+def _normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+# ------------------------------
+# Router
+# ------------------------------
+class TableRouter:
+    """
+    Scores tables against a question by cosine similarity between the
+    question embedding and precomputed embeddings of every table and column
+    description, plus a keyword bonus for tables the question names.
+    Document embeddings are cached on disk per embedder and description set.
+    """
+
+    def __init__(self, tables=None, backend=ROUTER_BACKEND, cache_file=ROUTER_CACHE_FILE,
+                 keyword_boost=ROUTER_KEYWORD_BOOST):
+        self.tables = list(tables or TABLE_DESCRIPTIONS)
+        self.keyword_boost = keyword_boost
+        self.keywords = {table: set(_tokens(" ".join(TABLE_KEYWORDS.get(table, [])))) for table in self.tables}
+        self.embedder = get_embedder(backend)
+        self.cache_file = cache_file
+
+        # One row per document: (table, None) for the table text, (table, column) per column
+        self.keys, texts = [], []
+        for table in self.tables:
+            self.keys.append((table, None))
+            texts.append(f"{table}: {TABLE_DESCRIPTIONS.get(table, table)}")
+            for col, desc in COLUMN_DESCRIPTIONS.get(table, {}).items():
+                self.keys.append((table, col))
+                texts.append(f"{table} {col.replace('_', ' ')}: {desc}")
+
+        self.matrix = self._load_or_embed(texts)
+        self._table_rows = np.array([col is None for _, col in self.keys])
+        self._owner = np.array([self.tables.index(t) for t, _ in self.keys])
+
+    def _fingerprint(self, texts):
+        h = hashlib.sha256(self.embedder.name.encode())
+        h.update(json.dumps(texts).encode("utf-8"))
+        return h.hexdigest()
+
+    def _load_or_embed(self, texts):
+        fingerprint = self._fingerprint(texts)
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as cached:
+                if str(cached["fingerprint"]) == fingerprint:
+                    return cached["matrix"]
+        except (OSError, KeyError, ValueError):
+            pass
+
+        matrix = _normalize(self.embedder.encode(texts))
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        tmp = self.cache_file + ".tmp.npz"
+        np.savez(tmp, fingerprint=fingerprint, matrix=matrix)
+        os.replace(tmp, self.cache_file)
+        return matrix
+
+    def _similarities(self, query):
+        q = _normalize(self.embedder.encode([query]))[0]
+        return self.matrix @ q
+
+    def scores(self, query):
+        """
+        {table: score}: mean of the table-description match and its best
+        column match, plus keyword_boost if the question names the table.
+        """
+        sims = self._similarities(query)
+        table_sim = np.zeros(len(self.tables))
+        column_sim = np.zeros(len(self.tables))
+        table_sim[self._owner[self._table_rows]] = sims[self._table_rows]
+        np.maximum.at(column_sim, self._owner[~self._table_rows], sims[~self._table_rows])
+        combined = 0.5 * table_sim + 0.5 * column_sim
+        named = self.named_tables(query)
+        combined += self.keyword_boost * np.array([t in named for t in self.tables])
+        return dict(zip(self.tables, combined.round(4).tolist()))
+
+    def named_tables(self, query):
+        """Tables the question names by one of their TABLE_KEYWORDS."""
+        words = set(_tokens(query))
+        return {table for table in self.tables if self.keywords[table] & words}
+
+    def route(self, query, max_tables=3, relative_cutoff=ROUTER_RELATIVE_CUTOFF):
+        """
+        Tables relevant to the question, best first. Every table scoring within
+        relative_cutoff of the best, and every table the question names, is
+        kept, so join questions get several.
+        """
+        ranked = sorted(self.scores(query).items(), key=lambda kv: -kv[1])
+        best = ranked[0][1]
+        if best <= 0:
+            return [ranked[0][0]]
+        named = self.named_tables(query)
+        return [table for table, score in ranked[:max_tables] if score >= best * relative_cutoff or table in named]
+
+    def relevant_columns(self, query, table, top_k=8):
+        """The table's columns ordered by similarity to the question (top_k of them)."""
+        sims = self._similarities(query)
+        rows = [i for i, (t, col) in enumerate(self.keys) if t == table and col is not None]
+        rows.sort(key=lambda i: -sims[i])
+        return [self.keys[i][1] for i in rows[:top_k]]
+
+_ROUTERS = {}
+
+def get_router(tables=None, backend=ROUTER_BACKEND):
+    """Routers are shared per process; building one embeds (or loads) every description."""
+    key = (tuple(tables or TABLE_DESCRIPTIONS), backend)
+    with _EMBEDDER_LOCK:
+        router = _ROUTERS.get(key)
+    if router is None:
+        router = TableRouter(tables, backend)
+        with _EMBEDDER_LOCK:
+            _ROUTERS[key] = router
+    return router
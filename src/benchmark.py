@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import platform
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+from importlib import metadata
+
+# ------------------------------
+# End-to-end pipeline benchmark
+# ------------------------------
+# Synthetic issues/commits/repo metadata are served by the local fake GitHub
+# API and pushed through every stage of the pipeline:
+#
+#   fetch -> clean_csv -> insert_issues / insert_commits / insert_repo_info
+#         -> summarize (CSVAgent.summarize_all_tables) -> exec (canned script)
+#
+# Each run writes one JSON result named after the git commit, so two commits
+# can be compared with --compare. Everything is written to a scratch folder;
+# Postgres runs use their own database (BENCHMARK_PG_DB), never the app's.
+BENCHMARK_FOLDER = os.getenv("BENCHMARK_FOLDER", os.path.join(os.path.dirname(__file__), "data", "benchmarks"))
+BENCHMARK_PG_DB = os.getenv("BENCHMARK_PG_DB", "github_bench")
+# A stage this much slower than the baseline is reported as a regression
+REGRESSION_THRESHOLD = float(os.getenv("BENCHMARK_REGRESSION_THRESHOLD", 0.2))
+# Stages faster than this are too noisy to flag
+MIN_COMPARE_SECONDS = 0.05
+
+TABLES = ("issues", "commits", "repo_info")
+BACKENDS = ("auto", "postgres", "duckdb")
+BENCH_TOKEN = "bench-token"
+PACKAGES = ("pandas", "numpy", "pyarrow", "duckdb", "psycopg2-binary", "requests")
+
+# What a typical generated answer does: helper aggregations, one raw table,
+# some pandas, a chart
+CANNED_SCRIPT = """
+import pandas as pd
+import matplotlib.pyplot as plt
+
+weekly = issue_counts(metric="created", granularity="week")
+commits = commits_per_repo()
+issues = load_table("issues", ["repository_url", "state", "comments", "created_at"])
+
+issues["repo"] = issues["repository_url"].str.split("/repos/").str[-1]
+summary = (
+    issues.groupby("repo")
+    .agg(issues=("state", "size"), open=("state", lambda s: (s == "open").sum()), comments=("comments", "mean"))
+    .reset_index()
+    .merge(commits, on="repo", how="left")
+)
+st.dataframe(summary)
+
+fig, ax = plt.subplots(figsize=(10, 4))
+for repo, group in weekly.groupby("repo"):
+    ax.plot(group["period"], group["count"], label=repo)
+ax.set_title("Issues created per week")
+st.pyplot(fig)
+print(f"{len(summary)} repos, {int(summary['issues'].sum())} issues")
+"""
+
+# ------------------------------
+# Environment
+# ------------------------------
+def git_commit():
+    """(short hash, dirty) of the working tree, or ("unknown", False) outside git."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown", False
+
+def environment():
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+def _configure(work_dir, pg_db):
+    """
+    Point the project modules at the scratch folder and the benchmark
+    database. Must run before they are imported: they read these at import.
+    """
+    os.environ["SNAPSHOT_FOLDER"] = os.path.join(work_dir, "snapshots")
+    os.environ["PG_DB"] = pg_db
+    # Every query must see the rows loaded a moment ago
+    os.environ["DUCKDB_REFRESH_SECONDS"] = "0"
+    os.environ.pop("DUCKDB_PATH", None)
+
+def _postgres_available():
+    from db_connect import get_connection
+    try:
+        get_connection().close()
+        return True
+    except Exception as e:
+        print(f"⚠️ Postgres unavailable ({e})")
+        return False
+
+def _reset_postgres(conn):
+    """Start from empty tables, so every run loads the same rows."""
+    from db_insert import TABLES_SQL, create_tables
+    with conn.cursor() as cur:
+        cur.execute(f"DROP TABLE IF EXISTS {', '.join(TABLES_SQL)}, schema_migrations CASCADE;")
+    conn.commit()
+    create_tables(conn)
+
+# ------------------------------
+# Stages
+# ------------------------------
+class StageTimer:
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage, seconds, rows=None):
+        result = {"seconds": round(seconds, 4), "rows": rows}
+        if rows:
+            result["rows_per_sec"] = round(rows / seconds, 1) if seconds > 0 else None
+        self.stages[stage] = result
+        rate = f", {result['rows_per_sec']:,.0f} rows/s" if result.get("rows_per_sec") else ""
+        print(f"⏱️ {stage}: {seconds:.2f}s{rate}")
+
+def _fetch(repos, per_repo, workers, csv_dir, timer):
+    """Fetch every repo from the fake API and write one CSV per (repo, endpoint)."""
+    import pandas as pd
+    from fake_github_api import start_fake_api
+    from fetch_github_data import EtagCache, GitHubClient, fetch_all
+
+    # One token with a quota the run can't exhaust: this measures the pipeline, not the pacing
+    server, base_url = start_fake_api(repos=repos, n_issues=per_repo, n_commits=per_repo, limit=10**9)
+    client = GitHubClient([BENCH_TOKEN], base_url=base_url, pool_size=workers,
+                          cache=EtagCache(os.path.join(csv_dir, ".http_cache")))
+    started, lock = set(), threading.Lock()
+
+    def on_page(repo, endpoint, page):
+        # Pages of one (repo, endpoint) arrive in order on one thread
+        path = os.path.join(csv_dir, f"{endpoint}_{repo.replace('/', '_')}.csv")
+        with lock:
+            first = path not in started
+            started.add(path)
+        pd.DataFrame(page).to_csv(path, mode="w" if first else "a", header=first, index=False)
+
+    try:
+        start = time.perf_counter()
+        _, failed = fetch_all(repos, [BENCH_TOKEN], None, base_url=base_url, workers=workers,
+                              client=client, on_page=on_page, collect=False, report=False)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    if failed:
+        raise RuntimeError(f"{len(failed)} endpoint(s) failed to fetch")
+
+    rows = len(repos) * (2 * per_repo + 1)
+    timer.record("fetch", elapsed, rows)
+    return {"requests": client.stats["requests"], "retries": client.stats["retries"]}
+
+def _clean(csv_dir, timer):
+    """{table: [(repo key, DataFrame)]} read through db_insert.clean_csv."""
+    from db_insert import clean_csv
+
+    frames = {table: [] for table in TABLES}
+    start = time.perf_counter()
+    for file in sorted(os.listdir(csv_dir)):
+        for table in TABLES:
+            if file.startswith(f"{table}_") and file.endswith(".csv"):
+                frames[table].append((file[len(table) + 1:-4], clean_csv(os.path.join(csv_dir, file))))
+                break
+    elapsed = time.perf_counter() - start
+    timer.record("clean_csv", elapsed, sum(len(df) for parts in frames.values() for _, df in parts))
+    return frames
+
+def _insert(frames, backend, loader, timer):
+    """Load every table into Postgres, or into the Parquet snapshots DuckDB reads."""
+    if backend == "postgres":
+        from db_connect import pooled_connection
+        from db_insert import insert_issues, insert_commits, insert_repo_info
+
+        inserters = {"issues": insert_issues, "commits": insert_commits, "repo_info": insert_repo_info}
+        with pooled_connection() as conn:
+            _reset_postgres(conn)
+            for table in TABLES:
+                start = time.perf_counter()
+                for _, df in frames[table]:
+                    inserters[table](conn, df, loader=loader)
+                timer.record(f"insert_{table}", time.perf_counter() - start, sum(len(df) for _, df in frames[table]))
+    else:
+        from snapshot_store import write_snapshot
+
+        for table in TABLES:
+            start = time.perf_counter()
+            for repo, df in frames[table]:
+                write_snapshot(df, table, repo.replace("_", "/", 1))
+            timer.record(f"insert_{table}", time.perf_counter() - start, sum(len(df) for _, df in frames[table]))
+
+def _summarize(backend, timer):
+    """Cold summary: a new backend instance and empty table caches."""
+    from query_backend import reset_backends
+    from agents.csv_agent import CSVAgent, clear_table_cache
+
+    reset_backends()
+    clear_table_cache()
+    start = time.perf_counter()
+    agent = CSVAgent(backend=backend)
+    summaries, _ = agent.summarize_all_tables()
+    elapsed = time.perf_counter() - start
+    errors = [s for s in summaries.values() if s.startswith("Error")]
+    if errors:
+        raise RuntimeError(f"summarize_all_tables failed: {errors[0]}")
+    timer.record("summarize", elapsed, sum(agent.versions[t][0] for t in TABLES))
+
+def _exec(exec_backend, timer):
+    """Run the canned script; the heavy imports are paid (and recorded) first."""
+    from agents.exec_agent import ExecAgent, warm_start
+
+    start = time.perf_counter()
+    warm_start(exec_backend)
+    timer.record("exec_warmup", time.perf_counter() - start)
+
+    agent = ExecAgent(exec_backend)
+    start = time.perf_counter()
+    result = agent.run_code(CANNED_SCRIPT)
+    elapsed = time.perf_counter() - start
+    if result["error"]:
+        raise RuntimeError(f"canned script failed: {result['error']}\n{result['stdout']}")
+    timer.record("exec", elapsed)
+
+# ------------------------------
+# Run
+# ------------------------------
+def run_benchmark(rows=10_000, n_repos=10, backend="auto", loader=None, workers=8,
+                  exec_backend="inline", pg_db=BENCHMARK_PG_DB, keep=False):
+    """
+    Push `rows` synthetic rows (half issues, half commits, spread over
+    n_repos repos) through the pipeline. Returns the result dict.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got '{backend}'")
+    per_repo = max(1, rows // (2 * n_repos))
+    repos = [f"bench/repo-{i:03d}" for i in range(n_repos)]
+    work_dir = tempfile.mkdtemp(prefix="github-bench-")
+    _configure(work_dir, pg_db)
+    # The query backend must read the same place the loader writes
+    os.environ["QUERY_BACKEND"] = backend
+
+    from db_insert import DEFAULT_LOADER
+    loader = loader or DEFAULT_LOADER
+    if backend == "auto":
+        backend = "postgres" if _postgres_available() else "duckdb"
+        os.environ["QUERY_BACKEND"] = backend
+    target = f"postgres ({pg_db}, loader={loader})" if backend == "postgres" else "parquet snapshots + duckdb"
+    print(f"🏁 Benchmark: {per_repo * 2 * n_repos:,} rows over {n_repos} repos, {target}")
+    print(f"📂 Scratch folder: {work_dir}")
+
+    timer = StageTimer()
+    csv_dir = os.path.join(work_dir, "csv")
+    os.makedirs(csv_dir)
+    started = time.perf_counter()
+    try:
+        http = _fetch(repos, per_repo, workers, csv_dir, timer)
+        frames = _clean(csv_dir, timer)
+        _insert(frames, backend, loader, timer)
+        del frames
+        _summarize(backend, timer)
+        _exec(exec_backend, timer)
+    finally:
+        if keep:
+            print(f"📂 Kept {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit, dirty = git_commit()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "rows": per_repo * 2 * n_repos,
+        "repos": n_repos,
+        "backend": backend,
+        "loader": loader if backend == "postgres" else None,
+        "exec_backend": exec_backend,
+        "fetch_workers": workers,
+        "http": http,
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "stages": timer.stages,
+        "environment": environment(),
+    }
+
+def save_result(result, path=None):
+    path = path or os.path.join(BENCHMARK_FOLDER, f"{result['commit']}-{result['backend']}-{result['rows']}.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(result, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+    print(f"💾 Results: {path}")
+    return path
+
+# ------------------------------
+# Compare
+# ------------------------------
+def compare(result, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print stage times side by side; returns the stages that regressed."""
+    for key in ("rows", "backend", "loader"):
+        if result.get(key) != baseline.get(key):
+            print(f"⚠️ {key} differs: {baseline.get(key)} (baseline) vs {result.get(key)}; timings are not comparable")
+
+    print(f"\n📊 {baseline['commit']} (baseline) -> {result['commit']}")
+    regressions = []
+    for stage, current in result["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            print(f"  {stage:<18} {'-':>9}  {current['seconds']:>8.2f}s")
+            continue
+        change = current["seconds"] / before["seconds"] - 1 if before["seconds"] > 0 else 0.0
+        regressed = change > threshold and current["seconds"] >= MIN_COMPARE_SECONDS
+        if regressed:
+            regressions.append(stage)
+        flag = "  🔺 regression" if regressed else ""
+        print(f"  {stage:<18} {before['seconds']:>8.2f}s  {current['seconds']:>8.2f}s  {change:>+7.1%}{flag}")
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time every pipeline stage on synthetic data from a fake GitHub API")
+    parser.add_argument("--rows", type=int, default=10_000,
+                        help="issues + commits to generate, e.g. 10000 up to 10000000 (default: %(default)s)")
+    parser.add_argument("--repos", type=int, default=10, help="repos the rows are spread over (default: %(default)s)")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto",
+                        help="postgres: load into BENCHMARK_PG_DB; duckdb: Parquet snapshots queried by "
+                             "DuckDB, no server; auto: postgres when reachable (default: %(default)s)")
+    parser.add_argument("--loader", help="db_insert loader for postgres runs (default: DB_LOADER)")
+    parser.add_argument("--workers", type=int, default=8, help="fetch threads (default: %(default)s)")
+    parser.add_argument("--exec-backend", choices=("sandbox", "inline"), default="inline",
+                        help="where the canned script runs (default: %(default)s)")
+    parser.add_argument("--pg-db", default=BENCHMARK_PG_DB,
+                        help="database for postgres runs; its tables are dropped (default: %(default)s)")
+    parser.add_argument("--out", help="results file (default: data/benchmarks/<commit>-<backend>-<rows>.json)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="slowdown share reported as a regression (default: %(default)s)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch folder")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.pg_db == os.getenv("PG_DB", "github_data"):
+        raise SystemExit(f"❌ --pg-db {args.pg_db} is the app database; the benchmark drops its tables")
+
+    result = run_benchmark(args.rows, args.repos, args.backend, args.loader, args.workers,
+                           args.exec_backend, args.pg_db, args.keep)
+    save_result(result, args.out)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n⚠️ {len(regressions)} stage(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            raise SystemExit(1)
+        print("\n✅ No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,10 @@
 import psycopg2
 from psycopg2 import sql
+from psycopg2 import pool as pg_pool
+from psycopg2 import extensions
+from contextlib import contextmanager
+import threading
+import time
 import os
 
 DB_CONFIG = {
@@ -7,15 +12,152 @@ DB_CONFIG = {
     "port": os.getenv("PG_PORT", 5432),
     "dbname": os.getenv("PG_DB", "github_data"),
     "user": os.getenv("PG_USER", "postgres"),
-    "password": os.getenv("PG_PASSWORD", "postgres")
+    "password": os.getenv("PG_PASSWORD", "postgres"),
+    # TIMESTAMP columns hold UTC wall time: without this, aware datetimes
+    # would be shifted to the server's zone on insert and ::date would
+    # cut days in local time
+    "options": "-c TimeZone=UTC",
 }
 
+# Pool sizing. PG_POOL_MAX is a hard cap on connections this process opens.
+POOL_MIN = int(os.getenv("PG_POOL_MIN", 1))
+POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+# Seconds to wait for a free connection before giving up
+POOL_TIMEOUT = float(os.getenv("PG_POOL_TIMEOUT", 30))
+# Connections idle longer than this are pinged (SELECT 1) before reuse
+POOL_CHECK_AFTER = float(os.getenv("PG_POOL_CHECK_AFTER", 30))
+
 def get_connection():
     conn = psycopg2.connect(
         host=DB_CONFIG["host"],
         port=DB_CONFIG["port"],
         dbname=DB_CONFIG["dbname"],
         user=DB_CONFIG["user"],
-        password=DB_CONFIG["password"]
+        password=DB_CONFIG["password"],
+        options=DB_CONFIG["options"]
     )
     return conn
+
+# ------------------------------
+# Connection pool
+# ------------------------------
+_pool = None
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(POOL_MAX)
+_last_used = {}
+
+_metrics = {
+    "checkouts": 0,
+    "in_use": 0,
+    "peak_in_use": 0,
+    "wait_seconds": 0.0,
+    "timeouts": 0,
+    "health_check_failures": 0,
+}
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pg_pool.ThreadedConnectionPool(POOL_MIN, POOL_MAX, **DB_CONFIG)
+        return _pool
+
+def _healthy(conn):
+    if conn.closed:
+        return False
+    # Fresh connections have never been returned, so they need no ping
+    last_used = _last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < POOL_CHECK_AFTER:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def acquire(timeout=POOL_TIMEOUT):
+    """
+    Check a connection out of the pool, blocking up to `timeout` seconds
+    when all POOL_MAX connections are in use. Prefer pooled_connection().
+    """
+    start = time.monotonic()
+    if not _slots.acquire(timeout=timeout):
+        with _pool_lock:
+            _metrics["timeouts"] += 1
+        raise pg_pool.PoolError(f"No free DB connection after {timeout}s (PG_POOL_MAX={POOL_MAX})")
+
+    try:
+        pool = get_pool()
+        conn = pool.getconn()
+        while not _healthy(conn):
+            with _pool_lock:
+                _metrics["health_check_failures"] += 1
+            _last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _slots.release()
+        raise
+
+    with _pool_lock:
+        _metrics["checkouts"] += 1
+        _metrics["in_use"] += 1
+        _metrics["peak_in_use"] = max(_metrics["peak_in_use"], _metrics["in_use"])
+        _metrics["wait_seconds"] += time.monotonic() - start
+    return conn
+
+def release(conn):
+    """Return a connection to the pool, discarding any open transaction."""
+    close = conn.closed != 0
+    if not close and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            close = True
+
+    if close:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    get_pool().putconn(conn, close=close)
+    with _pool_lock:
+        _metrics["in_use"] -= 1
+    _slots.release()
+
+@contextmanager
+def pooled_connection(timeout=POOL_TIMEOUT):
+    """
+    with pooled_connection() as conn:
+        ...
+    Commit inside the block; anything left uncommitted is rolled back.
+    """
+    conn = acquire(timeout)
+    try:
+        yield conn
+    finally:
+        release(conn)
+
+def pool_metrics():
+    with _pool_lock:
+        metrics = dict(_metrics)
+    metrics["max_size"] = POOL_MAX
+    metrics["avg_wait_ms"] = 1000 * metrics["wait_seconds"] / metrics["checkouts"] if metrics["checkouts"] else 0.0
+    return metrics
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        _last_used.clear()
+
+if __name__ == "__main__":
+    with pooled_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version();")
+            print(f"✅ Connection successful: {cur.fetchone()[0]}")
+    print(f"📊 Pool metrics: {pool_metrics()}")
+    close_pool()
@@ -1,6 +1,15 @@
 import os
+import io
+import time
+import argparse
 import pandas as pd
-from db_connect import get_connection
+from psycopg2.extras import execute_values
+from db_connect import pooled_connection
+from sync_state import SyncState
+from normalize import NULL_TOKENS, PRIMARY_KEYS, normalize_frame, to_rows
+import rollups
+import forecasting
+from snapshot_store import read_snapshot
 
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
 
@@ -8,24 +17,19 @@ DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
 # Helper: Clean CSV
 # ------------------------------
 def clean_csv(file_path):
+    """
+    Read a fetched CSV. Null tokens (including the literal "NaT" pandas writes
+    for missing datetimes) are mapped to NaN by the parser in one pass;
+    typing happens later in normalize.normalize_frame.
+    """
     try:
-        df = pd.read_csv(file_path)
-        
+        df = pd.read_csv(file_path, na_values=NULL_TOKENS, keep_default_na=True)
+
         # Check if dataframe is empty
         if df.empty:
             print(f"⚠️ Skipping empty file: {file_path}")
             return pd.DataFrame()
 
-        # Replace literal string "NaT" with None - multiple approaches for safety
-        df.replace("NaT", "", inplace=True)
-        df.replace("NaT", None, inplace=True)
-        df.replace(pd.NA, None, inplace=True)
-        df.replace(pd.NaT, None, inplace=True)
-        
-        # Also handle any cells that are exactly the string "NaT"
-        for col in df.columns:
-            df[col] = df[col].apply(lambda x: None if str(x).strip() == "NaT" else x)
-
         return df
     except pd.errors.EmptyDataError:
         print(f"⚠️ Skipping empty file: {file_path}")
@@ -66,7 +70,10 @@ TABLES_SQL = {
             comments_url TEXT,
             author TEXT,
             committer TEXT,
-            parents TEXT
+            parents TEXT,
+            repo TEXT,
+            author_login TEXT,
+            committed_at TIMESTAMPTZ
         );
     """,
     "repo_info": """
@@ -88,6 +95,55 @@ TABLES_SQL = {
     """
 }
 
+# ------------------------------
+# Schema migrations (applied once, in order, tracked in schema_migrations)
+# ------------------------------
+MIGRATIONS = [
+    (1, "issues hot-path indexes", """
+        CREATE INDEX IF NOT EXISTS issues_repo_created_idx ON issues (repository_url, created_at);
+        CREATE INDEX IF NOT EXISTS issues_repo_closed_idx ON issues (repository_url, closed_at)
+            WHERE closed_at IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS issues_open_idx ON issues (repository_url, created_at)
+            WHERE state = 'open';
+        CREATE INDEX IF NOT EXISTS issues_updated_idx ON issues (updated_at);
+    """),
+    (2, "typed commit columns", """
+        ALTER TABLE commits
+            ADD COLUMN IF NOT EXISTS repo TEXT,
+            ADD COLUMN IF NOT EXISTS author_login TEXT,
+            ADD COLUMN IF NOT EXISTS committed_at TIMESTAMPTZ;
+        -- Backfill what the old stringified columns still hold; committed_at
+        -- was never stored, so older rows only get it when re-fetched
+        UPDATE commits SET
+            repo = substring(url from '/repos/([^/]+/[^/]+)'),
+            author_login = substring(author from $$'login': '([^']+)'$$)
+        WHERE repo IS NULL;
+        CREATE INDEX IF NOT EXISTS commits_repo_committed_idx ON commits (repo, committed_at);
+    """),
+    (3, "daily rollup tables", rollups.ROLLUP_TABLES_SQL + rollups.REBUILD_SQL),
+    (4, "forecast cache", forecasting.FORECAST_TABLE_SQL),
+]
+
+def run_migrations(conn):
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INT PRIMARY KEY,
+                name TEXT,
+                applied_at TIMESTAMPTZ DEFAULT now()
+            );
+        """)
+        cur.execute("SELECT version FROM schema_migrations;")
+        applied = {row[0] for row in cur.fetchall()}
+
+        for version, name, sql_stmt in MIGRATIONS:
+            if version in applied:
+                continue
+            cur.execute(sql_stmt)
+            cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s);", (version, name))
+            print(f"🛠️ Applied migration {version}: {name}")
+    conn.commit()
+
 # ------------------------------
 # Create tables
 # ------------------------------
@@ -97,224 +153,224 @@ def create_tables(conn):
             cur.execute(sql_stmt)
             print(f"✅ Table '{table}' ensured in DB")
     conn.commit()
+    run_migrations(conn)
+
+# ------------------------------
+# Bulk loaders
+# ------------------------------
+# "rows"   -> one cur.execute per row (original path, kept for benchmarking)
+# "values" -> psycopg2.extras.execute_values, PAGE_SIZE rows per statement
+# "copy"   -> COPY into a temp staging table, then INSERT ... SELECT ... ON CONFLICT
+LOADERS = ("rows", "values", "copy")
+DEFAULT_LOADER = os.getenv("DB_LOADER", "values")
+DEFAULT_PAGE_SIZE = int(os.getenv("DB_PAGE_SIZE", 1000))
+
+def _copy_buffer(rows):
+    """Render rows as COPY CSV: unquoted empty field = NULL, everything else quoted."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(",".join(
+            "" if val is None else '"' + str(val).replace('"', '""') + '"'
+            for val in row
+        ))
+        buf.write("\n")
+    buf.seek(0)
+    return buf
+
+def load_rows(conn, table, columns, rows, conflict_sql, loader=DEFAULT_LOADER, page_size=DEFAULT_PAGE_SIZE):
+    """Write rows (list of tuples) into table with the chosen loader. Returns rows/sec."""
+    if loader not in LOADERS:
+        raise ValueError(f"Unknown loader '{loader}', expected one of {LOADERS}")
+
+    col_sql = ",".join(columns)
+    start = time.perf_counter()
+
+    with conn.cursor() as cur:
+        if loader == "rows":
+            placeholders = ",".join(["%s"] * len(columns))
+            for row in rows:
+                cur.execute(
+                    f"INSERT INTO {table} ({col_sql}) VALUES ({placeholders}) {conflict_sql};",
+                    row
+                )
+        elif loader == "values":
+            execute_values(
+                cur,
+                f"INSERT INTO {table} ({col_sql}) VALUES %s {conflict_sql};",
+                rows,
+                page_size=page_size
+            )
+        else:
+            staging = f"_stage_{table}"
+            cur.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table}) ON COMMIT DROP;")
+            cur.execute(f"TRUNCATE {staging};")
+            cur.copy_expert(f"COPY {staging} ({col_sql}) FROM STDIN WITH (FORMAT csv)", _copy_buffer(rows))
+            cur.execute(f"INSERT INTO {table} ({col_sql}) SELECT {col_sql} FROM {staging} {conflict_sql};")
+    conn.commit()
+
+    elapsed = time.perf_counter() - start
+    rate = len(rows) / elapsed if elapsed > 0 else float("inf")
+    print(f"⏱️ {table}: {len(rows)} rows in {elapsed:.2f}s ({rate:,.0f} rows/s, loader={loader})")
+    return rate
+
+# ------------------------------
+# Conflict handling
+# ------------------------------
+# "ignore" -> ON CONFLICT DO NOTHING (first version of a row wins forever)
+# "upsert" -> ON CONFLICT DO UPDATE, but only when the incoming row is newer,
+#             so unchanged rows are skipped and cost no write
+CONFLICT_MODES = ("ignore", "upsert")
+DEFAULT_CONFLICT = os.getenv("DB_CONFLICT", "upsert")
+
+# When an existing row should be overwritten. Commits are immutable; they are
+# only rewritten to fill the typed columns of rows loaded before they existed.
+UPSERT_WHEN = {
+    "commits": "commits.committed_at IS NULL AND excluded.committed_at IS NOT NULL",
+    "issues": "excluded.updated_at > COALESCE(issues.updated_at, '-infinity')",
+    "repo_info": """
+        excluded.updated_at > COALESCE(repo_info.updated_at, '-infinity')
+        OR (excluded.stargazers_count, excluded.watchers_count, excluded.forks_count, excluded.open_issues_count)
+           IS DISTINCT FROM
+           (repo_info.stargazers_count, repo_info.watchers_count, repo_info.forks_count, repo_info.open_issues_count)
+    """,
+}
+
+def conflict_clause(table, columns, mode=DEFAULT_CONFLICT):
+    if mode not in CONFLICT_MODES:
+        raise ValueError(f"Unknown conflict mode '{mode}', expected one of {CONFLICT_MODES}")
+
+    key = PRIMARY_KEYS[table]
+    if mode == "ignore" or table not in UPSERT_WHEN:
+        return f"ON CONFLICT ({key}) DO NOTHING"
+
+    assignments = ", ".join(f"{col} = excluded.{col}" for col in columns if col != key)
+    return f"ON CONFLICT ({key}) DO UPDATE SET {assignments} WHERE {UPSERT_WHEN[table]}"
+
+def dedupe(df, table):
+    """
+    Keep one row per key (the most recently updated one). An upsert
+    statement may not touch the same row twice.
+    """
+    if "updated_at" in df.columns:
+        df = df.sort_values("updated_at", na_position="first", kind="stable")
+    return df.drop_duplicates(subset=PRIMARY_KEYS[table], keep="last")
 
 # ------------------------------
 # Insert issues
 # ------------------------------
-def insert_issues(conn, df):
+def insert_issues(conn, df, loader=DEFAULT_LOADER, page_size=DEFAULT_PAGE_SIZE, conflict=DEFAULT_CONFLICT):
     if df.empty:
         print("⚠️ No issues data to insert")
         return
 
-    df_insert = df[[
-        "id", "repository_url", "number", "title", "user", "state", "locked",
-        "assignee", "assignees", "milestone", "comments", "created_at",
-        "updated_at", "closed_at", "body"
-    ]].copy()
-
-    # Flatten 'user' JSON to get login
-    df_insert["user_login"] = df_insert["user"].apply(lambda x: x.get("login") if isinstance(x, dict) else None)
-    df_insert.drop(columns=["user"], inplace=True)
-
-    # Convert numeric columns
-    for col in ["comments", "number"]:
-        df_insert[col] = pd.to_numeric(df_insert[col], errors="coerce").astype("Int64")
-
-    # Convert datetime columns
-    for col in ["created_at", "updated_at", "closed_at"]:
-        # First, replace any "NaT" strings
-        df_insert[col] = df_insert[col].replace("NaT", None)
-        df_insert[col] = df_insert[col].replace(pd.NaT, None)
-        # Apply function to handle various cases
-        def clean_datetime(x):
-            if x is None or x == "" or x == "NaT":
-                return None
-            if pd.isna(x):
-                return None
-            if isinstance(x, str):
-                if x.strip() in ("NaT", "nan", "NaN", ""):
-                    return None
-                try:
-                    return pd.to_datetime(x).to_pydatetime()
-                except:
-                    return None
-            try:
-                return pd.to_datetime(x).to_pydatetime()
-            except:
-                return None
-        df_insert[col] = df_insert[col].apply(clean_datetime)
-
-    # Convert JSON-like columns to string
-    for col in ["assignees", "milestone"]:
-        df_insert[col] = df_insert[col].apply(lambda x: str(x) if x is not None else None)
-
-    # Replace any remaining NaN with None
-    df_insert = df_insert.where(pd.notnull(df_insert), None)
-
-    with conn.cursor() as cur:
-        for idx, row in df_insert.iterrows():
-            # Final safety check: convert any remaining "NaT" strings to None
-            row_values = []
-            for val in [row["id"], row["repository_url"], row["number"], row["title"],
-                       row["user_login"], row["state"], row["locked"], row["assignee"],
-                       row["assignees"], row["milestone"], row["comments"], row["created_at"],
-                       row["updated_at"], row["closed_at"], row["body"]]:
-                # Check for NaT in multiple ways
-                if val is pd.NaT:
-                    row_values.append(None)
-                elif pd.isna(val):
-                    row_values.append(None)
-                elif isinstance(val, str) and val.strip() in ("NaT", "nan", "NaN"):
-                    row_values.append(None)
-                else:
-                    row_values.append(val)
-            
-            # Debug print for problematic row
-            if any(str(v) == "NaT" for v in row_values):
-                print(f"⚠️ Found NaT in row {idx}: {row_values}")
-            
-            cur.execute("""
-                INSERT INTO issues (
-                    id, repository_url, number, title, user_login, state, locked,
-                    assignee, assignees, milestone, comments, created_at, updated_at,
-                    closed_at, body
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (id) DO NOTHING;
-            """, tuple(row_values))
-    conn.commit()
+    df_insert = dedupe(normalize_frame(df, "issues"), "issues")
+    columns = list(df_insert.columns)
+    rows = list(to_rows(df_insert))
+    # Must be read before the load overwrites closed_at of reopened issues
+    touched = rollups.touched_issue_days(conn, df_insert)
+    load_rows(conn, "issues", columns, rows, conflict_clause("issues", columns, conflict), loader, page_size)
     print(f"💾 Inserted {len(df_insert)} issues rows")
 
+    days = rollups.refresh_issue_days(conn, touched)
+    print(f"📊 Refreshed {days} (repo, day) rows in daily_issue_activity")
+
 # ------------------------------
 # Insert commits
 # ------------------------------
-def insert_commits(conn, df):
+def insert_commits(conn, df, loader=DEFAULT_LOADER, page_size=DEFAULT_PAGE_SIZE, conflict=DEFAULT_CONFLICT):
     if df.empty:
         print("⚠️ No commits data to insert")
         return
 
-    df_insert = df[[
-        "sha","node_id","url","html_url","comments_url","author","committer","parents"
-    ]].copy()
-
-    # Flatten author/committer if nested
-    for col in ["author","committer"]:
-        df_insert[col] = df_insert[col].apply(lambda x: str(x) if x is not None else None)
-
-    # Convert parents (list) to string
-    df_insert["parents"] = df_insert["parents"].apply(lambda x: str(x) if x else None)
-
-    # Replace NaN with None
-    df_insert = df_insert.where(pd.notnull(df_insert), None)
-
-    with conn.cursor() as cur:
-        for _, row in df_insert.iterrows():
-            cur.execute("""
-                INSERT INTO commits (
-                    sha,node_id,url,html_url,comments_url,author,committer,parents
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (sha) DO NOTHING;
-            """, tuple(row))
-    conn.commit()
+    df_insert = dedupe(normalize_frame(df, "commits"), "commits")
+    columns = list(df_insert.columns)
+    rows = list(to_rows(df_insert))
+    load_rows(conn, "commits", columns, rows, conflict_clause("commits", columns, conflict), loader, page_size)
     print(f"💾 Inserted {len(df_insert)} commits rows")
 
+    days = rollups.refresh_commit_days(conn, rollups.touched_commit_days(df_insert))
+    print(f"📊 Refreshed {days} (repo, day) rows in daily_commit_activity")
+
 # ------------------------------
 # Insert repo_info
 # ------------------------------
-def insert_repo_info(conn, df):
+def insert_repo_info(conn, df, loader=DEFAULT_LOADER, page_size=DEFAULT_PAGE_SIZE, conflict=DEFAULT_CONFLICT):
     if df.empty:
         print("⚠️ No repo info data to insert")
         return
 
-    df_insert = df[[
-        "id","name","full_name","description","html_url","stargazers_count",
-        "watchers_count","forks_count","open_issues_count","language",
-        "created_at","updated_at","pushed_at"
-    ]].copy()
-
-    # Convert numeric columns
-    for col in ["stargazers_count","watchers_count","forks_count","open_issues_count"]:
-        df_insert[col] = pd.to_numeric(df_insert[col], errors="coerce").astype("Int64")
-
-    # Convert datetime columns
-    for col in ["created_at","updated_at","pushed_at"]:
-        # First, replace any "NaT" strings
-        df_insert[col] = df_insert[col].replace("NaT", None)
-        df_insert[col] = df_insert[col].replace(pd.NaT, None)
-        # Apply function to handle various cases
-        def clean_datetime(x):
-            if x is None or x == "" or x == "NaT":
-                return None
-            if pd.isna(x):
-                return None
-            if isinstance(x, str):
-                if x.strip() in ("NaT", "nan", "NaN", ""):
-                    return None
-                try:
-                    return pd.to_datetime(x).to_pydatetime()
-                except:
-                    return None
-            try:
-                return pd.to_datetime(x).to_pydatetime()
-            except:
-                return None
-        df_insert[col] = df_insert[col].apply(clean_datetime)
-
-    # Replace any remaining NaN with None
-    df_insert = df_insert.where(pd.notnull(df_insert), None)
-
-    with conn.cursor() as cur:
-        for idx, row in df_insert.iterrows():
-            # Final safety check: convert any remaining "NaT" strings to None
-            row_values = []
-            for val in row:
-                # Check for NaT in multiple ways
-                if val is pd.NaT:
-                    row_values.append(None)
-                elif pd.isna(val):
-                    row_values.append(None)
-                elif isinstance(val, str) and val.strip() in ("NaT", "nan", "NaN"):
-                    row_values.append(None)
-                else:
-                    row_values.append(val)
-            row_values = tuple(row_values)
-            
-            cur.execute("""
-                INSERT INTO repo_info (
-                    id,name,full_name,description,html_url,stargazers_count,
-                    watchers_count,forks_count,open_issues_count,language,
-                    created_at,updated_at,pushed_at
-                ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                ON CONFLICT (id) DO NOTHING;
-            """, row_values)
-    conn.commit()
+    df_insert = dedupe(normalize_frame(df, "repo_info"), "repo_info")
+    columns = list(df_insert.columns)
+    rows = list(to_rows(df_insert))
+    load_rows(conn, "repo_info", columns, rows, conflict_clause("repo_info", columns, conflict), loader, page_size)
     print(f"💾 Inserted {len(df_insert)} repo_info rows")
 
 # ------------------------------
 # Main
 # ------------------------------
-def main():
-    conn = get_connection()
-    create_tables(conn)
-
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load fetched GitHub data into PostgreSQL")
+    parser.add_argument("--source", choices=("csv", "snapshot"), default="csv",
+                        help="csv: src/data/*.csv; snapshot: typed Parquet snapshots (default: %(default)s)")
+    parser.add_argument("--since-date", metavar="YYYY-MM-DD",
+                        help="with --source snapshot, only load snapshots fetched on or after this date")
+    parser.add_argument("--loader", choices=LOADERS, default=DEFAULT_LOADER,
+                        help="insert strategy (default: %(default)s)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="rows per statement for the 'values' loader (default: %(default)s)")
+    parser.add_argument("--conflict", choices=CONFLICT_MODES, default=DEFAULT_CONFLICT,
+                        help="what to do with rows that already exist (default: %(default)s)")
+    parser.add_argument("--skip-forecasts", action="store_true",
+                        help="don't refit stale cached forecasts after loading")
+    return parser.parse_args(argv)
+
+def load_csv_folder(conn, load_opts):
     # Insert issues
     for file in os.listdir(DATA_FOLDER):
         if file.startswith("issues_") and file.endswith(".csv"):
             df = clean_csv(os.path.join(DATA_FOLDER, file))
-            insert_issues(conn, df)
+            insert_issues(conn, df, **load_opts)
 
     # Insert commits
     for file in os.listdir(DATA_FOLDER):
         if file.startswith("commits_") and file.endswith(".csv"):
             df = clean_csv(os.path.join(DATA_FOLDER, file))
-            insert_commits(conn, df)
+            insert_commits(conn, df, **load_opts)
 
     # Insert repo info
     for file in os.listdir(DATA_FOLDER):
         if file.startswith("repo_info_") and file.endswith(".csv"):
             df = clean_csv(os.path.join(DATA_FOLDER, file))
-            insert_repo_info(conn, df)
+            insert_repo_info(conn, df, **load_opts)
+
+def load_snapshots(conn, load_opts, since_date=None):
+    # Already typed: no CSV parsing or type inference
+    inserters = {"issues": insert_issues, "commits": insert_commits, "repo_info": insert_repo_info}
+    for table, insert in inserters.items():
+        df = read_snapshot(table, since=since_date)
+        if not df.empty:
+            insert(conn, df, **load_opts)
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_opts = {"loader": args.loader, "page_size": args.page_size, "conflict": args.conflict}
+
+    with pooled_connection() as conn:
+        create_tables(conn)
+        if args.source == "snapshot":
+            load_snapshots(conn, load_opts, args.since_date)
+        else:
+            load_csv_folder(conn, load_opts)
+
+    # Everything fetched so far is now in the DB: advance the high-water marks
+    sync_state = SyncState()
+    sync_state.commit()
+    sync_state.save()
+
+    # Refit forecasts whose input series changed, so queries hit the cache
+    if not args.skip_forecasts:
+        forecasting.precompute_forecasts()
 
-    conn.close()
     print("🎉 PHASE 3 COMPLETED SUCCESSFULLY!")
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+from repos_list import REPOS
+
+# ------------------------------
+# Local stand-in for the GitHub REST API
+# ------------------------------
+# Serves /repos/<owner>/<name>, /issues and /commits for a set of repos
+# with synthetic records, Link pagination, ETags and per-token rate-limit
+# headers. Point the harvester at it with GITHUB_API_URL=http://127.0.0.1:<port>.
+#
+# Record i of a repo is generated from (seed, repo, i) alone and timestamps
+# grow with i, so any page of any size is produced on demand and ?since=
+# maps to a start index arithmetically: nothing is held in memory.
+
+# Records are spread over the year before the server started, at most 10 minutes apart
+SPAN_SECONDS = 365 * 86400
+MAX_STEP_SECONDS = 600
+TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+class SyntheticRepo:
+    def __init__(self, full_name, n_issues, n_commits, seed=0, end=None):
+        self.full_name = full_name
+        self.n_issues = n_issues
+        self.n_commits = n_commits
+        self.seed = seed
+        self.repo_id = int(hashlib.sha1(full_name.encode()).hexdigest()[:8], 16)
+        self.api_url = f"https://api.github.com/repos/{full_name}"
+        n = max(n_issues, n_commits, 1)
+        self.step = max(1, min(MAX_STEP_SECONDS, SPAN_SECONDS // n))
+        end = end or datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.start = end - timedelta(seconds=n * self.step)
+
+    def _ts(self, seconds):
+        return (self.start + timedelta(seconds=seconds)).strftime(TS_FORMAT)
+
+    def _rng(self, kind, i):
+        return random.Random(f"{self.seed}:{self.full_name}:{kind}:{i}")
+
+    def issue(self, i):
+        rng = self._rng("issue", i)
+        created = i * self.step
+        closed = created + rng.randint(3600, 30 * 86400) if rng.random() < 0.7 else None
+        user = {"login": f"user{rng.randint(1, 500)}", "id": rng.randint(1, 10**6)}
+        return {
+            "id": self.repo_id * 10**7 + i,
+            "repository_url": self.api_url,
+            "number": i + 1,
+            "title": f"Synthetic issue {i + 1}",
+            "user": user,
+            "state": "closed" if closed is not None else "open",
+            "locked": False,
+            "assignee": None,
+            "assignees": [],
+            "milestone": None,
+            "comments": rng.randint(0, 40),
+            "created_at": self._ts(created),
+            # Updated in index order, so ?since= filters a contiguous range
+            "updated_at": self._ts(created + self.step // 2),
+            "closed_at": self._ts(closed) if closed is not None else None,
+            "body": "Synthetic issue body",
+        }
+
+    def commit(self, i):
+        rng = self._rng("commit", i)
+        sha = hashlib.sha1(f"{self.full_name}:{i}".encode()).hexdigest()
+        login = f"dev{rng.randint(1, 200)}"
+        date = self._ts(i * self.step)
+        return {
+            "sha": sha,
+            "node_id": f"C_{sha[:20]}",
+            "commit": {
+                "author": {"name": login, "email": f"{login}@example.com", "date": date},
+                "committer": {"name": login, "email": f"{login}@example.com", "date": date},
+                "message": f"Synthetic commit {i + 1}",
+            },
+            "url": f"{self.api_url}/commits/{sha}",
+            "html_url": f"https://github.com/{self.full_name}/commit/{sha}",
+            "comments_url": f"{self.api_url}/commits/{sha}/comments",
+            "author": {"login": login, "id": rng.randint(1, 10**6)},
+            "committer": {"login": login, "id": rng.randint(1, 10**6)},
+            "parents": [],
+        }
+
+    def metadata(self):
+        rng = self._rng("repo", 0)
+        owner, name = self.full_name.split("/")
+        return {
+            "id": self.repo_id,
+            "name": name,
+            "full_name": self.full_name,
+            "description": f"Synthetic repository {self.full_name}",
+            "html_url": f"https://github.com/{self.full_name}",
+            "stargazers_count": rng.randint(0, 10**5),
+            "watchers_count": rng.randint(0, 10**5),
+            "forks_count": rng.randint(0, 10**4),
+            "open_issues_count": rng.randint(0, 10**3),
+            "language": "Python",
+            "created_at": self._ts(0),
+            "updated_at": self._ts(max(self.n_issues, self.n_commits) * self.step),
+            "pushed_at": self._ts(max(self.n_issues, self.n_commits) * self.step),
+        }
+
+    def first_index(self, since, offset):
+        """First record index whose timestamp (i * step + offset) is >= since."""
+        if not since:
+            return 0
+        try:
+            cutoff = datetime.strptime(since[:19] + "Z", TS_FORMAT).replace(tzinfo=timezone.utc)
+        except ValueError:
+            return 0
+        seconds = (cutoff - self.start).total_seconds() - offset
+        return max(0, -int(-seconds // self.step))
+
+class FakeGitHub:
+    """
+    Data plus behaviour of the fake API. Every token has `limit` requests
+    per `window` seconds; an exhausted token gets 403 + X-RateLimit-Remaining: 0.
+    fail_rate answers that share of requests with a 502, and
+    secondary_rate answers that share with 429 + Retry-After.
+    """
+
+    def __init__(self, repos=REPOS, n_issues=200, n_commits=200, limit=5000, window=3600,
+                 fail_rate=0.0, secondary_rate=0.0, retry_after=1, seed=0):
+        self.repos = {name: SyntheticRepo(name, n_issues, n_commits, seed) for name in repos}
+        self.limit = limit
+        self.window = window
+        self.fail_rate = fail_rate
+        self.secondary_rate = secondary_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._quota = {}   # token -> (remaining, reset_at)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "rate_limited": 0, "secondary": 0, "failed": 0}
+
+    def _charge(self, token):
+        """(allowed, remaining, reset_at) for one request with `token`."""
+        now = time.time()
+        with self._lock:
+            remaining, reset_at = self._quota.get(token, (self.limit, now + self.window))
+            if now >= reset_at:
+                remaining, reset_at = self.limit, now + self.window
+            allowed = remaining > 0
+            if allowed:
+                remaining -= 1
+            self._quota[token] = (remaining, reset_at)
+            return allowed, remaining, math.ceil(reset_at)
+
+    def _roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def page(self, repo, endpoint, query):
+        """(records, next page number or None) for a list endpoint."""
+        per_page = min(int(query.get("per_page", 30)), 100)
+        page = max(int(query.get("page", 1)), 1)
+        if endpoint == "issues":
+            total, make, offset = repo.n_issues, repo.issue, repo.step // 2
+        else:
+            total, make, offset = repo.n_commits, repo.commit, 0
+        first = repo.first_index(query.get("since"), offset) + (page - 1) * per_page
+        records = [make(i) for i in range(first, min(first + per_page, total))]
+        return records, (page + 1 if first + per_page < total else None)
+
+    def handle(self, path, query, headers):
+        """(status, response headers, body) for one GET."""
+        self._count("requests")
+        token = (headers.get("Authorization") or "").removeprefix("Bearer ").strip() or "anonymous"
+        allowed, remaining, reset_at = self._charge(token)
+        out = {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(reset_at),
+            "X-RateLimit-Used": str(self.limit - remaining),
+            "X-RateLimit-Resource": "core",
+        }
+        if not allowed:
+            self._count("rate_limited")
+            return 403, out, {"message": "API rate limit exceeded for token."}
+        if self._roll(self.secondary_rate):
+            self._count("secondary")
+            return 429, {**out, "Retry-After": str(self.retry_after)}, {"message": "You have exceeded a secondary rate limit."}
+        if self._roll(self.fail_rate):
+            self._count("failed")
+            return 502, out, {"message": "Server Error"}
+
+        parts = path.strip("/").split("/")
+        if len(parts) < 3 or parts[0] != "repos" or f"{parts[1]}/{parts[2]}" not in self.repos:
+            return 404, out, {"message": "Not Found"}
+        repo = self.repos[f"{parts[1]}/{parts[2]}"]
+        if len(parts) == 3:
+            return 200, out, repo.metadata()
+        if len(parts) != 4 or parts[3] not in ("issues", "commits"):
+            return 404, out, {"message": "Not Found"}
+
+        records, next_page = self.page(repo, parts[3], query)
+        if next_page is not None:
+            next_query = urlencode({**query, "page": next_page})
+            out["Link"] = f'<{headers["_base"]}{path}?{next_query}>; rel="next"'
+        return 200, out, records
+
+def _handler(api):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            headers = {**self.headers, "_base": f"http://{self.headers.get('Host')}"}
+            status, out, body = api.handle(url.path, query, headers)
+
+            payload = json.dumps(body).encode()
+            etag = '"' + hashlib.sha1(payload).hexdigest() + '"'
+            if status == 200 and self.headers.get("If-None-Match") == etag:
+                api._count("not_modified")
+                status, payload = 304, b""
+
+            self.send_response(status)
+            for key, value in out.items():
+                self.send_header(key, value)
+            if status in (200, 304):
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def start_fake_api(api=None, port=0, **options):
+    """Serve `api` (or FakeGitHub(**options)) in a background thread. Returns (server, base_url)."""
+    api = api or FakeGitHub(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(api))
+    server.daemon_threads = True
+    server.api = api
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake GitHub API with rate-limit headers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--issues", type=int, default=200, help="issues per repo")
+    parser.add_argument("--commits", type=int, default=200, help="commits per repo")
+    parser.add_argument("--limit", type=int, default=5000, help="requests per token per window")
+    parser.add_argument("--window", type=int, default=3600, help="rate-limit window in seconds")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 502")
+    parser.add_argument("--secondary-rate", type=float, default=0.0,
+                        help="share of requests answered with 429 + Retry-After")
+    args = parser.parse_args()
+
+    server, base_url = start_fake_api(
+        port=args.port, n_issues=args.issues, n_commits=args.commits, limit=args.limit,
+        window=args.window, fail_rate=args.fail_rate, secondary_rate=args.secondary_rate
+    )
+    print(f"🧪 Fake GitHub API on {base_url} (GITHUB_API_URL={base_url})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
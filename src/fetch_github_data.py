@@ -1,67 +1,402 @@
 import os
+import json
+import argparse
+import hashlib
+import time
+import threading
 import requests
 import pandas as pd
-from datetime import datetime
-from utils import get_github_token, get_date_range
-from repos_list import REPOS
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qsl, urlsplit
+from requests.adapters import HTTPAdapter
+from utils import get_github_tokens
+from sync_state import SyncState, FetchCheckpoint
+from rate_limit import TokenPool, FETCH_MAX_RETRIES, SECONDARY_LIMIT_WAIT, backoff_delay, retry_after_seconds
+from db_connect import pooled_connection
+from forecasting import precompute_forecasts
+from snapshot_store import write_snapshot
+from db_insert import (
+    create_tables, insert_issues, insert_commits, insert_repo_info,
+    LOADERS, DEFAULT_LOADER, CONFLICT_MODES, DEFAULT_CONFLICT
+)
+from repo_catalog import catalog_repos
 
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
 os.makedirs(DATA_FOLDER, exist_ok=True)
 
-BASE_URL = "https://api.github.com"
+# Cached response bodies + ETags, so unchanged pages can be answered with 304
+HTTP_CACHE_FOLDER = os.path.join(DATA_FOLDER, ".http_cache")
 
-def fetch_issues(repo, token, since):
-    print(f"📥 Fetching issues for {repo}...")
-    url = f"{BASE_URL}/repos/{repo}/issues"
-    params = {"since": since, "state": "all", "per_page": 100}
-    headers = {"Authorization": f"Bearer {token}"}
+# Overridable so the harvester can be pointed at a local stand-in server
+BASE_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+PER_PAGE = 100
+MAX_WORKERS = int(os.getenv("FETCH_WORKERS", 8))
+REQUEST_TIMEOUT = 30
 
-    r = requests.get(url, params=params, headers=headers)
-    r.raise_for_status()
-    return r.json()
+# ------------------------------
+# ETag cache (one JSON file per request)
+# ------------------------------
+class EtagCache:
+    def __init__(self, folder=HTTP_CACHE_FOLDER):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
 
-def fetch_commits(repo, token, since):
-    print(f"📥 Fetching commits for {repo}...")
-    url = f"{BASE_URL}/repos/{repo}/commits"
-    params = {"since": since, "per_page": 100}
-    headers = {"Authorization": f"Bearer {token}"}
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
 
-    r = requests.get(url, params=params, headers=headers)
-    r.raise_for_status()
-    return r.json()
+    def load(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
 
-def fetch_repo_metadata(repo, token):
-    print(f"📥 Fetching metadata for {repo}...")
-    url = f"{BASE_URL}/repos/{repo}"
-    headers = {"Authorization": f"Bearer {token}"}
+    def store(self, key, etag, body, next_url):
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"etag": etag, "next": next_url, "body": body}, f)
+        os.replace(tmp_path, self._path(key))
+
+# ------------------------------
+# GitHub client (shared session, token pool, pagination, conditional requests)
+# ------------------------------
+# Worth retrying: the same request may succeed a little later
+RETRY_STATUSES = {500, 502, 503, 504}
+# Query parameters left out of the ETag cache key (they change between runs)
+VOLATILE_PARAMS = ("since",)
+
+class GitHubClient:
+    def __init__(self, tokens, base_url=BASE_URL, cache=None, pool_size=MAX_WORKERS,
+                 token_pool=None, max_retries=FETCH_MAX_RETRIES, sleep=time.sleep):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache if cache is not None else EtagCache()
+        # Each request is sent with whichever token has quota (see rate_limit.py)
+        self.tokens = token_pool or TokenPool(tokens)
+        self.max_retries = max_retries
+        self.sleep = sleep
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/vnd.github+json"})
+
+        self.stats = {"requests": 0, "not_modified": 0, "rate_limited": 0, "retries": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _cache_key(url, params):
+        """
+        One cache entry per page, whatever `since` it was asked with. The
+        window start moves on every run; the server still compares the
+        ETag against the page it would send now, so a 304 stays correct.
+        """
+        parsed = urlsplit(url)
+        query = {k: v for k, v in parse_qsl(parsed.query)}
+        query.update({k: str(v) for k, v in (params or {}).items() if v is not None})
+        for name in VOLATILE_PARAMS:
+            query.pop(name, None)
+        raw = parsed._replace(query="").geturl() + "?" + json.dumps(query, sort_keys=True)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _rate_limited(self, state, r):
+        """
+        True when a 403/429 is a rate limit (retry, possibly on another
+        token) rather than a real permission error.
+        """
+        if r.status_code not in (403, 429):
+            return False
+        now = self.tokens.clock()
+        wait = retry_after_seconds(r.headers, now)
+        if wait is not None:
+            self.tokens.block(state, now + wait)
+        elif r.headers.get("X-RateLimit-Remaining") == "0":
+            pass   # update() already parked the token until its reset
+        elif "rate limit" in r.text.lower():
+            self.tokens.block(state, now + SECONDARY_LIMIT_WAIT)
+        else:
+            return False
+        self._count("rate_limited")
+        return True
+
+    def get(self, url, params=None):
+        """
+        GET one page. Returns (body, next_url). A 304 answer is served from
+        the local cache and does not count against the rate limit. Rate
+        limits, 5xx answers and connection errors are retried (up to
+        max_retries times) before the error is raised.
+        """
+        key = self._cache_key(url, params)
+        cached = self.cache.load(key)
+        headers = {"If-None-Match": cached["etag"]} if cached else {}
+
+        for attempt in range(self.max_retries + 1):
+            state = self.tokens.acquire()
+            try:
+                r = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT,
+                                     headers={**headers, "Authorization": f"Bearer {state.token}"})
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            else:
+                self._count("requests")
+                self.tokens.update(state, r.headers)
+
+                if r.status_code == 304 and cached:
+                    self._count("not_modified")
+                    # The cached next link may carry an older since=
+                    return cached["body"], r.links.get("next", {}).get("url", cached.get("next"))
+
+                if self._rate_limited(state, r):
+                    # The token pool waits for the reset / Retry-After
+                    error = requests.HTTPError(f"{r.status_code} rate limited: {url}", response=r)
+                    continue
+                if r.status_code not in RETRY_STATUSES:
+                    r.raise_for_status()
+                    break
+                error = requests.HTTPError(f"{r.status_code} Server Error: {url}", response=r)
+
+            if attempt < self.max_retries:
+                self._count("retries")
+                self.sleep(backoff_delay(attempt))
+        else:
+            raise error
+
+        body = r.json()
+        next_url = r.links.get("next", {}).get("url")
+
+        etag = r.headers.get("ETag")
+        if etag:
+            self.cache.store(key, etag, body, next_url)
+        return body, next_url
+
+    def iter_pages(self, path, params=None, start_url=None):
+        """
+        Yield (page, next_url) for every page of a list endpoint by following
+        the Link: next header, optionally resuming at start_url.
+        """
+        url = start_url or f"{self.base_url}{path}"
+        if start_url:
+            # A next link already carries the full query string
+            params = None
+        while url:
+            body, url = self.get(url, params)
+            params = None
+            yield body, url
+
+    def get_all(self, path, params=None):
+        records = []
+        for page, _ in self.iter_pages(path, params):
+            records.extend(page)
+        return records
+
+# ------------------------------
+# Endpoints (each yields (page of records, next page URL))
+# ------------------------------
+def issue_pages(client, repo, since, start_url=None):
+    params = {"since": since, "state": "all", "per_page": PER_PAGE}
+    return client.iter_pages(f"/repos/{repo}/issues", params, start_url)
+
+def commit_pages(client, repo, since, start_url=None):
+    params = {"since": since, "per_page": PER_PAGE}
+    return client.iter_pages(f"/repos/{repo}/commits", params, start_url)
+
+def repo_metadata_pages(client, repo, since=None, start_url=None):
+    body, _ = client.get(f"{client.base_url}/repos/{repo}")
+    yield [body], None
 
-    r = requests.get(url, headers=headers)
-    r.raise_for_status()
-    return r.json()
+ENDPOINTS = {
+    "issues": issue_pages,
+    "commits": commit_pages,
+    "repo_info": repo_metadata_pages,
+}
 
+def fetch_issues(client, repo, since):
+    print(f"📥 Fetching issues for {repo}...")
+    return [r for page, _ in issue_pages(client, repo, since) for r in page]
+
+def fetch_commits(client, repo, since):
+    print(f"📥 Fetching commits for {repo}...")
+    return [r for page, _ in commit_pages(client, repo, since) for r in page]
+
+def fetch_repo_metadata(client, repo):
+    print(f"📥 Fetching metadata for {repo}...")
+    return next(repo_metadata_pages(client, repo))[0]
+
+# ------------------------------
+# Sinks
+# ------------------------------
 def save_to_csv(data, filename):
     df = pd.DataFrame(data)
     out_path = os.path.join(DATA_FOLDER, filename)
     df.to_csv(out_path, index=False)
     print(f"💾 Saved: {out_path}")
 
-if __name__ == "__main__":
-    token = get_github_token()
-    since = get_date_range()
+def save_records(records, repo, endpoint, sink):
+    """Write one finished (repo, endpoint) for a collecting sink (csv/both or parquet)."""
+    if sink in ("csv", "both"):
+        save_to_csv(records, f"{endpoint}_{repo.replace('/', '_')}.csv")
+    elif sink == "parquet":
+        write_snapshot(records, endpoint, repo)
+
+class DbSink:
+    """
+    Flatten each fetched page and bulk-load it into Postgres as it arrives,
+    so memory stays bounded by the page size and nested fields (user,
+    author, ...) are still real dicts when they are flattened.
+    """
+
+    INSERTERS = {
+        "issues": insert_issues,
+        "commits": insert_commits,
+        "repo_info": insert_repo_info,
+    }
+
+    def __init__(self, sync_state=None, **load_opts):
+        self.sync_state = sync_state
+        self.load_opts = load_opts
+
+    def __call__(self, repo, endpoint, page):
+        if not page:
+            return
+        # One pooled connection per page: concurrent fetch threads never share one
+        with pooled_connection() as conn:
+            self.INSERTERS[endpoint](conn, pd.DataFrame(page), **self.load_opts)
+        if self.sync_state is not None:
+            self.sync_state.observe(repo, endpoint, page)
 
-    for repo in REPOS:
-        repo_clean = repo.replace("/", "_")
+# ------------------------------
+# Fan-out across repos and endpoints
+# ------------------------------
+def _run_endpoint(client, repo, endpoint, since, on_page, collect, checkpoint):
+    # Only a streaming sink has already persisted the pages before the saved position
+    start_url = checkpoint.next_url(repo, endpoint) if checkpoint is not None and not collect else None
+    print(f"📥 Fetching {endpoint} for {repo}{' (resuming)' if start_url else ''}...")
+    records = []
+    for page, next_url in ENDPOINTS[endpoint](client, repo, since, start_url):
+        if on_page is not None:
+            on_page(repo, endpoint, page)
+        if collect:
+            records.extend(page)
+        elif checkpoint is not None and next_url:
+            checkpoint.page_done(repo, endpoint, next_url)
+    return records
 
-        # Fetch issues
-        issues = fetch_issues(repo, token, since)
-        save_to_csv(issues, f"issues_{repo_clean}.csv")
+def fetch_all(repos, tokens, since, base_url=BASE_URL, workers=MAX_WORKERS, client=None,
+              on_page=None, on_done=None, collect=True, checkpoint=None, report=True):
+    """
+    Fetch every (repo, endpoint) pair on a bounded thread pool sharing one
+    HTTP session and token pool. `since` is either an ISO timestamp or a
+    callable since(repo, endpoint), e.g. SyncState.since. Each page is
+    handed to on_page(repo, endpoint, page) as it arrives (e.g. a DbSink),
+    and each finished pair to on_done(repo, endpoint, records).
 
-        # Fetch commits
-        commits = fetch_commits(repo, token, since)
-        save_to_csv(commits, f"commits_{repo_clean}.csv")
+    A failing pair no longer aborts the run. Returns (results, failed):
+    {(repo, endpoint): records} (empty lists when collect=False) and
+    {(repo, endpoint): exception}. Pairs a FetchCheckpoint marks as done
+    are skipped. report=False skips the request/token summary.
+    """
+    client = client or GitHubClient(tokens, base_url=base_url, pool_size=workers)
+    since_for = since if callable(since) else (lambda repo, endpoint: since)
+    results, failed = {}, {}
 
-        # Fetch metadata (stars, forks, watchers)
-        meta = fetch_repo_metadata(repo, token)
-        save_to_csv([meta], f"repo_info_{repo_clean}.csv")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_run_endpoint, client, repo, endpoint, since_for(repo, endpoint),
+                        on_page, collect, checkpoint): (repo, endpoint)
+            for repo in repos
+            for endpoint in ENDPOINTS
+            if checkpoint is None or not checkpoint.is_done(repo, endpoint)
+        }
+        for future in as_completed(futures):
+            repo, endpoint = futures[future]
+            try:
+                results[(repo, endpoint)] = future.result()
+                if on_done is not None:
+                    on_done(repo, endpoint, results[(repo, endpoint)])
+            except Exception as e:
+                print(f"❌ {endpoint} for {repo} failed: {e}")
+                failed[(repo, endpoint)] = e
+                continue
+            if checkpoint is not None:
+                checkpoint.pair_done(repo, endpoint)
 
+    if not report:
+        return results, failed
+    stats = client.stats
+    print(f"🌐 {stats['requests']} requests, {stats['not_modified']} served from cache (304), "
+          f"{stats['rate_limited']} rate limited, {stats['retries']} retried")
+    for token in client.tokens.stats():
+        print(f"   🔑 {token['token']}: {token['requests']} requests, {token['remaining']}/{token['limit']} left")
+    return results, failed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch GitHub issues, commits and repo metadata")
+    parser.add_argument("--sink", choices=("csv", "parquet", "db", "both"), default="csv",
+                        help="csv: write src/data/*.csv for db_insert.py; parquet: write typed "
+                             "snapshots to src/data/snapshots; db: stream pages straight "
+                             "into Postgres; both: csv + db (default: %(default)s)")
+    parser.add_argument("--loader", choices=LOADERS, default=DEFAULT_LOADER)
+    parser.add_argument("--conflict", choices=CONFLICT_MODES, default=DEFAULT_CONFLICT)
+    parser.add_argument("--skip-forecasts", action="store_true",
+                        help="with a db sink, don't refit stale cached forecasts afterwards")
+    parser.add_argument("--restart", action="store_true",
+                        help="ignore the checkpoint of an interrupted run and fetch everything")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tokens = get_github_tokens()
+    sync_state = SyncState()
+    to_csv = args.sink in ("csv", "both")
+    to_parquet = args.sink == "parquet"
+
+    checkpoint = FetchCheckpoint(args.sink)
+    if args.restart:
+        checkpoint.clear()
+        checkpoint = FetchCheckpoint(args.sink)
+    elif checkpoint.resumed:
+        print(f"♻️ Resuming interrupted run: {len(checkpoint.state['done'])} endpoint(s) already fetched")
+
+    sink = None
+    if args.sink in ("db", "both"):
+        with pooled_connection() as conn:
+            create_tables(conn)
+        sink = DbSink(sync_state, loader=args.loader, conflict=args.conflict)
+
+    def on_done(repo, endpoint, records):
+        save_records(records, repo, endpoint, args.sink)
+        if to_csv or to_parquet:
+            sync_state.observe(repo, endpoint, records)
+        if sink is not None:
+            # Streamed pages are already in the DB; otherwise marks stay
+            # pending until db_insert.py has loaded the files
+            sync_state.commit(repo, endpoint)
+        sync_state.mark_fetched(repo, endpoint)
+        sync_state.save()
+
+    repos = catalog_repos()
+    print(f"🔑 {len(tokens)} GitHub token(s), {len(repos)} repo(s)")
+    # Only the delta since each repo's last loaded high-water mark is fetched
+    _, failed = fetch_all(repos, tokens, sync_state.since, on_page=sink, on_done=on_done,
+                          collect=to_csv or to_parquet, checkpoint=checkpoint)
+
+    # A half-fetched delta must not move its mark past the pages never fetched
+    for repo, endpoint in failed:
+        sync_state.discard(repo, endpoint)
+    sync_state.save()
+
+    if sink is not None and not args.skip_forecasts:
+        precompute_forecasts()
+
+    if failed:
+        print(f"\n⚠️ {len(failed)} endpoint(s) failed; run again to resume from {checkpoint.path}")
+        raise SystemExit(1)
+    checkpoint.clear()
     print("\n🎉 PHASE 2 COMPLETED SUCCESSFULLY!")
+
+if __name__ == "__main__":
+    main()
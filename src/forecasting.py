@@ -0,0 +1,322 @@
+import os
+import json
+import signal
+import hashlib
+import threading
+import argparse
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from db_connect import pooled_connection
+
+FORECAST_HORIZON = 30
+FORECAST_WORKERS = int(os.getenv("FORECAST_WORKERS", os.cpu_count() or 1))
+FORECAST_FIT_TIMEOUT = float(os.getenv("FORECAST_FIT_TIMEOUT", 120))
+PREDICTION_COLUMNS = ["repo", "ds", "yhat", "yhat_lower", "yhat_upper"]
+# get_forecasts also says whether the data changed since the fit
+CACHED_COLUMNS = PREDICTION_COLUMNS + ["stale"]
+
+# metric -> (rollup table, count column, model)
+METRICS = {
+    "issues_created": ("daily_issue_activity", "created_count", "prophet"),
+    "issues_closed": ("daily_issue_activity", "closed_count", "prophet"),
+    "commits": ("daily_commit_activity", "commit_count", "sarimax"),
+}
+
+# One row per (repo, metric): the fitted model and its predictions, valid
+# while data_version matches the current daily series
+FORECAST_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS forecast_cache (
+        repo TEXT NOT NULL,
+        metric TEXT NOT NULL,
+        data_version TEXT NOT NULL,
+        model TEXT NOT NULL,
+        params TEXT,
+        predictions JSONB NOT NULL,
+        fitted_at TIMESTAMPTZ DEFAULT now(),
+        PRIMARY KEY (repo, metric)
+    );
+"""
+
+# ------------------------------
+# Input series
+# ------------------------------
+def _check_metric(metric):
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {list(METRICS)}, got '{metric}'")
+    return METRICS[metric]
+
+def load_series(conn, metric, repos=None):
+    """Daily series per repo from the rollup tables, missing days filled with 0."""
+    table, col, _ = _check_metric(metric)
+    sql = f"SELECT repo, day, {col} AS y FROM {table} WHERE {col} > 0"
+    params = []
+    if repos:
+        sql += " AND repo = ANY(%s)"
+        params.append(list(repos))
+    df = pd.read_sql(sql + " ORDER BY repo, day;", conn, params=params or None)
+
+    series = {}
+    for repo, group in df.groupby("repo"):
+        s = group.set_index(pd.to_datetime(group["day"]))["y"].astype(float)
+        series[repo] = s.asfreq("D", fill_value=0.0)
+    return series
+
+def data_version(series):
+    """Changes whenever any day's count, or the date range, changes."""
+    h = hashlib.sha1()
+    h.update(f"{series.index.min()}|{series.index.max()}|".encode())
+    h.update(series.to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+# ------------------------------
+# Model fitting (runs in worker processes; heavy imports stay lazy)
+# ------------------------------
+def fit_prophet(series, horizon=FORECAST_HORIZON):
+    from prophet import Prophet
+    from prophet.serialize import model_to_json
+
+    history = pd.DataFrame({"ds": series.index, "y": series.values})
+    model = Prophet()
+    model.fit(history)
+    future = model.make_future_dataframe(periods=horizon, include_history=False)
+    pred = model.predict(future)[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+    return model_to_json(model), pred
+
+def fit_sarimax(series, horizon=FORECAST_HORIZON):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    result = SARIMAX(series, order=(1, 1, 1), seasonal_order=(1, 0, 0, 7)).fit(disp=False)
+    frame = result.get_forecast(steps=horizon).summary_frame()
+    pred = pd.DataFrame({
+        "ds": frame.index,
+        "yhat": frame["mean"].values,
+        "yhat_lower": frame["mean_ci_lower"].values,
+        "yhat_upper": frame["mean_ci_upper"].values,
+    })
+    return json.dumps(result.params.to_dict()), pred
+
+MODELS = {
+    "prophet": fit_prophet,
+    "sarimax": fit_sarimax,
+}
+
+def fit_forecast(series, model, horizon=FORECAST_HORIZON):
+    """Returns (serialized params, predictions[ds, yhat, yhat_lower, yhat_upper])."""
+    params, pred = MODELS[model](series, horizon)
+    pred["yhat_lower"] = pred["yhat_lower"].clip(lower=0)
+    pred["yhat"] = pred["yhat"].clip(lower=0)
+    return params, pred.reset_index(drop=True)
+
+class FitTimeout(Exception):
+    pass
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout("fit exceeded its timeout")
+
+def _alarm_available():
+    # SIGALRM is POSIX-only and can only be handled in the main thread
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+def _fit_job(job):
+    """
+    Fit one job within its timeout. The timeout is enforced with SIGALRM,
+    so a slow fit is abandoned without killing the pool worker (or, inline,
+    the caller's process). Where SIGALRM is not available (Windows), fits
+    run to completion.
+    """
+    repo, metric, version, model, series, horizon, timeout = job
+    use_alarm = bool(timeout) and _alarm_available()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        params, pred = fit_forecast(series, model, horizon)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    return repo, metric, version, model, params, pred
+
+def _fit_parallel(jobs, workers=FORECAST_WORKERS):
+    """
+    Yields (job, result, error) as fits finish, one process per fit at a
+    time. Each job carries its own timeout.
+    """
+    if not jobs:
+        return
+    workers = workers or FORECAST_WORKERS
+    if workers <= 1 or len(jobs) == 1:
+        if not any(job[-1] for job in jobs) or _alarm_available():
+            # Inline: no pool start-up; the alarm still enforces the timeout
+            for job in jobs:
+                try:
+                    yield job, _fit_job(job), None
+                except Exception as e:
+                    yield job, None, e
+            return
+        # Off the main thread (e.g. a background job) only a worker
+        # process can enforce the timeout
+        workers = 1
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = {pool.submit(_fit_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as e:
+                yield futures[future], None, e
+
+# ------------------------------
+# Cache
+# ------------------------------
+def _pred_to_json(pred):
+    out = pred.copy()
+    out["ds"] = pd.to_datetime(out["ds"]).dt.strftime("%Y-%m-%d")
+    return out.to_json(orient="records")
+
+def _pred_from_json(value):
+    records = json.loads(value) if isinstance(value, str) else value
+    pred = pd.DataFrame(records)
+    if not pred.empty:
+        pred["ds"] = pd.to_datetime(pred["ds"])
+    return pred
+
+def cached_versions(conn, metric):
+    with conn.cursor() as cur:
+        cur.execute("SELECT repo, data_version FROM forecast_cache WHERE metric = %s;", (metric,))
+        return dict(cur.fetchall())
+
+def store_forecast(conn, repo, metric, version, model, params, pred):
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO forecast_cache (repo, metric, data_version, model, params, predictions, fitted_at)
+            VALUES (%s, %s, %s, %s, %s, %s::jsonb, now())
+            ON CONFLICT (repo, metric) DO UPDATE SET
+                data_version = excluded.data_version,
+                model = excluded.model,
+                params = excluded.params,
+                predictions = excluded.predictions,
+                fitted_at = excluded.fitted_at;
+        """, (repo, metric, version, model, params, _pred_to_json(pred)))
+    conn.commit()
+
+# ------------------------------
+# Precompute (after each ingest) and lookup (at query time)
+# ------------------------------
+def forecast_repos(metric, repos=None, workers=FORECAST_WORKERS, timeout=FORECAST_FIT_TIMEOUT,
+                   horizon=FORECAST_HORIZON, model=None):
+    """
+    Fresh per-repo fits for a metric, run concurrently on a process pool.
+    Returns the combined predictions (repo, ds, yhat, yhat_lower, yhat_upper);
+    repos whose fit failed or timed out are listed in result.attrs["failed"].
+    Nothing is written to forecast_cache.
+    """
+    _, _, default_model = _check_metric(metric)
+    with pooled_connection() as conn:
+        series_by_repo = load_series(conn, metric, repos)
+
+    jobs = [
+        (repo, metric, None, model or default_model, series, horizon, timeout)
+        for repo, series in series_by_repo.items()
+        if (series > 0).sum() >= 2
+    ]
+    if not jobs:
+        # No repo matched, or none has enough data to fit
+        out = pd.DataFrame(columns=PREDICTION_COLUMNS)
+        out.attrs["failed"] = []
+        return out
+
+    frames, failed = [], []
+    for job, result, error in _fit_parallel(jobs, workers):
+        if error is not None:
+            failed.append(job[0])
+            print(f"❌ Forecast {metric} for {job[0]} failed: {error!r}")
+        else:
+            frames.append(result[-1].assign(repo=job[0]))
+
+    out = pd.concat(frames, ignore_index=True)[PREDICTION_COLUMNS] if frames else pd.DataFrame(columns=PREDICTION_COLUMNS)
+    out = out.sort_values(["repo", "ds"], ignore_index=True)
+    out.attrs["failed"] = sorted(failed)
+    return out
+
+def precompute_forecasts(metrics=None, workers=FORECAST_WORKERS, horizon=FORECAST_HORIZON,
+                         timeout=FORECAST_FIT_TIMEOUT):
+    """
+    Refit only the (repo, metric) pairs whose daily series changed since the
+    cached fit, on a process pool. Returns the number of models fitted.
+    """
+    jobs = []
+    with pooled_connection() as conn:
+        for metric in metrics or METRICS:
+            _, _, model = _check_metric(metric)
+            known = cached_versions(conn, metric)
+            for repo, series in load_series(conn, metric).items():
+                version = data_version(series)
+                # Prophet needs at least two non-zero points to fit
+                if known.get(repo) != version and (series > 0).sum() >= 2:
+                    jobs.append((repo, metric, version, model, series, horizon, timeout))
+
+    if not jobs:
+        print("🔮 Forecast cache is up to date")
+        return 0
+
+    print(f"🔮 Refitting {len(jobs)} forecast(s) on {workers} worker(s)...")
+    fitted = 0
+    with pooled_connection() as conn:
+        for job, result, error in _fit_parallel(jobs, workers):
+            if error is not None:
+                print(f"❌ Forecast {job[1]} for {job[0]} failed: {error!r}")
+                continue
+            store_forecast(conn, *result)
+            fitted += 1
+    print(f"🔮 Stored {fitted} forecast(s)")
+    return fitted
+
+def get_forecasts(metric, repos=None):
+    """
+    30-day predictions per repo for a metric, served from forecast_cache.
+    Never fits: a series whose data changed since its fit keeps its cached
+    predictions with stale=True until precompute_forecasts (run after each
+    load) refits it. Repos never fitted are listed in result.attrs["missing"].
+    Columns: repo, ds, yhat, yhat_lower, yhat_upper, stale.
+    """
+    _check_metric(metric)
+    frames, missing = [], []
+    with pooled_connection() as conn:
+        series_by_repo = load_series(conn, metric, repos)
+
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT repo, data_version, predictions FROM forecast_cache WHERE metric = %s;",
+                (metric,)
+            )
+            cached = {repo: (version, pred) for repo, version, pred in cur.fetchall()}
+
+    for repo, series in series_by_repo.items():
+        if repo not in cached:
+            missing.append(repo)
+            continue
+        version, pred = cached[repo]
+        frames.append(_pred_from_json(pred).assign(repo=repo, stale=version != data_version(series)))
+
+    out = pd.concat(frames, ignore_index=True)[CACHED_COLUMNS] if frames else pd.DataFrame(columns=CACHED_COLUMNS)
+    stale = sorted(out.loc[out["stale"].astype(bool), "repo"].unique())
+    if stale:
+        print(f"⚠️ Forecast {metric} is older than the data for {len(stale)} repo(s); "
+              f"refreshed by the next load or `python forecasting.py`")
+    out.attrs["stale"] = stale
+    out.attrs["missing"] = missing
+    return out
+
+def get_forecast(repo, metric):
+    return get_forecasts(metric, repos=[repo])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refit stale cached forecasts")
+    parser.add_argument("--metric", choices=list(METRICS), action="append",
+                        help="metric to refresh (repeatable, default: all)")
+    parser.add_argument("--workers", type=int, default=FORECAST_WORKERS)
+    parser.add_argument("--timeout", type=float, default=FORECAST_FIT_TIMEOUT,
+                        help="seconds allowed per fit (default: %(default)s)")
+    args = parser.parse_args()
+    precompute_forecasts(args.metric, workers=args.workers, timeout=args.timeout)
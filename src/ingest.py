@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import queue
+import signal
+import argparse
+import multiprocessing as mp
+from datetime import datetime, timezone
+from utils import get_github_tokens
+from repo_catalog import CATALOG_FILE, load_catalog, due_entries
+from sync_state import DATA_FOLDER, SyncState, FetchCheckpoint
+
+# ------------------------------
+# Sharded ingestion
+# ------------------------------
+# The parent hands repos out one at a time, highest priority first, to N
+# worker processes. Each worker has its own HTTP session, token pool and
+# DB connection pool, and fetches and loads whole repos. Workers never write
+# shared files: sync marks, checkpoint progress and failures are sent to the
+# parent, which owns sync_state.json, the checkpoint and the run report.
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_REPORT_FILE = os.getenv("INGEST_REPORT_FILE", os.path.join(DATA_FOLDER, "ingest_report.json"))
+
+# fetch_github_data.ENDPOINTS. That module (and db_connect with it) is only
+# imported inside workers, after their connection pool size is set.
+ENDPOINT_NAMES = ("issues", "commits", "repo_info")
+
+def _token_shards(tokens, workers):
+    """
+    (tokens, share) per worker. Disjoint token subsets when there are enough
+    tokens; otherwise every worker shares all of them and gets a 1/workers
+    share of their quota. Response headers keep each worker's view of the
+    remaining quota in sync, and the share keeps their combined pace within it.
+    """
+    if len(tokens) >= workers:
+        return [(tokens[i::workers], 1.0) for i in range(workers)]
+    return [(tokens, 1.0 / workers)] * workers
+
+class _RelayCheckpoint(FetchCheckpoint):
+    """Worker side of the parent's checkpoint: reads its starting state, reports progress."""
+
+    def __init__(self, state, events, worker_id):
+        self.state = state
+        self.events = events
+        self.worker_id = worker_id
+
+    def page_done(self, repo, endpoint, next_url):
+        self.events.put(("page", self.worker_id, repo, endpoint, next_url))
+
+    def pair_done(self, repo, endpoint):
+        self.events.put(("pair_done", self.worker_id, repo, endpoint))
+
+# ------------------------------
+# Worker process
+# ------------------------------
+def _worker_main(worker_id, tasks, events, tokens, share, sink, load_opts, checkpoint_state):
+    # Ctrl+C is handled by the parent, which terminates the workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # One pooled connection per endpoint thread
+    os.environ["PG_POOL_MAX"] = str(len(ENDPOINT_NAMES))
+
+    from fetch_github_data import GitHubClient, DbSink, fetch_all, save_records
+    from rate_limit import TokenPool
+
+    # Read-only here: gives ?since= and collects pending marks to report
+    sync_state = SyncState()
+    checkpoint = _RelayCheckpoint(checkpoint_state, events, worker_id)
+    client = GitHubClient(tokens, pool_size=len(ENDPOINT_NAMES), token_pool=TokenPool(tokens, share=share))
+    db_sink = DbSink(sync_state, **load_opts) if sink in ("db", "both") else None
+    collect = sink != "db"
+    rows = {}
+
+    def on_page(repo, endpoint, page):
+        if db_sink is not None:
+            db_sink(repo, endpoint, page)
+        rows[(repo, endpoint)] = rows.get((repo, endpoint), 0) + len(page)
+
+    def on_done(repo, endpoint, records):
+        if collect:
+            save_records(records, repo, endpoint, sink)
+            sync_state.observe(repo, endpoint, records)
+        mark = sync_state.pending(repo, endpoint)
+        events.put(("pair", worker_id, repo, endpoint, mark, rows.pop((repo, endpoint), 0)))
+
+    while True:
+        repo = tasks.get()
+        if repo is None:
+            break
+        events.put(("start", worker_id, repo))
+        started = time.perf_counter()
+        try:
+            _, failed = fetch_all([repo], None, sync_state.since, client=client, workers=len(ENDPOINT_NAMES),
+                                  on_page=on_page, on_done=on_done, collect=collect,
+                                  checkpoint=checkpoint, report=False)
+        except Exception as e:
+            failed = {(repo, "*"): e}
+        for (_, endpoint), error in failed.items():
+            events.put(("failed", worker_id, repo, endpoint, f"{type(error).__name__}: {error}"))
+        events.put(("repo_done", worker_id, repo, time.perf_counter() - started, len(failed)))
+
+    events.put(("stats", worker_id, dict(client.stats), client.tokens.stats()))
+
+# ------------------------------
+# Parent: progress and failures
+# ------------------------------
+class IngestProgress:
+    """Central tally of what the workers report; written out as the run report."""
+
+    def __init__(self, total, workers):
+        self.total = total
+        self.workers = workers
+        self.started = time.perf_counter()
+        self.repos = {}       # repo -> {"worker", "seconds", "failed", "rows"}
+        self.failures = []    # {"repo", "endpoint", "error"}
+        self.http = {}
+        self.current = {}     # worker -> repo in flight
+
+    @property
+    def done(self):
+        return sum(1 for r in self.repos.values() if r.get("seconds") is not None)
+
+    def start(self, worker_id, repo):
+        self.current[worker_id] = repo
+        self.repos[repo] = {"worker": worker_id, "seconds": None, "failed": 0, "rows": 0}
+
+    def rows(self, repo, n):
+        self.repos[repo]["rows"] += n
+
+    def fail(self, repo, endpoint, error):
+        self.failures.append({"repo": repo, "endpoint": endpoint, "error": error})
+        print(f"❌ {endpoint} for {repo} failed: {error}")
+
+    def finish(self, worker_id, repo, seconds, failed):
+        self.current.pop(worker_id, None)
+        entry = self.repos[repo]
+        entry.update(seconds=round(seconds, 2), failed=failed)
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0
+        flag = f" ❌ {failed} failed" if failed else ""
+        print(f"📦 [{self.done}/{self.total}] {repo}: {entry['rows']} rows in {seconds:.1f}s "
+              f"(worker {worker_id}, {rate * 60:.0f} repos/min){flag}")
+
+    def add_stats(self, stats):
+        for key, value in stats.items():
+            self.http[key] = self.http.get(key, 0) + value
+
+    def report(self):
+        return {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "workers": self.workers,
+            "repos_total": self.total,
+            "repos_done": self.done,
+            "repos_failed": sorted({f["repo"] for f in self.failures}),
+            "rows": sum(r["rows"] for r in self.repos.values()),
+            "elapsed_seconds": round(time.perf_counter() - self.started, 2),
+            "http": self.http,
+            "failures": self.failures,
+            "repos": self.repos,
+        }
+
+def _handle(event, progress, sync_state, checkpoint, streamed):
+    kind, worker_id, *payload = event
+    if kind == "start":
+        progress.start(worker_id, payload[0])
+    elif kind == "page":
+        checkpoint.page_done(*payload)
+    elif kind == "pair":
+        repo, endpoint, mark, rows = payload
+        sync_state.observe_mark(repo, endpoint, mark)
+        if streamed:
+            # Already in the DB; collected files wait for db_insert.py
+            sync_state.commit(repo, endpoint)
+        sync_state.mark_fetched(repo, endpoint)
+        sync_state.save()
+        progress.rows(repo, rows)
+    elif kind == "pair_done":
+        checkpoint.pair_done(*payload)
+    elif kind == "failed":
+        repo, endpoint, error = payload
+        # A half-fetched delta must not move its mark past the pages never fetched
+        sync_state.discard(repo, endpoint)
+        progress.fail(repo, endpoint, error)
+    elif kind == "repo_done":
+        progress.finish(worker_id, *payload)
+    elif kind == "stats":
+        progress.add_stats(payload[0])
+
+# Events a worker queued just before dying may still be in flight
+CRASH_GRACE_SECONDS = 2.0
+
+def _reap_crashed(procs, progress, dead_since, grace=CRASH_GRACE_SECONDS):
+    """Fail the in-flight repo of every worker that has been dead for a while."""
+    now = time.monotonic()
+    for i, proc in enumerate(procs):
+        # A crashed worker loses the repo it had in flight
+        if proc.is_alive() or proc.exitcode == 0 or i not in progress.current:
+            continue
+        if now - dead_since.setdefault(i, now) >= grace:
+            repo = progress.current[i]
+            progress.fail(repo, "*", f"worker {i} exited with code {proc.exitcode}")
+            progress.finish(i, repo, 0.0, 1)
+
+def run_ingest(repos, workers=INGEST_WORKERS, sink="db", load_opts=None, restart=False):
+    """
+    Fetch and load `repos` (in order) on `workers` processes. Returns the
+    run report; it is also written to INGEST_REPORT_FILE.
+    """
+    tokens = get_github_tokens()
+    workers = max(1, min(workers, len(repos)))
+    sync_state = SyncState()
+    checkpoint = FetchCheckpoint(sink)
+    if restart:
+        checkpoint.clear()
+        checkpoint = FetchCheckpoint(sink)
+    elif checkpoint.resumed:
+        print(f"♻️ Resuming interrupted run: {len(checkpoint.state['done'])} endpoint(s) already fetched")
+
+    if sink in ("db", "both"):
+        from db_connect import pooled_connection
+        from db_insert import create_tables
+        with pooled_connection() as conn:
+            create_tables(conn)
+
+    # spawn: workers must not inherit the parent's DB connections or locks
+    ctx = mp.get_context("spawn")
+    tasks, events = ctx.Queue(), ctx.Queue()
+    for repo in repos:
+        tasks.put(repo)
+    for _ in range(workers):
+        tasks.put(None)
+
+    shards = _token_shards(tokens, workers)
+    procs = [
+        ctx.Process(target=_worker_main, daemon=True,
+                    args=(i, tasks, events, *shards[i], sink, load_opts or {}, checkpoint.state))
+        for i in range(workers)
+    ]
+    print(f"🚚 Ingesting {len(repos)} repo(s) on {workers} worker(s), {len(tokens)} token(s), sink {sink}")
+    for proc in procs:
+        proc.start()
+
+    progress = IngestProgress(len(repos), workers)
+    dead_since = {}
+    try:
+        while True:
+            try:
+                event = events.get(timeout=1)
+            except queue.Empty:
+                event = None
+            if event is not None:
+                _handle(event, progress, sync_state, checkpoint, streamed=sink in ("db", "both"))
+            if event is None and not any(proc.is_alive() for proc in procs):
+                # Queue drained: nothing more can arrive from the dead workers
+                _reap_crashed(procs, progress, dead_since, grace=0)
+                break
+            # Checked on every event too: a busy queue must not hide a crash
+            _reap_crashed(procs, progress, dead_since)
+    except KeyboardInterrupt:
+        print("\n🛑 Interrupted; progress is checkpointed, rerun to resume")
+        for proc in procs:
+            proc.terminate()
+        raise
+    finally:
+        sync_state.save()
+        for proc in procs:
+            proc.join(timeout=5)
+
+    report = progress.report()
+    os.makedirs(os.path.dirname(INGEST_REPORT_FILE) or ".", exist_ok=True)
+    with open(INGEST_REPORT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    if not report["failures"] and report["repos_done"] == len(repos):
+        checkpoint.clear()
+    return report
+
+def parse_args(argv=None):
+    from db_insert import LOADERS, DEFAULT_LOADER, CONFLICT_MODES, DEFAULT_CONFLICT
+
+    parser = argparse.ArgumentParser(description="Fetch and load the repo catalog on several worker processes")
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS,
+                        help="worker processes (default: %(default)s)")
+    parser.add_argument("--sink", choices=("csv", "parquet", "db", "both"), default="db",
+                        help="same as fetch_github_data.py (default: %(default)s)")
+    parser.add_argument("--all", action="store_true", help="ignore refresh intervals and fetch every enabled repo")
+    parser.add_argument("--limit", type=int, help="only the first N due repos (by priority)")
+    parser.add_argument("--catalog", default=CATALOG_FILE)
+    parser.add_argument("--loader", choices=LOADERS, default=DEFAULT_LOADER)
+    parser.add_argument("--conflict", choices=CONFLICT_MODES, default=DEFAULT_CONFLICT)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted run")
+    parser.add_argument("--skip-forecasts", action="store_true",
+                        help="with a db sink, don't refit stale cached forecasts afterwards")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    catalog = load_catalog(args.catalog)
+    if args.all:
+        entries = [e for e in catalog if e["enabled"]]
+    else:
+        entries = due_entries(catalog, SyncState(), ENDPOINT_NAMES)
+    entries = entries[:args.limit] if args.limit else entries
+    if not entries:
+        print("✅ Every repo in the catalog is within its refresh interval")
+        return
+
+    report = run_ingest([e["repo"] for e in entries], args.workers, args.sink,
+                        {"loader": args.loader, "conflict": args.conflict}, args.restart)
+
+    if args.sink in ("db", "both") and not args.skip_forecasts:
+        from forecasting import precompute_forecasts
+        precompute_forecasts()
+
+    http = report["http"]
+    print(f"\n🌐 {http.get('requests', 0)} requests, {http.get('not_modified', 0)} not modified, "
+          f"{http.get('rate_limited', 0)} rate limited, {http.get('retries', 0)} retried")
+    print(f"📊 {report['repos_done']}/{report['repos_total']} repos, {report['rows']} rows "
+          f"in {report['elapsed_seconds']:.1f}s; report: {INGEST_REPORT_FILE}")
+    if report["failures"]:
+        print(f"⚠️ {len(report['repos_failed'])} repo(s) with failures; rerun to resume")
+        raise SystemExit(1)
+    print("🎉 INGESTION COMPLETED SUCCESSFULLY!")
+
+if __name__ == "__main__":
+    main()
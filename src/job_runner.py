@@ -0,0 +1,160 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+QUERY_WORKERS = int(os.getenv("QUERY_WORKERS", 4))
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", 300))
+
+STAGES = ("load", "generate", "execute")
+FINAL_STATES = ("done", "failed", "cancelled", "timed_out")
+
+class JobCancelled(BaseException):
+    """
+    Raised by a job's own worker thread once it sees that the job was
+    cancelled or timed out. A BaseException, like KeyboardInterrupt, so
+    `except Exception` blocks in agents can't swallow it.
+    """
+
+class QueryJob:
+    """
+    State of one submitted query, shared between the worker and the UI.
+    Cancellation is cooperative: cancel() only sets a flag, which the worker
+    checks between stages and the stages check while they wait (stream
+    chunks, the sandbox). Nothing is interrupted mid-call, so pooled DB
+    connections, locks and HTTP clients are always released normally.
+    """
+
+    def __init__(self, query, timeout):
+        self.id = uuid.uuid4().hex[:8]
+        self.query = query
+        self.timeout = timeout
+        self.status = "queued"
+        self.stage = None
+        self.events = []          # (seconds since submit, message)
+        self.result = {}          # table_name, code, output, figures
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._timer = None
+
+    @property
+    def done(self):
+        return self.status in FINAL_STATES
+
+    @property
+    def elapsed(self):
+        return (self.finished_at or time.time()) - self.submitted_at
+
+    @property
+    def cancelled(self):
+        """True once the job was cancelled or timed out; safe from any thread."""
+        return self._stopped.is_set()
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job should stop; called by the worker and its stages."""
+        if self._stopped.is_set():
+            raise JobCancelled(self.status)
+
+    def log(self, message):
+        with self._lock:
+            self.events.append((round(self.elapsed, 2), message))
+
+    def _enter(self, stage):
+        self.check_cancelled()
+        with self._lock:
+            self.stage = stage
+        self.log(f"{stage} started")
+
+    def _stop(self, status):
+        """Move a queued/running job to a final state and ask its worker to stop."""
+        with self._lock:
+            if self.done:
+                return False
+            if self.status != "running":
+                self.finished_at = time.time()
+            self.status = status
+            self._stopped.set()
+        self.log(status.replace("_", " "))
+        return True
+
+    def cancel(self):
+        return self._stop("cancelled")
+
+    def _expire(self):
+        self._stop("timed_out")
+
+class JobRunner:
+    """
+    Runs the query pipeline (load -> generate -> execute) for many queries at
+    once on a thread pool. submit() returns immediately; the UI polls each
+    QueryJob for its stage, progress events and result.
+    """
+
+    def __init__(self, pipeline, max_workers=QUERY_WORKERS, timeout=QUERY_TIMEOUT):
+        # pipeline: {stage: fn(job, context) -> dict merged into context}
+        self.pipeline = pipeline
+        self.timeout = timeout
+        self.jobs = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+
+    def submit(self, query, timeout=None):
+        job = QueryJob(query, timeout or self.timeout)
+        self.jobs[job.id] = job
+        job.log("queued")
+        self._pool.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        return job.cancel() if job else False
+
+    def _run(self, job):
+        with job._lock:
+            if job.done:
+                return
+            job.status = "running"
+        # The deadline covers running time only, not time spent queued
+        job._timer = threading.Timer(job.timeout, job._expire)
+        job._timer.daemon = True
+        job._timer.start()
+
+        context = {"query": job.query}
+        final, error = None, None
+        try:
+            for stage in STAGES:
+                job._enter(stage)
+                context.update(self.pipeline[stage](job, context) or {})
+                job.result.update(context)
+                job.log(f"{stage} finished")
+            final, error = "done", None
+        except JobCancelled:
+            pass
+        except Exception as e:
+            final, error = "failed", f"{type(e).__name__}: {e}"
+        finally:
+            with job._lock:
+                # A cancel that came in after the last check has already set the status
+                if final and job.status == "running":
+                    job.status, job.error = final, error
+            job._timer.cancel()
+        job.finished_at = time.time()
+        if job.error:
+            job.log(f"{job.stage} failed: {job.error}")
+
+    def prune(self, keep=50):
+        """Forget the oldest finished jobs beyond `keep`."""
+        finished = sorted((j for j in self.jobs.values() if j.done), key=lambda j: j.submitted_at)
+        for job in finished[:max(0, len(finished) - keep)]:
+            self.jobs.pop(job.id, None)
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
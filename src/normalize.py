@@ -0,0 +1,245 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+# GitHub always returns timestamps like 2025-11-24T16:53:52Z (%z accepts the "Z")
+GITHUB_TS_FORMAT = "%Y-%m-%dT%H:%M:%S%z"
+
+# Literal strings that mean "no value" after a CSV round-trip
+NULL_TOKENS = ["NaT", "nan", "NaN", "None", ""]
+
+PRIMARY_KEYS = {"issues": "id", "commits": "sha", "repo_info": "id"}
+
+# ------------------------------
+# Column types per table (column order = INSERT column order)
+# ------------------------------
+# int      -> nullable Int64
+# bool     -> nullable boolean
+# datetime -> datetime64[UTC], parsed once per column
+# str      -> nullable string (dicts/lists are stringified)
+COLUMN_TYPES = {
+    "issues": {
+        "id": "int",
+        "repository_url": "str",
+        "number": "int",
+        "title": "str",
+        "user_login": "str",
+        "state": "str",
+        "locked": "bool",
+        "assignee": "str",
+        "assignees": "str",
+        "milestone": "str",
+        "comments": "int",
+        "created_at": "datetime",
+        "updated_at": "datetime",
+        "closed_at": "datetime",
+        "body": "str",
+    },
+    "commits": {
+        "sha": "str",
+        "node_id": "str",
+        "url": "str",
+        "html_url": "str",
+        "comments_url": "str",
+        "author": "str",
+        "committer": "str",
+        "parents": "str",
+        "repo": "str",
+        "author_login": "str",
+        "committed_at": "datetime",
+    },
+    "repo_info": {
+        "id": "int",
+        "name": "str",
+        "full_name": "str",
+        "description": "str",
+        "html_url": "str",
+        "stargazers_count": "int",
+        "watchers_count": "int",
+        "forks_count": "int",
+        "open_issues_count": "int",
+        "language": "str",
+        "created_at": "datetime",
+        "updated_at": "datetime",
+        "pushed_at": "datetime",
+    },
+}
+
+# ------------------------------
+# Column converters
+# ------------------------------
+def parse_datetime(s):
+    """Vectorized UTC parse: fixed GitHub format first, ISO8601 for whatever is left."""
+    parsed = pd.to_datetime(s, utc=True, format=GITHUB_TS_FORMAT, errors="coerce")
+    retry = parsed.isna() & s.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(s[retry], utc=True, format="ISO8601", errors="coerce")
+    return parsed
+
+def _to_str(s):
+    # Dicts/lists (straight from the API) are stored as their str() form
+    if s.dtype == object:
+        s = s.map(lambda x: x if isinstance(x, str) or x is None else str(x), na_action="ignore")
+    return s.astype("string")
+
+def _to_int(s):
+    return pd.to_numeric(s, errors="coerce").astype("Int64")
+
+def _to_bool(s):
+    if s.dtype == object:
+        s = s.map({True: True, False: False, "True": True, "False": False, "true": True, "false": False})
+    return s.astype("boolean")
+
+CONVERTERS = {
+    "int": _to_int,
+    "bool": _to_bool,
+    "datetime": parse_datetime,
+    "str": _to_str,
+}
+
+def extract_login(s):
+    """
+    login out of a GitHub user object. Handles real dicts (API) and their
+    str() form (CSV round-trip), where .get("login") would never match.
+    """
+    if s.empty:
+        return s.astype("string")
+    is_dict = s.map(lambda x: isinstance(x, dict))
+    login = s.astype("string").str.extract(r"""['"]login['"]:\s*['"]([^'"]+)['"]""", expand=False)
+    if is_dict.any():
+        login[is_dict] = s[is_dict].map(lambda x: x.get("login"))
+    return login.astype("string")
+
+def repo_from_url(s):
+    """owner/name out of https://api.github.com/repos/owner/name/..."""
+    return s.astype("string").str.extract(r"/repos/([^/]+/[^/]+)", expand=False)
+
+def extract_commit_date(s):
+    """commit.committer.date from the nested commit object (dict or its str() form)."""
+    if s.empty:
+        return s.astype("string")
+    is_dict = s.map(lambda x: isinstance(x, dict))
+    date = s.astype("string").str.extract(r"""['"]committer['"]:\s*\{[^}]*?['"]date['"]:\s*['"]([^'"]+)['"]""", expand=False)
+    if is_dict.any():
+        date[is_dict] = s[is_dict].map(lambda x: (x.get("committer") or {}).get("date"))
+    return date
+
+# ------------------------------
+# Normalization stage
+# ------------------------------
+def normalize_frame(df, table):
+    """
+    Return a frame with exactly the columns of `table`, in INSERT order,
+    each converted in one vectorized pass. Missing columns become NULL.
+    """
+    types = COLUMN_TYPES[table]
+    df = df.copy()
+
+    if table == "issues" and "user_login" not in df.columns:
+        df["user_login"] = extract_login(df["user"]) if "user" in df.columns else None
+
+    # Typed commit columns, pulled out of the nested API objects at load time
+    if table == "commits":
+        derived = {
+            "repo": ("url", repo_from_url),
+            "author_login": ("author", extract_login),
+            "committed_at": ("commit", extract_commit_date),
+        }
+        for col, (source, extract) in derived.items():
+            if col not in df.columns:
+                df[col] = extract(df[source]) if source in df.columns else None
+
+    out = pd.DataFrame(index=df.index)
+    for col, kind in types.items():
+        s = df[col] if col in df.columns else pd.Series(None, index=df.index, dtype=object)
+        if s.dtype == object:
+            s = s.mask(s.isin(NULL_TOKENS))
+        out[col] = CONVERTERS[kind](s)
+    return out
+
+def to_rows(df):
+    """Rows as tuples of plain Python values, with every null mapped to None in bulk."""
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+# ------------------------------
+# Benchmark: legacy per-cell cleaning vs vectorized stage
+# ------------------------------
+def synthetic_issues(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    base = pd.Timestamp("2024-01-01", tz="UTC")
+    created = base + pd.to_timedelta(rng.integers(0, 365 * 86400, n_rows), unit="s")
+    closed = created + pd.to_timedelta(rng.integers(0, 30 * 86400, n_rows), unit="s")
+    is_open = rng.random(n_rows) < 0.3
+
+    closed_str = pd.Series(closed.strftime("%Y-%m-%dT%H:%M:%SZ"), dtype=object)
+    closed_str[is_open] = "NaT"
+
+    return pd.DataFrame({
+        "id": np.arange(n_rows, dtype=np.int64) + 1_000_000,
+        "repository_url": rng.choice(["https://api.github.com/repos/a/a", "https://api.github.com/repos/b/b"], n_rows),
+        "number": np.arange(n_rows),
+        "title": "Synthetic issue",
+        "user": "{'login': 'octocat', 'id': 1}",
+        "state": np.where(is_open, "open", "closed"),
+        "locked": False,
+        "assignee": None,
+        "assignees": "[]",
+        "milestone": None,
+        "comments": rng.integers(0, 50, n_rows),
+        "created_at": created.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "updated_at": closed.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "closed_at": closed_str,
+        "body": "Synthetic body",
+    })
+
+def _legacy_clean(df):
+    """The pre-normalization path from db_insert.py, kept only for comparison."""
+    df = df.copy()
+    df.replace("NaT", "", inplace=True)
+    df.replace("NaT", None, inplace=True)
+    for col in df.columns:
+        df[col] = df[col].apply(lambda x: None if str(x).strip() == "NaT" else x)
+
+    def clean_datetime(x):
+        if x is None or x == "" or pd.isna(x):
+            return None
+        try:
+            return pd.to_datetime(x).to_pydatetime()
+        except Exception:
+            return None
+
+    for col in ["created_at", "updated_at", "closed_at"]:
+        df[col] = df[col].apply(clean_datetime)
+    for col in ["comments", "number"]:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    return df.where(pd.notnull(df), None)
+
+def benchmark(n_rows, legacy_rows=100_000):
+    """
+    Time normalize_frame on n_rows. The legacy path is linear in rows and
+    takes minutes at 1M, so it runs on legacy_rows and is scaled up.
+    """
+    df = synthetic_issues(n_rows)
+    print(f"🧪 Synthetic issues frame: {n_rows:,} rows")
+
+    start = time.perf_counter()
+    normalize_frame(df, "issues")
+    vectorized = time.perf_counter() - start
+    print(f"⚡ vectorized normalize_frame: {vectorized:.2f}s")
+
+    if legacy_rows:
+        sample = df.head(legacy_rows)
+        start = time.perf_counter()
+        _legacy_clean(sample)
+        old = (time.perf_counter() - start) * n_rows / len(sample)
+        label = "" if len(sample) == n_rows else f", extrapolated from {len(sample):,} rows"
+        print(f"🐢 legacy per-cell cleaning:   {old:.2f}s{label}  (speedup x{old / vectorized:.1f})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning stage on synthetic issues")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=100_000,
+                        help="rows to time the legacy path on (0 = skip)")
+    args = parser.parse_args()
+    benchmark(args.rows, legacy_rows=args.legacy_rows)
@@ -0,0 +1,298 @@
+import os
+import re
+import threading
+import time
+import pandas as pd
+from db_connect import pooled_connection
+from normalize import COLUMN_TYPES, PRIMARY_KEYS
+from snapshot_store import SNAPSHOT_FOLDER, has_snapshots, snapshot_stats, table_path
+
+# ------------------------------
+# Backend selection
+# ------------------------------
+# "postgres" -> the server (what the loader writes)
+# "duckdb"   -> in-process DuckDB over the Parquet snapshots, no server needed
+# "auto"     -> Postgres, falling back to DuckDB while the server is unreachable
+QUERY_BACKEND = os.getenv("QUERY_BACKEND", "auto")
+QUERY_BACKENDS = ("auto", "postgres", "duckdb")
+
+# Optional DuckDB database file: snapshots are copied into it on refresh
+# (a periodically synced copy) instead of being scanned through views
+DUCKDB_PATH = os.getenv("DUCKDB_PATH", "")
+# Seconds between checks for new snapshot files
+DUCKDB_REFRESH_SECONDS = float(os.getenv("DUCKDB_REFRESH_SECONDS", 30))
+# Seconds before an "auto" fallback tries Postgres again
+BACKEND_RECHECK_SECONDS = float(os.getenv("BACKEND_RECHECK_SECONDS", 60))
+
+class QueryBackend:
+    """
+    What CSVAgent and the generated-code helpers need from a database:
+    cheap freshness versions, column lists, whole tables and ad-hoc SQL.
+    SQL uses %s placeholders on every backend. Only a %s outside quotes is a
+    placeholder, so literals like LIKE '%s%' are left alone; outside quotes
+    a literal % is written %%.
+    """
+    name = None
+
+    def versions(self, tables):
+        """{table: version}; version[0] is a row estimate. Missing tables are left out."""
+        raise NotImplementedError
+
+    def columns(self, tables):
+        """{table: [column, ...]} in table order."""
+        raise NotImplementedError
+
+    def query(self, sql, params=None):
+        raise NotImplementedError
+
+    def read_table(self, table, columns=None):
+        cols = ", ".join(columns) if columns else "*"
+        return self.query(f"SELECT {cols} FROM {table}")
+
+    # Dialect snippets for the few functions the two engines spell differently
+    def repo_from_url(self, col):
+        """'owner/name' out of https://api.github.com/repos/owner/name[/...]"""
+        raise NotImplementedError
+
+    def weekday_name(self, col):
+        raise NotImplementedError
+
+# Quoted literals and identifiers, $$ strings and comments: a % in them is text
+_QUOTED_SQL = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\$\$.*?\$\$|--[^\n]*|/\*.*?\*/", re.S)
+
+def _rewrite_sql(sql, outside, inside):
+    """Apply `outside` to the SQL between quoted parts and `inside` to the quoted parts."""
+    out, pos = [], 0
+    for match in _QUOTED_SQL.finditer(sql):
+        out.append(outside(sql[pos:match.start()]))
+        out.append(inside(match.group()))
+        pos = match.end()
+    out.append(outside(sql[pos:]))
+    return "".join(out)
+
+def qmark_placeholders(sql):
+    """%s -> ? and %% -> % outside quotes (DuckDB's parameter style)."""
+    return _rewrite_sql(sql, lambda part: re.sub(r"%([s%])", lambda m: "?" if m.group(1) == "s" else "%", part),
+                        lambda quoted: quoted)
+
+def escape_quoted_percents(sql):
+    """% -> %% inside quotes, so psycopg2 only substitutes the real placeholders."""
+    return _rewrite_sql(sql, lambda part: part, lambda quoted: quoted.replace("%", "%%"))
+
+# ------------------------------
+# PostgreSQL
+# ------------------------------
+# One cheap catalog query: live row estimate + write counters per table
+FRESHNESS_SQL = """
+    SELECT relname, n_live_tup, n_tup_ins + n_tup_upd + n_tup_del AS n_changes
+    FROM pg_stat_user_tables
+    WHERE schemaname = 'public' AND relname = ANY(%s);
+"""
+
+COLUMNS_SQL = """
+    SELECT table_name, column_name
+    FROM information_schema.columns
+    WHERE table_schema = 'public' AND table_name = ANY(%s)
+    ORDER BY table_name, ordinal_position;
+"""
+
+class PostgresBackend(QueryBackend):
+    """Queries the server through the shared pool, or through `conn` when given."""
+    name = "postgres"
+
+    def __init__(self, conn=None):
+        self.conn = conn
+
+    def _fetch(self, sql, params):
+        if self.conn is not None:
+            with self.conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+        with pooled_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, params)
+                return cur.fetchall()
+
+    def versions(self, tables):
+        rows = self._fetch(FRESHNESS_SQL, (list(tables),))
+        return {name: (live, changes) for name, live, changes in rows}
+
+    def columns(self, tables):
+        columns = {}
+        for table, col in self._fetch(COLUMNS_SQL, (list(tables),)):
+            columns.setdefault(table, []).append(col)
+        return columns
+
+    def query(self, sql, params=None):
+        if params is not None:
+            sql = escape_quoted_percents(sql)
+        if self.conn is not None:
+            return pd.read_sql(sql, self.conn, params=params)
+        with pooled_connection() as conn:
+            return pd.read_sql(sql, conn, params=params)
+
+    def ping(self):
+        self._fetch("SELECT 1;", None)
+
+    def repo_from_url(self, col):
+        return f"substring({col} from '/repos/([^/]+/[^/]+)')"
+
+    def weekday_name(self, col):
+        return f"trim(to_char({col}, 'Day'))"
+
+# ------------------------------
+# DuckDB over Parquet snapshots
+# ------------------------------
+DUCKDB_TYPES = {"int": "BIGINT", "bool": "BOOLEAN", "datetime": "TIMESTAMPTZ", "str": "VARCHAR"}
+
+# The daily rollups, computed on the fly (Postgres maintains them as tables)
+DUCKDB_ROLLUPS = {
+    "daily_issue_activity": """
+        SELECT repo, day, SUM(created)::INT AS created_count, SUM(closed)::INT AS closed_count
+        FROM (
+            SELECT regexp_extract(repository_url, '/repos/([^/]+/[^/]+)', 1) AS repo,
+                   created_at::DATE AS day, 1 AS created, 0 AS closed
+            FROM issues WHERE created_at IS NOT NULL
+            UNION ALL
+            SELECT regexp_extract(repository_url, '/repos/([^/]+/[^/]+)', 1),
+                   closed_at::DATE, 0, 1
+            FROM issues WHERE closed_at IS NOT NULL
+        ) events
+        GROUP BY repo, day
+    """,
+    "daily_commit_activity": """
+        SELECT repo, committed_at::DATE AS day, COUNT(*)::INT AS commit_count
+        FROM commits
+        WHERE committed_at IS NOT NULL AND repo IS NOT NULL
+        GROUP BY 1, 2
+    """,
+}
+
+class DuckDBBackend(QueryBackend):
+    """
+    In-process DuckDB over the snapshot store. Each table is the latest
+    fetched version of every row (deduplicated on its primary key); the
+    rollup tables are views over them. With `database` set to a file, the
+    snapshots are copied in on refresh rather than scanned on every query.
+    """
+    name = "duckdb"
+
+    def __init__(self, database=DUCKDB_PATH, folder=SNAPSHOT_FOLDER, refresh_seconds=DUCKDB_REFRESH_SECONDS):
+        import duckdb
+
+        self.folder = folder
+        self.materialize = bool(database)
+        self.refresh_seconds = refresh_seconds
+        self._conn = duckdb.connect(database or ":memory:")
+        self._conn.execute("SET TimeZone = 'UTC';")
+        self._lock = threading.Lock()
+        self._synced = {}        # table -> snapshot version it was built from
+        self._checked_at = 0.0
+        self.refresh(force=True)
+
+    def _source_sql(self, table):
+        if not has_snapshots(table, self.folder):
+            cols = ", ".join(f"NULL::{DUCKDB_TYPES[kind]} AS {col}" for col, kind in COLUMN_TYPES[table].items())
+            return f"SELECT {cols} WHERE false"
+        files = os.path.join(table_path(table, self.folder), "**", "*.parquet").replace("'", "''")
+        cols = ", ".join(COLUMN_TYPES[table])
+        # Later fetch dates win; within a day the part files sort by write time
+        return f"""
+            SELECT {cols}
+            FROM read_parquet('{files}', hive_partitioning = true, filename = true)
+            QUALIFY row_number() OVER (
+                PARTITION BY {PRIMARY_KEYS[table]} ORDER BY fetch_date DESC, filename DESC
+            ) = 1
+        """
+
+    def refresh(self, force=False):
+        """Rebuild the tables whose snapshots changed since the last refresh."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._checked_at < self.refresh_seconds:
+                return []
+            self._checked_at = now
+
+            changed = []
+            for table in COLUMN_TYPES:
+                rows, files, _ = snapshot_stats(table, self.folder)
+                if force or self._synced.get(table) != (rows, files):
+                    kind = "TABLE" if self.materialize else "VIEW"
+                    self._conn.execute(f"CREATE OR REPLACE {kind} {table} AS {self._source_sql(table)}")
+                    self._synced[table] = (rows, files)
+                    changed.append(table)
+            if force:
+                for name, sql in DUCKDB_ROLLUPS.items():
+                    self._conn.execute(f"CREATE OR REPLACE VIEW {name} AS {sql}")
+            if changed and not force:
+                print(f"🔄 DuckDB refreshed: {', '.join(changed)}")
+            return changed
+
+    def versions(self, tables):
+        self.refresh()
+        # Row counts come from Parquet footers (before dedupe), like n_live_tup an estimate
+        return {table: (*self._synced[table], "duckdb") for table in tables if table in self._synced}
+
+    def columns(self, tables):
+        return {table: list(COLUMN_TYPES[table]) for table in tables if table in COLUMN_TYPES}
+
+    def query(self, sql, params=None):
+        self.refresh()
+        # A cursor per call: one DuckDB connection must not be shared across threads
+        cursor = self._conn.cursor()
+        try:
+            if params is not None:
+                return cursor.execute(qmark_placeholders(sql), list(params)).df()
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def repo_from_url(self, col):
+        return f"regexp_extract({col}, '/repos/([^/]+/[^/]+)', 1)"
+
+    def weekday_name(self, col):
+        return f"dayname({col})"
+
+# ------------------------------
+# Process-wide backend
+# ------------------------------
+_BACKENDS = {}
+_BACKENDS_LOCK = threading.Lock()
+_resolved = None   # ("postgres" | "duckdb", monotonic time) for "auto"
+
+def _resolve_auto():
+    """
+    Postgres while it answers; DuckDB when it doesn't and there are
+    snapshots. The answer is kept for BACKEND_RECHECK_SECONDS.
+    """
+    global _resolved
+    if _resolved and time.monotonic() - _resolved[1] < BACKEND_RECHECK_SECONDS:
+        return _resolved[0]
+    try:
+        PostgresBackend().ping()
+        name = "postgres"
+    except Exception as e:
+        if not any(has_snapshots(table) for table in COLUMN_TYPES):
+            raise
+        if not _resolved or _resolved[0] != "duckdb":
+            print(f"⚠️ Postgres unavailable ({e}); querying Parquet snapshots with DuckDB")
+        name = "duckdb"
+    _resolved = (name, time.monotonic())
+    return name
+
+def get_backend(name=QUERY_BACKEND):
+    """Shared backend instance for `name`."""
+    if name not in QUERY_BACKENDS:
+        raise ValueError(f"backend must be one of {QUERY_BACKENDS}, got '{name}'")
+    with _BACKENDS_LOCK:
+        if name == "auto":
+            name = _resolve_auto()
+        if name not in _BACKENDS:
+            _BACKENDS[name] = PostgresBackend() if name == "postgres" else DuckDBBackend()
+        return _BACKENDS[name]
+
+def reset_backends():
+    global _resolved
+    with _BACKENDS_LOCK:
+        _BACKENDS.clear()
+        _resolved = None
@@ -0,0 +1,158 @@
+import os
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+# Requests left untouched on every token (other tools sharing it, retries)
+RATE_LIMIT_RESERVE = int(os.getenv("RATE_LIMIT_RESERVE", 50))
+# Once a token's spare quota drops below this share of its limit, its
+# remaining requests are spread evenly until the window resets
+RATE_LIMIT_PACE_BELOW = float(os.getenv("RATE_LIMIT_PACE_BELOW", 0.5))
+# Transient failures (5xx, timeouts, secondary limits) retried per request
+FETCH_MAX_RETRIES = int(os.getenv("FETCH_MAX_RETRIES", 5))
+BACKOFF_BASE = float(os.getenv("FETCH_BACKOFF_BASE", 1.0))
+BACKOFF_CAP = float(os.getenv("FETCH_BACKOFF_CAP", 60.0))
+
+# Until the first response says otherwise: GitHub's authenticated limit
+DEFAULT_LIMIT = 5000
+# Clock skew allowance before a token's window is assumed to have reset
+RESET_GRACE_SECONDS = 1.0
+# GitHub asks for at least a minute after a secondary limit without Retry-After
+SECONDARY_LIMIT_WAIT = 60
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP, rng=random):
+    """Full-jitter exponential backoff: uniform(0, min(cap, base * 2**attempt))."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+def retry_after_seconds(headers, now):
+    """Retry-After as seconds from now (it may be a delay or an HTTP date)."""
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+        except (TypeError, ValueError):
+            return None
+
+class TokenState:
+    """Known quota of one token, kept in sync with X-RateLimit-* headers."""
+
+    def __init__(self, token, limit=DEFAULT_LIMIT):
+        self.token = token
+        self.limit = limit
+        self.remaining = limit
+        self.reset_at = 0.0        # epoch seconds; 0 = not known yet
+        self.blocked_until = 0.0   # Retry-After / secondary limit
+        self.next_at = 0.0         # pacing
+        self.requests = 0
+
+    @property
+    def label(self):
+        return f"…{self.token[-4:]}"
+
+class TokenPool:
+    """
+    Hands out GitHub tokens so that no token runs past its rate limit.
+    acquire() picks the token that can send soonest (ties: most quota left),
+    charges one request to it and blocks while every token is exhausted,
+    paced or told to back off. `share` is the fraction of each token's quota
+    this pool may pace out, for tokens shared with other processes that
+    see the same headers. clock/sleep are injectable for tests.
+    """
+
+    def __init__(self, tokens, reserve=RATE_LIMIT_RESERVE, pace_below=RATE_LIMIT_PACE_BELOW,
+                 share=1.0, clock=time.time, sleep=time.sleep):
+        tokens = [tokens] if isinstance(tokens, str) else list(dict.fromkeys(tokens))
+        if not tokens:
+            raise ValueError("TokenPool needs at least one token")
+        self.states = [TokenState(t) for t in tokens]
+        self.reserve = reserve
+        self.pace_below = pace_below
+        self.share = share
+        self.clock = clock
+        self.sleep = sleep
+        self.waited = 0.0
+        self._announced = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, state):
+        # Never hold back more than half a token's quota, or a token whose
+        # limit is at or below the reserve could never send anything
+        return min(self.reserve, state.limit // 2)
+
+    def _ready_at(self, state, now):
+        """Earliest time this token may send its next request."""
+        if state.reset_at and now >= state.reset_at + RESET_GRACE_SECONDS:
+            # The window rolled over: full quota until a response says otherwise
+            state.remaining, state.reset_at = state.limit, 0.0
+        if state.remaining <= self._reserve(state) and not state.reset_at:
+            # Used up without any X-RateLimit-Reset seen: assume the window
+            # resets a minute from now. Stored as an absolute time, so the
+            # wait ends and the quota is restored by the rollover above.
+            state.reset_at = now + SECONDARY_LIMIT_WAIT
+        ready = max(state.blocked_until, state.next_at)
+        if state.remaining <= self._reserve(state):
+            ready = max(ready, state.reset_at + RESET_GRACE_SECONDS)
+        return ready
+
+    def _interval(self, state, now):
+        spare = state.remaining - self._reserve(state)
+        if not state.reset_at or spare >= state.limit * self.pace_below:
+            return 0.0
+        # Each of the processes sharing the token paces out only its share
+        return max(0.0, state.reset_at - now) / max(spare * self.share, 1)
+
+    def acquire(self):
+        """Block until some token may send a request; returns its TokenState."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                state = min(self.states, key=lambda s: (self._ready_at(s, now), -s.remaining))
+                ready = self._ready_at(state, now)
+                if ready <= now:
+                    state.remaining -= 1
+                    state.requests += 1
+                    state.next_at = now + self._interval(state, now)
+                    return state
+                wait = ready - now
+                self.waited += wait
+                # Several threads wait for the same moment; say so once
+                announce = wait >= 1 and ready > self._announced
+                if announce:
+                    self._announced = ready
+            if announce:
+                print(f"⏳ Rate limit: no token available, waiting {wait:.0f}s")
+            self.sleep(wait)
+
+    def update(self, state, headers):
+        """Sync a token's quota with the X-RateLimit-* headers of its response."""
+        try:
+            remaining = int(headers["X-RateLimit-Remaining"])
+            reset_at = float(headers["X-RateLimit-Reset"])
+            limit = int(headers.get("X-RateLimit-Limit", state.limit))
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            state.limit = limit
+            if reset_at > state.reset_at:
+                state.reset_at, state.remaining = reset_at, remaining
+            elif reset_at == state.reset_at:
+                # Responses arrive out of order; the lowest count is the newest
+                state.remaining = min(state.remaining, remaining)
+
+    def block(self, state, until):
+        """Keep a token idle until `until` (Retry-After, secondary limits)."""
+        with self._lock:
+            state.blocked_until = max(state.blocked_until, until)
+
+    def stats(self):
+        with self._lock:
+            return [
+                {"token": s.label, "requests": s.requests, "remaining": s.remaining,
+                 "limit": s.limit, "reset_at": s.reset_at}
+                for s in self.states
+            ]
@@ -0,0 +1,100 @@
+import os
+import json
+import argparse
+from datetime import datetime, timedelta, timezone
+from repos_list import REPOS
+
+# ------------------------------
+# Repo catalog
+# ------------------------------
+# Which repos are tracked, how important they are and how often they are
+# refreshed. Without a catalog file the REPOS list is used with defaults.
+CATALOG_FILE = os.getenv("REPO_CATALOG_FILE", os.path.join(os.path.dirname(__file__), "repo_catalog.json"))
+
+DEFAULT_PRIORITY = 0
+DEFAULT_REFRESH_HOURS = 24
+
+def _entry(repo, priority=DEFAULT_PRIORITY, refresh_hours=DEFAULT_REFRESH_HOURS, enabled=True):
+    if repo.count("/") != 1:
+        raise ValueError(f"repo must be 'owner/name', got '{repo}'")
+    return {"repo": repo, "priority": int(priority), "refresh_hours": float(refresh_hours), "enabled": bool(enabled)}
+
+def _sort(entries):
+    # Highest priority first; the name keeps the order stable
+    return sorted(entries, key=lambda e: (-e["priority"], e["repo"]))
+
+def load_catalog(path=CATALOG_FILE):
+    """Catalog entries {repo, priority, refresh_hours, enabled}, highest priority first."""
+    try:
+        with open(path) as f:
+            raw = json.load(f)
+    except FileNotFoundError:
+        return _sort([_entry(repo) for repo in REPOS])
+    defaults = raw.get("defaults", {})
+    return _sort([_entry(**{**defaults, **item}) for item in raw.get("repos", [])])
+
+def save_catalog(entries, path=CATALOG_FILE):
+    data = {
+        "defaults": {"priority": DEFAULT_PRIORITY, "refresh_hours": DEFAULT_REFRESH_HOURS},
+        "repos": _sort(entries),
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+def catalog_repos(path=CATALOG_FILE):
+    """Enabled repo names, highest priority first."""
+    return [e["repo"] for e in load_catalog(path) if e["enabled"]]
+
+def due_entries(entries, sync_state, endpoints, now=None):
+    """
+    Enabled entries whose last complete fetch is older than their refresh
+    interval (never fetched counts as due). Highest priority first, then the
+    most overdue.
+    """
+    now = now or datetime.now(timezone.utc)
+    due = []
+    for entry in entries:
+        if not entry["enabled"]:
+            continue
+        last = sync_state.last_fetched(entry["repo"], endpoints)
+        if last is None:
+            due.append((entry, timedelta.max))
+            continue
+        overdue = now - datetime.fromisoformat(last) - timedelta(hours=entry["refresh_hours"])
+        if overdue >= timedelta(0):
+            due.append((entry, overdue))
+    due.sort(key=lambda item: (-item[0]["priority"], -item[1].total_seconds()))
+    return [entry for entry, _ in due]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the tracked repo catalog")
+    parser.add_argument("--add", nargs="+", metavar="OWNER/NAME", help="add or update repos")
+    parser.add_argument("--import-file", metavar="FILE", help="add every owner/name listed in FILE (one per line)")
+    parser.add_argument("--remove", nargs="+", metavar="OWNER/NAME")
+    parser.add_argument("--disable", nargs="+", metavar="OWNER/NAME", help="keep but stop fetching")
+    parser.add_argument("--priority", type=int, default=DEFAULT_PRIORITY)
+    parser.add_argument("--refresh-hours", type=float, default=DEFAULT_REFRESH_HOURS)
+    args = parser.parse_args()
+
+    catalog = {e["repo"]: e for e in load_catalog()}
+    added = list(args.add or [])
+    if args.import_file:
+        with open(args.import_file) as f:
+            added += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    for repo in added:
+        catalog[repo] = _entry(repo, args.priority, args.refresh_hours)
+    for repo in args.remove or []:
+        catalog.pop(repo, None)
+    for repo in args.disable or []:
+        if repo in catalog:
+            catalog[repo]["enabled"] = False
+
+    if added or args.remove or args.disable:
+        save_catalog(list(catalog.values()))
+        print(f"✅ Saved {CATALOG_FILE}")
+    for e in _sort(catalog.values()):
+        state = "" if e["enabled"] else "  (disabled)"
+        print(f"{e['priority']:>4}  every {e['refresh_hours']:g}h  {e['repo']}{state}")
@@ -1,3 +1,4 @@
+# Default repos when there is no repo_catalog.json (see repo_catalog.py)
 REPOS = [
     "meta-llama/llama3",
     "ollama/ollama",
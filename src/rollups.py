@@ -0,0 +1,160 @@
+import argparse
+import pandas as pd
+from db_connect import pooled_connection
+
+# ------------------------------
+# Daily rollup tables
+# ------------------------------
+# One row per (repo, UTC day). Maintained incrementally by the loader: every
+# batch refreshes only the days it touched, so charts and forecast inputs
+# read a few thousand pre-aggregated rows instead of scanning raw tables.
+ROLLUP_TABLES_SQL = """
+    CREATE TABLE IF NOT EXISTS daily_issue_activity (
+        repo TEXT NOT NULL,
+        day DATE NOT NULL,
+        created_count INT NOT NULL DEFAULT 0,
+        closed_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (repo, day)
+    );
+    CREATE TABLE IF NOT EXISTS daily_commit_activity (
+        repo TEXT NOT NULL,
+        day DATE NOT NULL,
+        commit_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (repo, day)
+    );
+"""
+
+REPO_FROM_URL_SQL = "substring({col} from '/repos/([^/]+/[^/]+)')"
+
+# One day rule for both tables: the UTC calendar day, whatever the session
+# time zone. Issue columns are TIMESTAMP holding UTC wall time (see
+# db_connect), commit columns are TIMESTAMPTZ.
+def utc_day_sql(col, tz_aware=False):
+    return f"({col} AT TIME ZONE 'UTC')::date" if tz_aware else f"{col}::date"
+
+def utc_day_start_sql(day, tz_aware=False):
+    """Start of a DATE as a value comparable with the column (see utc_day_sql)."""
+    return f"({day})::timestamp AT TIME ZONE 'UTC'" if tz_aware else f"({day})::timestamp"
+
+# Full rebuild; only used for the initial backfill and `python rollups.py --rebuild`
+REBUILD_SQL = f"""
+    TRUNCATE daily_issue_activity, daily_commit_activity;
+
+    INSERT INTO daily_issue_activity (repo, day, created_count, closed_count)
+    SELECT repo, day, SUM(created), SUM(closed)
+    FROM (
+        SELECT {REPO_FROM_URL_SQL.format(col="repository_url")} AS repo, {utc_day_sql("created_at")} AS day, 1 AS created, 0 AS closed
+        FROM issues WHERE created_at IS NOT NULL
+        UNION ALL
+        SELECT {REPO_FROM_URL_SQL.format(col="repository_url")}, {utc_day_sql("closed_at")}, 0, 1
+        FROM issues WHERE closed_at IS NOT NULL
+    ) events
+    GROUP BY repo, day;
+
+    INSERT INTO daily_commit_activity (repo, day, commit_count)
+    SELECT repo, {utc_day_sql("committed_at", tz_aware=True)}, COUNT(*)
+    FROM commits
+    WHERE committed_at IS NOT NULL AND repo IS NOT NULL
+    GROUP BY 1, 2;
+"""
+
+# Recount the given (repository_url, day) pairs; each count is an index range
+# scan on (repository_url, created_at) / (repository_url, closed_at)
+REFRESH_ISSUE_DAYS_SQL = f"""
+    WITH touched (repository_url, day) AS (
+        SELECT DISTINCT * FROM unnest(%s::text[], %s::date[])
+    )
+    INSERT INTO daily_issue_activity (repo, day, created_count, closed_count)
+    SELECT {REPO_FROM_URL_SQL.format(col="t.repository_url")}, t.day,
+        (SELECT COUNT(*) FROM issues i
+         WHERE i.repository_url = t.repository_url
+           AND i.created_at >= {utc_day_start_sql("t.day")} AND i.created_at < {utc_day_start_sql("t.day + 1")}),
+        (SELECT COUNT(*) FROM issues i
+         WHERE i.repository_url = t.repository_url
+           AND i.closed_at >= {utc_day_start_sql("t.day")} AND i.closed_at < {utc_day_start_sql("t.day + 1")})
+    FROM touched t
+    ON CONFLICT (repo, day) DO UPDATE SET
+        created_count = excluded.created_count,
+        closed_count = excluded.closed_count;
+"""
+
+REFRESH_COMMIT_DAYS_SQL = f"""
+    WITH touched (repo, day) AS (
+        SELECT DISTINCT * FROM unnest(%s::text[], %s::date[])
+    )
+    INSERT INTO daily_commit_activity (repo, day, commit_count)
+    SELECT t.repo, t.day,
+        (SELECT COUNT(*) FROM commits c
+         WHERE c.repo = t.repo
+           AND c.committed_at >= {utc_day_start_sql("t.day", tz_aware=True)}
+           AND c.committed_at < {utc_day_start_sql("t.day + 1", tz_aware=True)})
+    FROM touched t
+    ON CONFLICT (repo, day) DO UPDATE SET
+        commit_count = excluded.commit_count;
+"""
+
+# ------------------------------
+# Touched days
+# ------------------------------
+def _days(keys, stamps):
+    """(key, UTC date) pairs for every non-null timestamp; same rule as utc_day_sql."""
+    frame = pd.DataFrame({"key": keys, "day": pd.to_datetime(stamps, utc=True).dt.date})
+    frame = frame.dropna().drop_duplicates()
+    return set(frame.itertuples(index=False, name=None))
+
+def touched_issue_days(conn, df):
+    """
+    (repository_url, day) pairs a batch of normalized issues will change:
+    its created/closed days, plus the closed day already stored for those
+    issues (a reopened issue must drop out of its old closed day).
+    """
+    touched = _days(df["repository_url"], df["created_at"]) | _days(df["repository_url"], df["closed_at"])
+
+    ids = [int(i) for i in df["id"].dropna()]
+    if ids:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"SELECT repository_url, {utc_day_sql('closed_at')} FROM issues WHERE id = ANY(%s) AND closed_at IS NOT NULL;",
+                (ids,)
+            )
+            touched |= set(cur.fetchall())
+    return touched
+
+def touched_commit_days(df):
+    return _days(df["repo"], df["committed_at"])
+
+# ------------------------------
+# Refresh
+# ------------------------------
+def _refresh(conn, sql_stmt, touched):
+    if not touched:
+        return 0
+    keys, days = zip(*touched)
+    with conn.cursor() as cur:
+        cur.execute(sql_stmt, (list(keys), list(days)))
+    conn.commit()
+    return len(touched)
+
+def refresh_issue_days(conn, touched):
+    return _refresh(conn, REFRESH_ISSUE_DAYS_SQL, touched)
+
+def refresh_commit_days(conn, touched):
+    return _refresh(conn, REFRESH_COMMIT_DAYS_SQL, touched)
+
+def rebuild(conn):
+    with conn.cursor() as cur:
+        cur.execute(ROLLUP_TABLES_SQL)
+        cur.execute(REBUILD_SQL)
+    conn.commit()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the daily rollup tables")
+    parser.add_argument("--rebuild", action="store_true", help="recompute every day from the raw tables")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        with pooled_connection() as conn:
+            rebuild(conn)
+        print("✅ Rebuilt daily_issue_activity and daily_commit_activity")
+    else:
+        parser.print_help()
@@ -1,29 +1,21 @@
 import sys
+import time
+import importlib
+from warmup import REQUIRED_PACKAGES
 
 print("🔍 PHASE 1 ENVIRONMENT CHECK")
 
 print(f"Using Python version: {sys.version}")
 
-required_packages = [
-    "requests",
-    "pandas",
-    "psycopg2",
-    "sqlalchemy",
-    "streamlit",
-    "langchain",
-    "plotly",
-    "prophet",
-    "statsmodels"
-]
-
 print("\nChecking installed packages...\n")
 
 missing = []
 
-for pkg in required_packages:
+for pkg in REQUIRED_PACKAGES:
     try:
-        __import__(pkg)
-        print(f"✔ {pkg} OK")
+        started = time.perf_counter()
+        importlib.import_module(pkg)
+        print(f"✔ {pkg} OK ({time.perf_counter() - started:.2f}s import)")
     except ImportError:
         print(f"✘ {pkg} NOT INSTALLED")
         missing.append(pkg)
@@ -36,3 +28,5 @@ else:
         print(" -", m)
     print("\nInstall by running:")
     print("uv pip install -r requirements.txt")
+
+print("\nFor per-module cold import times of the generated-code libraries, run: python warmup.py")
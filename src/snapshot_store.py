@@ -0,0 +1,194 @@
+import os
+import uuid
+import argparse
+from datetime import datetime, timezone
+import pandas as pd
+from normalize import COLUMN_TYPES, PRIMARY_KEYS, normalize_frame
+
+SNAPSHOT_FOLDER = os.getenv("SNAPSHOT_FOLDER", os.path.join(os.path.dirname(__file__), "data", "snapshots"))
+
+# ------------------------------
+# Layout
+# ------------------------------
+# data/snapshots/<table>/source_repo=<owner__name>/fetch_date=YYYY-MM-DD/part-<time>-<id>.parquet
+#
+# Rows are normalized (DB column names and types) before they are written,
+# so readers never re-infer types. Partition keys are not stored in the files;
+# "source_repo" avoids clashing with the commits.repo column.
+
+def _arrow():
+    # pyarrow is only needed when snapshots are actually used
+    try:
+        import pyarrow as pa
+    except ImportError as e:
+        raise ImportError("Parquet snapshots need pyarrow: pip install -r requirements.txt") from e
+    return pa
+
+def arrow_type(kind):
+    pa = _arrow()
+    return {
+        "int": pa.int64(),
+        "bool": pa.bool_(),
+        "datetime": pa.timestamp("us", tz="UTC"),
+        "str": pa.string(),
+    }[kind]
+
+def table_schema(table):
+    """Explicit Arrow schema for a table, in INSERT column order."""
+    pa = _arrow()
+    return pa.schema([pa.field(col, arrow_type(kind)) for col, kind in COLUMN_TYPES[table].items()])
+
+def partition_schema():
+    pa = _arrow()
+    return pa.schema([pa.field("source_repo", pa.string()), pa.field("fetch_date", pa.string())])
+
+def _repo_key(repo):
+    return repo.replace("/", "__")
+
+def table_path(table, folder=SNAPSHOT_FOLDER):
+    return os.path.join(folder, table)
+
+def has_snapshots(table, folder=SNAPSHOT_FOLDER):
+    path = table_path(table, folder)
+    return os.path.isdir(path) and any(f.endswith(".parquet") for _, _, files in os.walk(path) for f in files)
+
+# ------------------------------
+# Write
+# ------------------------------
+def write_snapshot(data, table, repo, fetch_date=None, folder=SNAPSHOT_FOLDER):
+    """
+    Normalize API records (or a DataFrame) for `table` and write them as one
+    Parquet file in the repo / fetch-date partition. Returns the path, or
+    None when there is nothing to write.
+    """
+    pa = _arrow()
+    import pyarrow.parquet as pq
+
+    df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+    if df.empty:
+        return None
+
+    now = datetime.now(timezone.utc)
+    fetch_date = fetch_date or now.strftime("%Y-%m-%d")
+    frame = normalize_frame(df, table)
+    arrow_table = pa.Table.from_pandas(frame, schema=table_schema(table), preserve_index=False)
+
+    part_dir = os.path.join(table_path(table, folder), f"source_repo={_repo_key(repo)}", f"fetch_date={fetch_date}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"part-{now.strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+    tmp = path + ".tmp"
+    pq.write_table(arrow_table, tmp, compression="zstd")
+    os.replace(tmp, path)
+    print(f"💾 Snapshot: {path} ({len(frame)} rows)")
+    return path
+
+# ------------------------------
+# Read
+# ------------------------------
+def open_dataset(table, folder=SNAPSHOT_FOLDER, memory_map=True):
+    """pyarrow Dataset over every snapshot of a table (files are memory-mapped)."""
+    pa = _arrow()
+    import pyarrow.dataset as ds
+    from pyarrow import fs
+
+    schema = pa.unify_schemas([table_schema(table), partition_schema()])
+    return ds.dataset(
+        table_path(table, folder),
+        schema=schema,
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema(), flavor="hive"),
+        filesystem=fs.LocalFileSystem(use_mmap=memory_map),
+        exclude_invalid_files=True,
+    )
+
+def _filter(repos=None, since=None, until=None):
+    import pyarrow.dataset as ds
+
+    expr = None
+    def _and(e):
+        return e if expr is None else expr & e
+    if repos:
+        expr = _and(ds.field("source_repo").isin([_repo_key(r) for r in repos]))
+    if since:
+        expr = _and(ds.field("fetch_date") >= since)
+    if until:
+        expr = _and(ds.field("fetch_date") < until)
+    return expr
+
+def read_arrow(table, columns=None, repos=None, since=None, until=None, latest=True,
+               folder=SNAPSHOT_FOLDER, memory_map=True):
+    """
+    Arrow table of snapshot rows. Only `columns` are read from disk, and
+    partitions outside repos / [since, until) fetch dates are never opened.
+    latest=True keeps only the most recently fetched version of each row.
+    """
+    if not has_snapshots(table, folder):
+        schema = table_schema(table)
+        if columns:
+            schema = _arrow().schema([schema.field(c) for c in columns])
+        return schema.empty_table()
+
+    dataset = open_dataset(table, folder, memory_map)
+    key = PRIMARY_KEYS[table]
+    read_cols = list(columns) if columns else list(COLUMN_TYPES[table])
+    extra = [c for c in (key, "fetch_date") if latest and c not in read_cols]
+    result = dataset.to_table(columns=read_cols + extra, filter=_filter(repos, since, until))
+
+    if latest and result.num_rows:
+        df_keys = result.select([key, "fetch_date"]).to_pandas()
+        # Stable sort keeps file order within a day, so the last write wins
+        keep = df_keys.sort_values("fetch_date", kind="stable").drop_duplicates(key, keep="last").index
+        result = result.take(sorted(keep))
+    if extra:
+        result = result.drop_columns(extra)
+    return result
+
+def read_snapshot(table, columns=None, repos=None, since=None, until=None, latest=True,
+                  folder=SNAPSHOT_FOLDER, memory_map=True):
+    """Same as read_arrow(), as a DataFrame with the dtypes normalize_frame produces."""
+    pa = _arrow()
+    nullable = {pa.int64(): pd.Int64Dtype(), pa.bool_(): pd.BooleanDtype(), pa.string(): pd.StringDtype()}
+    arrow_table = read_arrow(table, columns, repos, since, until, latest, folder, memory_map)
+    return arrow_table.to_pandas(types_mapper=nullable.get)
+
+def snapshot_stats(table, folder=SNAPSHOT_FOLDER):
+    """(row count from Parquet footers, number of files, columns) without reading any data."""
+    if not has_snapshots(table, folder):
+        return 0, 0, list(COLUMN_TYPES[table])
+    dataset = open_dataset(table, folder)
+    files = dataset.files
+    rows = sum(fragment.metadata.num_rows for fragment in dataset.get_fragments())
+    return rows, len(files), list(COLUMN_TYPES[table])
+
+# ------------------------------
+# CSV -> snapshot conversion
+# ------------------------------
+def convert_csv_folder(data_folder, folder=SNAPSHOT_FOLDER):
+    """Write a snapshot for every <endpoint>_<owner>_<name>.csv in data_folder."""
+    from normalize import NULL_TOKENS
+    from repo_catalog import catalog_repos
+
+    by_file = {f"{table}_{repo.replace('/', '_')}.csv": (table, repo) for table in COLUMN_TYPES for repo in catalog_repos()}
+    written = 0
+    for file in sorted(os.listdir(data_folder)):
+        if file in by_file:
+            table, repo = by_file[file]
+            try:
+                df = pd.read_csv(os.path.join(data_folder, file), na_values=NULL_TOKENS)
+            except pd.errors.EmptyDataError:
+                continue
+            written += write_snapshot(df, table, repo, folder=folder) is not None
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parquet snapshots of fetched GitHub data")
+    parser.add_argument("--from-csv", metavar="DIR", help="convert the CSV exports in DIR to snapshots")
+    parser.add_argument("--stats", action="store_true", help="print row/file counts per table")
+    args = parser.parse_args()
+
+    if args.from_csv:
+        print(f"✅ Wrote {convert_csv_folder(args.from_csv)} snapshot file(s)")
+    if args.stats or not args.from_csv:
+        for table in COLUMN_TYPES:
+            rows, files, _ = snapshot_stats(table)
+            print(f"{table}: {rows} rows in {files} file(s)")
@@ -1,31 +1,142 @@
+import io
+import threading
+import pandas as pd
+import plotly.io as pio
 import streamlit as st
 from agents.csv_agent import CSVAgent
 from agents.code_writer_agent import CodeWriterAgent
 from agents.sanitize_agent import SanitizeAgent
-from agents.exec_agent import ExecAgent
+from agents.exec_agent import ExecAgent, warm_start
+from job_runner import JobRunner
+
+# ------------------------------
+# Pipeline stages (run on the job runner's worker threads)
+# ------------------------------
+def load_stage(job, ctx):
+    csv_agent = CSVAgent()
+    csv_agent.summarize_all_tables()
+    # Generated code queries the DB itself, so only summaries are needed here
+    tables = csv_agent.select_relevant_tables(ctx["query"])
+    job.log(f"selected table(s) {', '.join(tables)} on {csv_agent.backend.name if csv_agent.backend else 'no backend'}")
+    summary = "\n".join(f"{table}: {csv_agent.summaries[table]}" for table in tables)
+    return {"table_name": ", ".join(tables), "tables": tables, "summary": summary,
+            "schema": csv_agent.schema(tables)}
+
+def generate_stage(job, ctx):
+    code_agent = CodeWriterAgent()
+    # Stream the code into the job so the panel shows it while it is written
+    raw_code = code_agent.generate_code(
+        ctx["summary"], ctx["query"], ctx["table_name"], ctx["schema"],
+        on_code=lambda code: job.result.update(code=code),
+        check_cancelled=job.check_cancelled
+    )
+    if code_agent.last_cache_hit:
+        job.log("code served from cache")
+    elif code_agent.last_usage:
+        usage = code_agent.last_usage
+        job.log(f"tokens: prompt {usage['prompt_tokens']} ({usage['cached_prompt_tokens']} cached), "
+                f"completion {usage['completion_tokens']}")
+    return {"code": SanitizeAgent().clean_code(raw_code)}
+
+def execute_stage(job, ctx):
+    # A cancel kills the sandbox worker running the script
+    result = ExecAgent().run_code(ctx["code"], cancelled=lambda: job.cancelled)
+    job.check_cancelled()
+    if result.get("error"):
+        job.log(f"script error: {result['error']}")
+    return {"execution": result}
+
+@st.cache_resource
+def get_warm_start():
+    # Heavy imports run once per server process, in the background, so the
+    # first query finds them done; timings appear in the sidebar when ready
+    report = {}
+    threading.Thread(target=lambda: report.update(warm_start()), daemon=True).start()
+    return report
+
+@st.cache_resource
+def get_runner():
+    # One runner per server process, shared by every session
+    return JobRunner({"load": load_stage, "generate": generate_stage, "execute": execute_stage})
+
+# ------------------------------
+# UI
+# ------------------------------
+STATUS_ICONS = {"queued": "⏳", "running": "⚙️", "done": "✅", "failed": "❌", "cancelled": "🛑", "timed_out": "⌛"}
 
 st.title("GitHub Repo Data Query System (AI-Powered)")
 
+runner = get_runner()
+import_times = get_warm_start()
+
+with st.sidebar.expander("Warm-start import times"):
+    if import_times:
+        st.dataframe(pd.DataFrame(
+            [(module, seconds) for module, seconds in import_times.items()],
+            columns=["module", "seconds"]
+        ).sort_values("seconds", ascending=False), hide_index=True)
+    else:
+        st.caption("Importing…")
+st.session_state.setdefault("job_ids", [])
+
 user_query = st.text_input("Ask your natural-language query:")
 
-if st.button("Run Query"):
-    csv_agent = CSVAgent()
-    csv_agent.summarize_all_tables()
-    table_name, df, summary = csv_agent.select_relevant_table(user_query)
+if st.button("Run Query") and user_query.strip():
+    job = runner.submit(user_query)
+    st.session_state.job_ids.insert(0, job.id)
+    runner.prune()
 
-    code_agent = CodeWriterAgent()
-    raw_code = code_agent.generate_code(summary, user_query, table_name)
+def render_job(job):
+    label = f"{STATUS_ICONS[job.status]} {job.query} — {job.stage or job.status} ({job.elapsed:.1f}s)"
+    with st.expander(label, expanded=True):
+        if not job.done and st.button("Cancel", key=f"cancel_{job.id}"):
+            job.cancel()
+
+        st.caption(" · ".join(f"{t}s {msg}" for t, msg in job.events))
+        if job.error:
+            st.error(job.error)
+
+        result = job.result
+        if result.get("code"):
+            st.subheader("Generated Python Code:")
+            st.code(result["code"], language="python")
+        if "execution" in result:
+            render_execution(result["execution"])
 
-    sanitizer = SanitizeAgent()
-    cleaned_code = sanitizer.clean_code(raw_code)
+def _frame(payload):
+    return pd.read_json(io.StringIO(payload), orient="split")
 
-    st.subheader("Generated Python Code:")
-    st.code(cleaned_code, language="python")
+def render_execution(execution):
+    """Replay what the sandboxed script displayed, from its serialized form."""
+    for kind, payload in execution["outputs"]:
+        if kind == "dataframe":
+            st.dataframe(_frame(payload))
+        elif kind == "plotly":
+            st.plotly_chart(pio.from_json(payload), use_container_width=True)
+        elif kind == "image":
+            st.image(payload)
+        elif kind == "vega_lite":
+            st.vega_lite_chart(payload, use_container_width=True)
+        elif kind == "divider":
+            st.divider()
+        elif kind == "json":
+            st.json(payload)
+        elif kind == "code":
+            st.code(payload)
+        elif kind in ("info", "success", "warning", "error", "text", "markdown", "caption", "latex"):
+            getattr(st, kind)(payload)
 
-    exec_agent = ExecAgent()
-    output, plt_lib = exec_agent.run_code(cleaned_code)
+    if execution["stdout"].strip():
+        st.text(execution["stdout"])
+    if execution.get("error"):
+        st.error(f"Execution error: {execution['error']}")
 
-    st.text(output)
+@st.fragment(run_every=0.5)
+def job_panel():
+    # Polls the shared runner; only this fragment reruns while jobs are in flight
+    jobs = [runner.get(job_id) for job_id in st.session_state.job_ids]
+    for job in jobs:
+        if job is not None:
+            render_job(job)
 
-    if plt_lib:
-        st.pyplot(plt_lib)
+job_panel()
@@ -0,0 +1,168 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+from utils import get_date_range
+
+DATA_FOLDER = os.path.join(os.path.dirname(__file__), "data")
+SYNC_STATE_FILE = os.getenv("SYNC_STATE_FILE", os.path.join(DATA_FOLDER, "sync_state.json"))
+FETCH_CHECKPOINT_FILE = os.getenv("FETCH_CHECKPOINT_FILE", os.path.join(DATA_FOLDER, "fetch_checkpoint.json"))
+
+def _write_json(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+# Endpoints that support ?since= and the record field GitHub filters it on
+HIGH_WATER_FIELDS = {
+    "issues": lambda r: r.get("updated_at"),
+    "commits": lambda r: ((r.get("commit") or {}).get("committer") or {}).get("date"),
+}
+
+class SyncState:
+    """
+    Per-repo, per-endpoint high-water marks stored in a small JSON file.
+
+    Fetching records a *pending* mark; it only becomes the committed mark
+    (used as the next ?since=) once the delta has been loaded into the DB,
+    so a fetch that is never inserted gets fetched again next run.
+    """
+
+    def __init__(self, path=SYNC_STATE_FILE):
+        self.path = path
+        self.state = self._load()
+        # observe() may be called from several fetch threads at once
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        # Fetch threads save after each finished endpoint
+        with self._lock:
+            _write_json(self.path, self.state)
+
+    def _entry(self, repo, endpoint):
+        return self.state.setdefault(repo, {}).setdefault(endpoint, {})
+
+    def since(self, repo, endpoint):
+        """?since= value for the next fetch; falls back to the default window."""
+        mark = self.state.get(repo, {}).get(endpoint, {}).get("high_water")
+        return mark or get_date_range()
+
+    def observe(self, repo, endpoint, records):
+        """Remember the newest timestamp seen in a fetched delta as pending."""
+        field = HIGH_WATER_FIELDS.get(endpoint)
+        if field is None:
+            return None
+
+        stamps = [s for s in (field(r) for r in records) if s]
+        if not stamps:
+            return None
+        return self.observe_mark(repo, endpoint, max(stamps))
+
+    def observe_mark(self, repo, endpoint, mark):
+        """Same as observe() for a mark computed elsewhere (e.g. an ingest worker)."""
+        if not mark:
+            return None
+        with self._lock:
+            entry = self._entry(repo, endpoint)
+            newest = max(mark, entry.get("pending") or "")
+            if newest > (entry.get("high_water") or ""):
+                entry["pending"] = newest
+        return newest
+
+    def pending(self, repo, endpoint):
+        return self.state.get(repo, {}).get(endpoint, {}).get("pending")
+
+    def mark_fetched(self, repo, endpoint, when=None):
+        """Remember when an endpoint was last fetched completely (refresh scheduling)."""
+        when = when or datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._entry(repo, endpoint)["fetched_at"] = when
+
+    def last_fetched(self, repo, endpoints):
+        """Oldest complete fetch across `endpoints` (ISO string), or None if one never was."""
+        stamps = [self.state.get(repo, {}).get(e, {}).get("fetched_at") for e in endpoints]
+        return None if not all(stamps) else min(stamps)
+
+    def discard(self, repo, endpoint):
+        """Drop a pending mark (its delta was only partly fetched)."""
+        with self._lock:
+            self.state.get(repo, {}).get(endpoint, {}).pop("pending", None)
+
+    def commit(self, repo=None, endpoint=None):
+        """Promote pending marks to high-water marks (all of them by default)."""
+        with self._lock:
+            self._commit(repo, endpoint)
+
+    def _commit(self, repo, endpoint):
+        for r, endpoints in self.state.items():
+            if repo is not None and r != repo:
+                continue
+            for e, entry in endpoints.items():
+                if endpoint is not None and e != endpoint:
+                    continue
+                if entry.get("pending"):
+                    entry["high_water"] = entry.pop("pending")
+
+class FetchCheckpoint:
+    """
+    Progress of one harvest, so a crashed or rate-limited run can resume.
+    Finished (repo, endpoint) pairs are skipped on the next run; with a
+    streaming sink an unfinished pair also continues from the page after
+    the last one that was loaded. The file is removed once a run completes
+    without failures, and ignored when the next run uses a different sink.
+    """
+
+    def __init__(self, sink, path=FETCH_CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        state = self._load()
+        if state and state.get("sink") != sink:
+            print(f"⚠️ Ignoring checkpoint from a --sink {state.get('sink')} run")
+            state = None
+        self.resumed = bool(state)
+        self.state = state or {"sink": sink, "done": [], "next": {}}
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _key(repo, endpoint):
+        return f"{repo}:{endpoint}"
+
+    def is_done(self, repo, endpoint):
+        return self._key(repo, endpoint) in self.state["done"]
+
+    def next_url(self, repo, endpoint):
+        return self.state["next"].get(self._key(repo, endpoint))
+
+    def page_done(self, repo, endpoint, next_url):
+        """A page was persisted; the pair resumes at next_url."""
+        with self._lock:
+            self.state["next"][self._key(repo, endpoint)] = next_url
+            _write_json(self.path, self.state)
+
+    def pair_done(self, repo, endpoint):
+        with self._lock:
+            key = self._key(repo, endpoint)
+            self.state["next"].pop(key, None)
+            if key not in self.state["done"]:
+                self.state["done"].append(key)
+            _write_json(self.path, self.state)
+
+    def clear(self):
+        with self._lock:
+            if os.path.exists(self.path):
+                os.remove(self.path)
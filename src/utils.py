@@ -7,6 +7,18 @@ def get_github_token():
         raise ValueError("❌ ERROR: GITHUB_TOKEN not found in environment variables.")
     return token
 
+def get_github_tokens():
+    """
+    Every configured token: GITHUB_TOKENS (comma-separated) plus GITHUB_TOKEN.
+    Requests are spread across them, each with its own rate limit.
+    """
+    tokens = [t.strip() for t in os.getenv("GITHUB_TOKENS", "").split(",") if t.strip()]
+    if os.getenv("GITHUB_TOKEN"):
+        tokens.append(os.getenv("GITHUB_TOKEN"))
+    if not tokens:
+        raise ValueError("❌ ERROR: neither GITHUB_TOKENS nor GITHUB_TOKEN found in environment variables.")
+    return list(dict.fromkeys(tokens))
+
 def get_date_range():
     today = datetime.utcnow()
     since = today - timedelta(days=60)
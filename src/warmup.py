@@ -0,0 +1,91 @@
+import os
+import time
+import argparse
+import importlib
+
+# Packages the project needs (checked by setup_env_check.py)
+REQUIRED_PACKAGES = [
+    "requests",
+    "pandas",
+    "psycopg2",
+    "sqlalchemy",
+    "duckdb",
+    "pyarrow",
+    "streamlit",
+    "langchain",
+    "plotly",
+    "prophet",
+    "statsmodels"
+]
+
+# What generated scripts import, cheapest first so each timing is mostly the
+# module's own cost (shared dependencies are charged to whoever loads them first)
+WARM_MODULES = [
+    "numpy",
+    "pandas",
+    "psycopg2",
+    "duckdb",
+    "matplotlib.pyplot",
+    "plotly.express",
+    "plotly.graph_objects",
+    "statsmodels.api",
+    "statsmodels.tsa.statespace.sarimax",
+    "prophet",
+]
+
+# Names pre-bound in the generated-code namespace: name -> (module, attribute or None)
+NAMESPACE_IMPORTS = {
+    "np": ("numpy", None),
+    "pd": ("pandas", None),
+    "psycopg2": ("psycopg2", None),
+    "plt": ("matplotlib.pyplot", None),
+    "px": ("plotly.express", None),
+    "go": ("plotly.graph_objects", None),
+    "sm": ("statsmodels.api", None),
+    "SARIMAX": ("statsmodels.tsa.statespace.sarimax", "SARIMAX"),
+    "Prophet": ("prophet", "Prophet"),
+}
+
+def warm_imports(modules=WARM_MODULES):
+    """
+    Import each module once and time it. Returns {module: seconds}, with
+    None for modules that failed to import. Already-imported modules cost ~0.
+    """
+    # Headless backend, chosen without importing matplotlib (and numpy) early
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    timings = {}
+    for name in modules:
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings[name] = round(time.perf_counter() - started, 3)
+        except Exception:
+            timings[name] = None
+    return timings
+
+def build_namespace(names=NAMESPACE_IMPORTS):
+    """Globals for generated scripts, with the heavy libraries already bound."""
+    namespace = {}
+    for alias, (module, attr) in names.items():
+        try:
+            obj = importlib.import_module(module)
+            namespace[alias] = getattr(obj, attr) if attr else obj
+        except Exception:
+            continue
+    return namespace
+
+def format_report(timings):
+    lines = []
+    for name, seconds in sorted(timings.items(), key=lambda kv: -(kv[1] or 0)):
+        lines.append(f"  {name:<38} {'not installed' if seconds is None else f'{seconds:.3f}s'}")
+    total = sum(s for s in timings.values() if s)
+    lines.append(f"  {'total':<38} {total:.3f}s")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the cold import of the generated-code modules")
+    parser.add_argument("--module", action="append", help="module to time (repeatable, default: all)")
+    args = parser.parse_args()
+    print("⏱️ Cold import times:")
+    print(format_report(warm_imports(args.module or WARM_MODULES)))
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+# The project modules import each other flat, as when run from src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Read at import time: keep the tests off the app's cache files and model downloads
+_SCRATCH = tempfile.mkdtemp(prefix="github-tests-")
+os.environ.setdefault("ROUTER_BACKEND", "hashing")
+os.environ.setdefault("ROUTER_CACHE_FILE", os.path.join(_SCRATCH, "router_embeddings.npz"))
+os.environ.setdefault("LLM_CACHE_FILE", os.path.join(_SCRATCH, "llm_cache.sqlite"))
+
+import uuid
+import pytest
+
+@pytest.fixture
+def pg_conn():
+    """
+    Connection to the PG_* database (see db_connect), inside a throwaway
+    schema. Skips when no server is reachable.
+    """
+    import psycopg2
+    from db_connect import DB_CONFIG
+
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **DB_CONFIG)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL not reachable: {e}")
+    schema = f"test_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema};")
+    conn.commit()
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE;")
+        conn.commit()
+        conn.close()
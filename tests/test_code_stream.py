@@ -0,0 +1,150 @@
+from types import SimpleNamespace
+import pytest
+from agents.llm_cache import LLMCache
+
+code_writer = pytest.importorskip("agents.code_writer_agent", exc_type=ImportError)
+
+# ------------------------------
+# CodeWriterAgent with a fake streaming client
+# ------------------------------
+class FakeStream:
+    """Yields one chunk per delta and records how far it was read."""
+
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.sent = 0
+        self.closed = False
+
+    def __iter__(self):
+        for delta in self.deltas:
+            if self.closed:
+                return
+            self.sent += 1
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=delta))], usage=None)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_tokens_details=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    def close(self):
+        self.closed = True
+
+class FakeStreamingOpenAI:
+    def __init__(self, deltas):
+        self.stream = FakeStream(deltas)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kwargs: self.stream))
+
+@pytest.fixture
+def make_agent(tmp_path):
+    def make(deltas):
+        client = FakeStreamingOpenAI(deltas)
+        cache = LLMCache(str(tmp_path / "llm.sqlite"))
+        return code_writer.CodeWriterAgent(client=client, cache=cache), client.stream, cache
+    return make
+
+class Stop(BaseException):
+    pass
+
+def test_check_cancelled_closes_the_stream_and_caches_nothing(make_agent):
+    agent, stream, cache = make_agent(["```python\n", "import pandas as pd\n", "print(1)\n", "```\n"])
+    seen = []
+
+    def check_cancelled():
+        if stream.sent >= 2:
+            raise Stop()
+
+    with pytest.raises(Stop):
+        agent.generate_code("summary", "how many issues?", "issues", on_code=seen.append,
+                            check_cancelled=check_cancelled)
+    assert stream.closed
+    assert stream.sent == 2
+    assert len(cache) == 0
+
+# ------------------------------
+# CodeStreamParser
+# ------------------------------
+from agents.sanitize_agent import CodeStreamParser
+
+def _parse(deltas):
+    parser = CodeStreamParser()
+    pieces = [parser.feed(delta) for delta in deltas]
+    return parser, pieces
+
+def test_fence_split_across_deltas():
+    parser, pieces = _parse(["``", "`python\n", "x = 1\n", "print(x)\n", "```\n", "trailing prose"])
+    assert pieces[:2] == ["", ""]
+    assert parser.done
+    assert parser.finish() == "x = 1\nprint(x)"
+
+def test_closing_fence_split_and_held_back():
+    parser, pieces = _parse(["```python\nx = 1\n", "`", "``"])
+    # The partial "`" line is held back until it turns out to be the fence
+    assert pieces[1] == ""
+    assert parser.done
+    assert parser.code == "x = 1"
+
+def test_closing_fence_without_trailing_newline():
+    parser, _ = _parse(["```python\n", "x = 1\n", "```"])
+    assert parser.done
+    assert parser.finish() == "x = 1"
+
+def test_fence_glued_to_the_last_line():
+    parser, _ = _parse(["```python\n", "print(1)```"])
+    assert parser.finish() == "print(1)"
+
+def test_backticks_inside_code_are_not_a_fence():
+    parser, _ = _parse(["```python\n", "s = '`", "`' + 'a'\n", "```\n"])
+    assert parser.finish() == "s = '``' + 'a'"
+
+def test_bare_reply_without_fence():
+    parser, pieces = _parse(["import pandas", " as pd\n", "print(1)"])
+    assert not parser.done
+    assert "".join(pieces) == "import pandas as pd\nprint(1)"
+    assert parser.finish() == "import pandas as pd\nprint(1)"
+
+def test_prose_before_the_fence_is_dropped():
+    parser, _ = _parse(["Here is the script:\n", "```python\n", "print(1)\n", "```\n"])
+    assert parser.done
+    assert parser.finish() == "print(1)"
+
+def test_unterminated_fenced_reply_is_flushed_by_finish():
+    parser, _ = _parse(["```python\n", "print(1)\n", "x = 2"])
+    assert not parser.done
+    assert parser.finish() == "print(1)\nx = 2"
+
+def test_stream_cut_off_inside_the_closing_fence():
+    parser, _ = _parse(["```python\n", "print(1)\n", "``"])
+    assert not parser.done
+    assert parser.finish() == "print(1)"
+
+def test_deltas_add_up_to_the_code():
+    text = "```python\nimport pandas as pd\ndf = pd.DataFrame()\nprint(df)\n```\nDone."
+    for size in (1, 2, 3, 7):
+        parser, pieces = _parse([text[i:i + size] for i in range(0, len(text), size)])
+        assert parser.done
+        assert parser.finish() == "import pandas as pd\ndf = pd.DataFrame()\nprint(df)"
+
+# ------------------------------
+# generate_code(on_code=...)
+# ------------------------------
+def test_stream_is_closed_at_the_closing_fence(make_agent):
+    deltas = ["```python\n", "print(1)\n", "``", "`\n", "Explanation that should never be read\n"] + ["more\n"] * 20
+    agent, stream, cache = make_agent(deltas)
+    seen = []
+    code = agent.generate_code("summary", "how many issues?", "issues", on_code=seen.append)
+    assert code == "print(1)"
+    assert stream.closed
+    assert stream.sent == 4
+    assert seen[-1] == "print(1)"
+    assert all("print(1)".startswith(s.strip()) for s in seen)
+    # Stopped before the usage chunk: usage is estimated, and the code cached
+    assert agent.last_usage is not None
+    assert len(cache) == 1
+
+def test_cached_code_is_reported_without_streaming(make_agent):
+    agent, stream, _ = make_agent(["```python\n", "print(1)\n", "```\n"])
+    agent.generate_code("summary", "how many issues?", "issues", on_code=lambda code: None)
+    seen = []
+    stream.sent, stream.closed = 0, False
+    assert agent.generate_code("summary", "how many issues?", "issues", on_code=seen.append) == "print(1)"
+    assert agent.last_cache_hit
+    assert stream.sent == 0
+    assert seen == ["print(1)"]
@@ -0,0 +1,59 @@
+import pytest
+from fake_github_api import start_fake_api
+from fetch_github_data import EtagCache, GitHubClient, issue_pages
+
+REPO = "octo/demo"
+
+@pytest.fixture
+def fake_api():
+    server, base_url = start_fake_api(repos=[REPO], n_issues=250, n_commits=10)
+    yield server.api, base_url
+    server.shutdown()
+
+def _client(base_url, cache_dir):
+    return GitHubClient(["test-token"], base_url=base_url, cache=EtagCache(str(cache_dir)), pool_size=2)
+
+def _fetch(client, since):
+    return [r for page, _ in issue_pages(client, REPO, since) for r in page]
+
+def test_paginates_through_link_headers(fake_api, tmp_path):
+    api, base_url = fake_api
+    records = _fetch(_client(base_url, tmp_path), None)
+    assert [r["number"] for r in records] == list(range(1, 251))
+    assert api.stats["requests"] == 3
+
+def test_unchanged_pages_come_back_as_304(fake_api, tmp_path):
+    api, base_url = fake_api
+    first = _fetch(_client(base_url, tmp_path), None)
+
+    client = _client(base_url, tmp_path)
+    assert _fetch(client, None) == first
+    assert client.stats["not_modified"] == 3
+
+def test_cache_key_ignores_the_moving_since_window(fake_api, tmp_path):
+    api, base_url = fake_api
+    # Both windows start before the first record, so every page is unchanged
+    first = _fetch(_client(base_url, tmp_path), "2000-01-01T00:00:00Z")
+
+    client = _client(base_url, tmp_path)
+    assert _fetch(client, "2001-06-01T00:00:00Z") == first
+    assert client.stats["not_modified"] == 3
+
+def test_changed_page_is_refetched(fake_api, tmp_path):
+    api, base_url = fake_api
+    _fetch(_client(base_url, tmp_path), None)
+    api.repos[REPO].n_issues = 260
+
+    client = _client(base_url, tmp_path)
+    records = _fetch(client, None)
+    assert len(records) == 260
+    # Pages 1-2 are unchanged; page 3 grew
+    assert client.stats["not_modified"] == 2
+
+def test_cache_key():
+    key = GitHubClient._cache_key
+    url = "https://api.github.com/repos/octo/demo/issues"
+    assert key(url, {"since": "a", "per_page": 100}) == key(url, {"since": "b", "per_page": 100})
+    assert key(url, {"per_page": 100}) != key(url, {"per_page": 50})
+    # A next link carries its query string in the URL instead of params
+    assert key(url + "?since=a&per_page=100&page=2", None) == key(url, {"since": "b", "per_page": 100, "page": 2})
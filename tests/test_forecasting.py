@@ -0,0 +1,79 @@
+import contextlib
+import signal
+import threading
+import time
+import pandas as pd
+import pytest
+import forecasting
+
+pytestmark = pytest.mark.skipif(not hasattr(signal, "SIGALRM"), reason="fit timeouts need SIGALRM")
+
+def _sleepy_fit(series, horizon):
+    time.sleep(float(series.iloc[0]))
+    ds = pd.date_range(series.index[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    return "{}", pd.DataFrame({"ds": ds, "yhat": 1.0, "yhat_lower": 0.0, "yhat_upper": 2.0})
+
+@pytest.fixture(autouse=True)
+def sleepy_model(monkeypatch):
+    # Forked pool workers inherit the patched registry
+    monkeypatch.setitem(forecasting.MODELS, "sleepy", _sleepy_fit)
+
+def _job(repo, seconds, timeout):
+    series = pd.Series([seconds, 1.0], index=pd.date_range("2026-01-01", periods=2, freq="D"))
+    return (repo, "commits", "v1", "sleepy", series, 3, timeout)
+
+def _run(jobs, workers=1):
+    return {job[0]: (result, error) for job, result, error in forecasting._fit_parallel(jobs, workers)}
+
+def test_inline_fit_is_cut_off_at_its_timeout():
+    start = time.monotonic()
+    out = _run([_job("slow/repo", 5, 0.2)])
+    assert isinstance(out["slow/repo"][1], forecasting.FitTimeout)
+    assert time.monotonic() - start < 2
+
+def test_inline_fit_within_timeout_succeeds():
+    result, error = _run([_job("fast/repo", 0, 2)])["fast/repo"]
+    assert error is None
+    assert len(result[-1]) == 3
+
+def test_alarm_is_cleared_after_an_inline_fit():
+    _run([_job("fast/repo", 0, 0.2)])
+    # A leftover alarm would interrupt this sleep
+    time.sleep(0.4)
+    assert signal.getitimer(signal.ITIMER_REAL) == (0.0, 0.0)
+
+def test_timeout_holds_off_the_main_thread():
+    out = {}
+    thread = threading.Thread(target=lambda: out.update(_run([_job("slow/repo", 5, 0.2)])))
+    start = time.monotonic()
+    thread.start()
+    thread.join(timeout=10)
+    assert isinstance(out["slow/repo"][1], forecasting.FitTimeout)
+    assert time.monotonic() - start < 5
+
+@pytest.fixture
+def series_source(monkeypatch):
+    """forecast_repos without a database: load_series returns what the test sets."""
+    source = {}
+    monkeypatch.setattr(forecasting, "pooled_connection", contextlib.nullcontext)
+    monkeypatch.setattr(forecasting, "load_series", lambda conn, metric, repos=None: dict(source))
+    return source
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_forecast_repos_without_fittable_repos_is_empty(series_source, workers):
+    # One repo too sparse to fit; the filter matching nothing looks the same
+    series_source["sparse/repo"] = pd.Series([0.0, 3.0, 0.0], index=pd.date_range("2026-01-01", periods=3))
+    out = forecasting.forecast_repos("commits", repos=["sparse/repo"], workers=workers, model="sleepy")
+    assert out.empty
+    assert list(out.columns) == forecasting.PREDICTION_COLUMNS
+    assert out.attrs["failed"] == []
+
+def test_forecast_repos_lists_every_failed_fit(series_source):
+    for repo in ("b/repo", "a/repo"):
+        series_source[repo] = _job(repo, 5, None)[4]
+    start = time.monotonic()
+    out = forecasting.forecast_repos("commits", workers=2, timeout=0.2, model="sleepy")
+    assert out.empty
+    assert list(out.columns) == forecasting.PREDICTION_COLUMNS
+    assert out.attrs["failed"] == ["a/repo", "b/repo"]
+    assert time.monotonic() - start < 5
@@ -0,0 +1,130 @@
+import threading
+import time
+import multiprocessing as mp
+import os
+import signal
+from datetime import datetime, timedelta, timezone
+import pytest
+import ingest
+from fake_github_api import FakeGitHub, start_fake_api
+from repo_catalog import _entry, due_entries
+from sync_state import SyncState, FetchCheckpoint
+
+ENDPOINTS = ("issues", "commits")
+NOW = datetime(2024, 3, 20, 12, 0, tzinfo=timezone.utc)
+
+def _fetched(state, repo, hours_ago, endpoints=ENDPOINTS):
+    for endpoint in endpoints:
+        state.mark_fetched(repo, endpoint, (NOW - timedelta(hours=hours_ago)).isoformat())
+
+def _due(entries, state):
+    return [e["repo"] for e in due_entries(entries, state, ENDPOINTS, now=NOW)]
+
+# ------------------------------
+# Refresh scheduling
+# ------------------------------
+def test_never_fetched_and_overdue_repos_are_due(tmp_path):
+    state = SyncState(str(tmp_path / "sync.json"))
+    _fetched(state, "a/stale", 25)
+    _fetched(state, "a/fresh", 23)
+    _fetched(state, "a/edge", 24)
+    entries = [_entry("a/new"), _entry("a/stale"), _entry("a/fresh"), _entry("a/edge")]
+    assert sorted(_due(entries, state)) == ["a/edge", "a/new", "a/stale"]
+
+def test_refresh_interval_is_per_entry(tmp_path):
+    state = SyncState(str(tmp_path / "sync.json"))
+    _fetched(state, "a/hourly", 2)
+    _fetched(state, "a/weekly", 100)
+    entries = [_entry("a/hourly", refresh_hours=1), _entry("a/weekly", refresh_hours=168)]
+    assert _due(entries, state) == ["a/hourly"]
+
+def test_disabled_entries_are_never_due(tmp_path):
+    state = SyncState(str(tmp_path / "sync.json"))
+    assert _due([_entry("a/off", enabled=False), _entry("a/on")], state) == ["a/on"]
+
+def test_priority_first_then_most_overdue(tmp_path):
+    state = SyncState(str(tmp_path / "sync.json"))
+    _fetched(state, "a/low-old", 100)
+    _fetched(state, "a/high-recent", 30)
+    _fetched(state, "a/high-old", 60)
+    entries = [_entry("a/low-new", priority=0), _entry("a/low-old", priority=0),
+               _entry("a/high-recent", priority=5), _entry("a/high-old", priority=5)]
+    # Never fetched counts as the most overdue within its priority
+    assert _due(entries, state) == ["a/high-old", "a/high-recent", "a/low-new", "a/low-old"]
+
+def test_last_fetch_is_the_oldest_endpoint(tmp_path):
+    state = SyncState(str(tmp_path / "sync.json"))
+    _fetched(state, "a/mixed", 1, endpoints=["issues"])
+    _fetched(state, "a/mixed", 30, endpoints=["commits"])
+    _fetched(state, "a/partial", 1, endpoints=["issues"])
+    entries = [_entry("a/mixed"), _entry("a/partial")]
+    # a/partial never fetched commits, so it is due too
+    assert sorted(_due(entries, state)) == ["a/mixed", "a/partial"]
+
+# ------------------------------
+# Worker crash
+# ------------------------------
+CRASH_REPO = "octo/crash"
+
+class HangingGitHub(FakeGitHub):
+    """Fake API whose requests for CRASH_REPO block until `release` is set."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.hanging = threading.Event()
+        self.release = threading.Event()
+
+    def handle(self, path, query, headers):
+        if path.startswith(f"/repos/{CRASH_REPO}"):
+            self.hanging.set()
+            self.release.wait(30)
+        return super().handle(path, query, headers)
+
+@pytest.fixture
+def ingest_env(tmp_path, monkeypatch):
+    api = HangingGitHub(repos=["octo/a", "octo/b", CRASH_REPO], n_issues=30, n_commits=30)
+    server, base_url = start_fake_api(api)
+    # Read at import time by the spawned workers
+    monkeypatch.setenv("GITHUB_API_URL", base_url)
+    monkeypatch.setenv("GITHUB_TOKENS", "t1,t2")
+    monkeypatch.setenv("SYNC_STATE_FILE", str(tmp_path / "sync_state.json"))
+    monkeypatch.setenv("FETCH_CHECKPOINT_FILE", str(tmp_path / "fetch_checkpoint.json"))
+    monkeypatch.setenv("SNAPSHOT_FOLDER", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(ingest, "INGEST_REPORT_FILE", str(tmp_path / "ingest_report.json"))
+    # The parent's defaults were bound when sync_state was imported
+    monkeypatch.setattr(ingest, "SyncState", lambda: SyncState(str(tmp_path / "sync_state.json")))
+    monkeypatch.setattr(ingest, "FetchCheckpoint",
+                        lambda sink: FetchCheckpoint(sink, str(tmp_path / "fetch_checkpoint.json")))
+    yield api
+    api.release.set()
+    server.shutdown()
+
+def _kill_last_worker(api):
+    """Once the other worker has finished, SIGKILL the one stuck on CRASH_REPO."""
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        alive = mp.active_children()
+        if api.hanging.is_set() and len(alive) == 1:
+            os.kill(alive[0].pid, signal.SIGKILL)
+            alive[0].join(5)
+            break
+        time.sleep(0.1)
+    api.release.set()
+
+def test_crashed_worker_fails_only_its_repo(ingest_env, tmp_path):
+    api = ingest_env
+    killer = threading.Thread(target=_kill_last_worker, args=(api,), daemon=True)
+    killer.start()
+    report = ingest.run_ingest([CRASH_REPO, "octo/a", "octo/b"], workers=2, sink="parquet")
+    killer.join()
+
+    assert report["repos_failed"] == [CRASH_REPO]
+    assert report["repos_done"] == 3
+    [failure] = report["failures"]
+    assert failure["endpoint"] == "*"
+    assert failure["error"].endswith("exited with code -9")
+    # Only the finished repos were marked fetched
+    assert set(SyncState(str(tmp_path / "sync_state.json")).state) == {"octo/a", "octo/b"}
+    for repo in ("octo/a", "octo/b"):
+        assert report["repos"][repo]["failed"] == 0
+        assert report["repos"][repo]["rows"] > 0
@@ -0,0 +1,88 @@
+import threading
+import time
+from job_runner import JobRunner
+
+def _wait_done(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.done or job.finished_at is None:
+        assert time.monotonic() < deadline, job.status
+        time.sleep(0.01)
+    return job
+
+def _pipeline(**stages):
+    calls = []
+
+    def stage(name):
+        def run(job, ctx):
+            calls.append(name)
+            return stages[name](job, ctx) if name in stages else {name: True}
+        return run
+
+    return {name: stage(name) for name in ("load", "generate", "execute")}, calls
+
+def test_stages_run_in_order_and_merge_their_results():
+    pipeline, calls = _pipeline()
+    job = _wait_done(JobRunner(pipeline).submit("q"))
+    assert job.status == "done"
+    assert calls == ["load", "generate", "execute"]
+    assert job.result == {"query": "q", "load": True, "generate": True, "execute": True}
+
+def test_cancel_is_seen_by_a_stage_that_checks():
+    started = threading.Event()
+
+    def streaming(job, ctx):
+        started.set()
+        while True:   # like a token stream calling check_cancelled per chunk
+            job.check_cancelled()
+            time.sleep(0.01)
+
+    pipeline, calls = _pipeline(generate=streaming)
+    job = JobRunner(pipeline).submit("q")
+    assert started.wait(5)
+    assert job.cancel()
+    _wait_done(job)
+    assert job.status == "cancelled"
+    assert calls == ["load", "generate"]
+
+def test_stage_that_does_not_check_finishes_and_releases_what_it_holds():
+    lock = threading.Lock()
+    started = threading.Event()
+
+    def holds_lock(job, ctx):
+        with lock:
+            started.set()
+            time.sleep(0.3)
+        return {"load": True}
+
+    pipeline, calls = _pipeline(load=holds_lock)
+    job = JobRunner(pipeline).submit("q")
+    assert started.wait(5)
+    job.cancel()
+    _wait_done(job)
+    # Nothing was interrupted mid-stage: the lock is free, later stages never ran
+    assert job.status == "cancelled"
+    assert calls == ["load"]
+    assert lock.acquire(timeout=0)
+
+def test_timeout_stops_a_waiting_stage():
+    def waits(job, ctx):
+        while not job.cancelled:
+            time.sleep(0.01)
+        job.check_cancelled()
+
+    pipeline, calls = _pipeline(execute=waits)
+    job = _wait_done(JobRunner(pipeline, timeout=0.2).submit("q"))
+    assert job.status == "timed_out"
+    assert job.error is None
+
+def test_queued_job_cancelled_before_it_starts():
+    gate = threading.Event()
+    pipeline, calls = _pipeline(load=lambda job, ctx: gate.wait(5) and {})
+    runner = JobRunner(pipeline, max_workers=1)
+    first, second = runner.submit("first"), runner.submit("second")
+    assert second.cancel()
+    gate.set()
+    _wait_done(first)
+    assert first.status == "done"
+    assert second.status == "cancelled"
+    assert calls.count("load") == 1
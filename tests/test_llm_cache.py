@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+import pytest
+from agents.llm_cache import LLMCache, cache_key, normalize_query
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+@pytest.fixture
+def cache(tmp_path, clock):
+    return LLMCache(str(tmp_path / "llm.sqlite"), ttl=60, max_entries=3, clock=clock)
+
+# ------------------------------
+# LLMCache
+# ------------------------------
+def test_put_then_get(cache):
+    assert cache.get("k") is None
+    cache.put("k", "print(1)", model="m")
+    assert cache.get("k") == "print(1)"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_ttl_expiry(cache, clock):
+    cache.put("k", "print(1)")
+    clock.now += 59
+    assert cache.get("k") == "print(1)"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert len(cache) == 0
+
+def test_lru_eviction_drops_the_least_recently_used(cache, clock):
+    for key in ("a", "b", "c"):
+        cache.put(key, key)
+        clock.now += 1
+    # "a" is the oldest entry but was just read; "b" is now the least recent
+    assert cache.get("a") == "a"
+    clock.now += 1
+    cache.put("d", "d")
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert [cache.get(k) for k in ("a", "c", "d")] == ["a", "c", "d"]
+
+def test_entries_survive_a_new_instance(tmp_path, clock):
+    path = str(tmp_path / "llm.sqlite")
+    LLMCache(path, clock=clock).put("k", "print(1)")
+    assert LLMCache(path, clock=clock).get("k") == "print(1)"
+
+def test_normalize_query():
+    assert normalize_query("  Plot  Stars per REPO?? ") == normalize_query("plot stars per repo")
+    assert cache_key("a", "b") != cache_key("ab", "")
+
+# ------------------------------
+# CodeWriterAgent with a fake OpenAI client
+# ------------------------------
+class FakeOpenAI:
+    """Answers every completion with a numbered script and records the calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5, prompt_tokens_details=None)
+        message = SimpleNamespace(content=f"print({len(self.calls)})")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+@pytest.fixture
+def agent_factory(cache):
+    code_writer = pytest.importorskip("agents.code_writer_agent", exc_type=ImportError)
+
+    def make(model="gpt-4o-mini"):
+        client = FakeOpenAI()
+        return code_writer.CodeWriterAgent(model=model, client=client, cache=cache), client
+    return make
+
+def test_cache_hit_skips_the_client(agent_factory):
+    agent, client = agent_factory()
+    first = agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+    again = agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+    assert first == again
+    assert len(client.calls) == 1
+    assert agent.last_cache_hit
+
+def test_ttl_expiry_refetches(agent_factory, clock):
+    agent, client = agent_factory()
+    agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+    clock.now += 61
+    agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+    assert len(client.calls) == 2
+
+def test_normalized_query_shares_the_entry(agent_factory):
+    agent, client = agent_factory()
+    agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+    agent.generate_code("Rows=10", "  how many   ISSUES per repo ", "issues")
+    assert len(client.calls) == 1
+
+@pytest.mark.parametrize("change", ["model", "summary", "query"])
+def test_key_changes_with_model_summary_and_query(agent_factory, change):
+    agent, client = agent_factory()
+    agent.generate_code("Rows=10", "How many issues per repo?", "issues")
+
+    other, other_client = agent_factory(model="gpt-4o" if change == "model" else "gpt-4o-mini")
+    summary = "Rows=20" if change == "summary" else "Rows=10"
+    query = "How many commits per repo?" if change == "query" else "How many issues per repo?"
+    other.generate_code(summary, query, "issues")
+    assert len(other_client.calls) == 1
@@ -0,0 +1,43 @@
+import pytest
+from agents.prompt_builder import KEY_COLUMNS, PromptBuilder, PromptBudgetExceeded, count_tokens
+from normalize import COLUMN_TYPES
+
+STATIC = "You write Streamlit scripts.\n" * 20
+
+def _schema(*tables):
+    return {t: {"rows": 1000, "columns": list(COLUMN_TYPES[t]), "summary": ""} for t in tables}
+
+def _columns(dynamic, table):
+    line = next(l for l in dynamic.splitlines() if l.startswith(f"- {table} "))
+    return line.split("columns ", 1)[1].split(", ")
+
+def test_all_columns_are_sent_while_the_budget_allows():
+    builder = PromptBuilder(STATIC, "1")
+    _, info = builder.build("Which users opened the most issues in ollama?", "issues", _schema("issues"))
+    assert sorted(_columns(info["dynamic"], "issues")) == sorted(COLUMN_TYPES["issues"])
+
+@pytest.mark.parametrize("question, table, needed", [
+    ("Which users opened the most issues in ollama?", "issues", ["repository_url", "id"]),
+    ("Bar chart of stars per repo", "repo_info", ["full_name", "id"]),
+    ("Commits per author last month", "commits", ["repo", "sha"]),
+])
+def test_key_columns_survive_trimming(question, table, needed):
+    schema = _schema(table)
+    full = PromptBuilder(STATIC, "1", token_budget=10**6).build(question, table, schema)[1]["prompt_tokens_estimate"]
+    # Just under the full prompt: the budget binds and columns are dropped
+    _, info = PromptBuilder(STATIC, "1", token_budget=full - 1).build(question, table, schema)
+    kept = _columns(info["dynamic"], table)
+    assert len(kept) < len(COLUMN_TYPES[table])
+    assert set(needed) <= set(kept)
+
+def test_max_columns_cap_keeps_key_columns():
+    builder = PromptBuilder(STATIC, "1", max_columns=1)
+    _, info = builder.build("How many issues are open?", "issues", _schema("issues"))
+    kept = _columns(info["dynamic"], "issues")
+    assert {c for c in KEY_COLUMNS if c in COLUMN_TYPES["issues"]} <= set(kept)
+    assert len(kept) <= 3
+
+def test_budget_too_small_for_the_key_columns():
+    builder = PromptBuilder(STATIC, "1", token_budget=count_tokens(STATIC))
+    with pytest.raises(PromptBudgetExceeded):
+        builder.build("How many issues are open?", "issues", _schema("issues"))
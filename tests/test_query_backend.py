@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+import db_insert
+from agents import query_library
+from query_backend import DuckDBBackend, PostgresBackend, escape_quoted_percents, qmark_placeholders
+from snapshot_store import write_snapshot
+
+pytest.importorskip("duckdb")
+
+# ------------------------------
+# Placeholder translation
+# ------------------------------
+def test_only_unquoted_placeholders_become_qmarks():
+    sql = "SELECT strftime(day, '%s') FROM t WHERE repo LIKE '%s%' AND day >= %s AND n %% 2 = 0 -- %s"
+    assert qmark_placeholders(sql) == \
+        "SELECT strftime(day, '%s') FROM t WHERE repo LIKE '%s%' AND day >= ? AND n % 2 = 0 -- %s"
+
+def test_quoted_percents_are_escaped_for_psycopg2():
+    sql = "SELECT 'it''s 100%' AS label, \"odd%s\" FROM t WHERE repo LIKE '%s%' AND day >= %s"
+    assert escape_quoted_percents(sql) == \
+        "SELECT 'it''s 100%%' AS label, \"odd%%s\" FROM t WHERE repo LIKE '%%s%%' AND day >= %s"
+
+# ------------------------------
+# Same answers from Postgres and DuckDB
+# ------------------------------
+ISSUES = {
+    "octo/demo": [
+        {"id": 1, "number": 1, "state": "open", "created_at": "2024-03-04T10:00:00Z", "updated_at": "2024-03-04T10:00:00Z"},
+        {"id": 2, "number": 2, "state": "closed", "created_at": "2024-03-04T23:30:00-05:00",
+         "updated_at": "2024-03-12T09:00:00Z", "closed_at": "2024-03-12T09:00:00Z"},
+        {"id": 3, "number": 3, "state": "closed", "created_at": "2024-03-10T08:00:00Z",
+         "updated_at": "2024-03-11T08:00:00Z", "closed_at": "2024-03-11T08:00:00Z"},
+    ],
+    "octo/sample": [
+        {"id": 10, "number": 1, "state": "open", "created_at": "2024-02-28T12:00:00Z", "updated_at": "2024-02-28T12:00:00Z"},
+    ],
+}
+COMMITS = {
+    "octo/demo": ["2024-03-01T10:00:00Z", "2024-03-01T22:00:00-05:00", "2024-03-20T10:00:00Z"],
+    "octo/sample": ["2024-02-27T10:00:00Z"],
+}
+REPO_INFO = [
+    {"id": 100, "name": "demo", "full_name": "octo/demo", "stargazers_count": 5, "forks_count": 2,
+     "watchers_count": 5, "open_issues_count": 1, "updated_at": "2024-03-20T10:00:00Z"},
+    {"id": 101, "name": "sample", "full_name": "octo/sample", "stargazers_count": 9, "forks_count": 0,
+     "watchers_count": 9, "open_issues_count": 1, "updated_at": "2024-03-20T10:00:00Z"},
+]
+
+def _frames():
+    for repo, issues in ISSUES.items():
+        url = f"https://api.github.com/repos/{repo}"
+        yield "issues", repo, pd.DataFrame([{**i, "repository_url": url} for i in issues])
+    for repo, stamps in COMMITS.items():
+        rows = [{"sha": f"{repo}-{n}", "url": f"https://api.github.com/repos/{repo}/commits/{n}", "committed_at": ts}
+                for n, ts in enumerate(stamps)]
+        yield "commits", repo, pd.DataFrame(rows)
+    for info in REPO_INFO:
+        yield "repo_info", info["full_name"], pd.DataFrame([info])
+
+@pytest.fixture
+def backends(pg_conn, tmp_path):
+    db_insert.create_tables(pg_conn)
+    loaders = {"issues": db_insert.insert_issues, "commits": db_insert.insert_commits,
+               "repo_info": db_insert.insert_repo_info}
+    for table, repo, df in _frames():
+        loaders[table](pg_conn, df)
+        write_snapshot(df, table, repo, fetch_date="2024-03-20", folder=str(tmp_path))
+    return PostgresBackend(pg_conn), DuckDBBackend(database="", folder=str(tmp_path))
+
+def _comparable(df):
+    df = df.copy()
+    for col in df.columns:
+        if col in ("period", "day"):
+            df[col] = pd.to_datetime(df[col])
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(float)
+    return df.reset_index(drop=True)
+
+HELPERS = [
+    ("issue_counts", {}),
+    ("issue_counts", {"metric": "closed", "granularity": "week"}),
+    ("issue_counts", {"granularity": "month", "repo": "octo/demo", "since": "2024-03-01"}),
+    ("issues_by_weekday", {}),
+    ("issues_by_weekday", {"metric": "closed"}),
+    ("issue_totals_per_repo", {}),
+    ("open_closed_ratio", {}),
+    ("commits_per_repo", {}),
+    ("commit_counts", {"granularity": "week"}),
+    ("daily_commit_counts", {"repo": "octo/demo", "until": "2024-03-15"}),
+    ("repo_stats", {}),
+]
+
+@pytest.mark.parametrize("name, kwargs", HELPERS, ids=[f"{n}-{i}" for i, (n, _) in enumerate(HELPERS)])
+def test_helpers_agree_across_backends(backends, monkeypatch, name, kwargs):
+    results = []
+    for backend in backends:
+        monkeypatch.setattr(query_library, "_backend", lambda conn=None, backend=backend: backend)
+        results.append(_comparable(query_library.QUERY_FUNCTIONS[name](**kwargs)))
+    assert not results[0].empty
+    pd.testing.assert_frame_equal(results[0], results[1], check_dtype=False)
+
+def test_literal_percent_s_survives_on_both_backends(backends):
+    sql = """
+        SELECT repo, COUNT(*) AS n FROM commits
+        WHERE repo LIKE 'octo/%s%' AND committed_at >= %s
+        GROUP BY repo ORDER BY repo
+    """
+    results = [_comparable(backend.query(sql, ["2024-01-01"])) for backend in backends]
+    assert results[0].to_dict("records") == [{"repo": "octo/sample", "n": 1.0}]
+    pd.testing.assert_frame_equal(results[0], results[1], check_dtype=False)
@@ -0,0 +1,172 @@
+import time
+import pytest
+from fake_github_api import FakeGitHub, start_fake_api
+from fetch_github_data import EtagCache, GitHubClient, fetch_all
+from rate_limit import RESET_GRACE_SECONDS, SECONDARY_LIMIT_WAIT, TokenPool
+from sync_state import FetchCheckpoint
+
+class FakeClock:
+    """time.time/time.sleep stand-in: sleeping just moves the clock."""
+
+    def __init__(self, now=None):
+        self.now = time.time() if now is None else now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if len(self.slept) > 1000:
+            raise RuntimeError("token pool never became ready")
+        self.slept.append(seconds)
+        self.now += seconds
+
+def _headers(remaining, reset_at, limit=5000):
+    return {"X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset": str(reset_at),
+            "X-RateLimit-Limit": str(limit)}
+
+@pytest.fixture
+def clock():
+    return FakeClock(now=1_000_000.0)
+
+# ------------------------------
+# TokenPool
+# ------------------------------
+def test_requests_flow_freely_with_plenty_of_quota(clock):
+    pool = TokenPool(["a"], clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        pool.acquire()
+    assert clock.slept == []
+
+def test_pacing_spreads_the_last_requests_until_the_reset(clock):
+    pool = TokenPool(["a"], reserve=10, pace_below=0.5, clock=clock, sleep=clock.sleep)
+    state = pool.acquire()
+    # 21 spare requests (below half of 100) and 100 s to the reset: the next
+    # request leaves 20, so the one after it waits 100 / 20 s
+    pool.update(state, _headers(31, clock.now + 100, limit=100))
+    pool.acquire()
+    pool.acquire()
+    assert clock.slept == [pytest.approx(5.0)]
+
+def test_shared_token_paces_only_its_share(clock):
+    # Four processes on one token, each seeing the same headers: together
+    # they send the 20 spare requests, so each waits four times as long
+    pool = TokenPool(["a"], reserve=10, pace_below=0.5, share=0.25, clock=clock, sleep=clock.sleep)
+    state = pool.acquire()
+    pool.update(state, _headers(31, clock.now + 100, limit=100))
+    pool.acquire()
+    pool.acquire()
+    assert clock.slept == [pytest.approx(20.0)]
+
+def test_exhausted_token_rotates_to_the_next_one(clock):
+    pool = TokenPool(["a", "b"], reserve=50, clock=clock, sleep=clock.sleep)
+    first = pool.acquire()
+    pool.update(first, _headers(50, clock.now + 600))
+    assert all(pool.acquire().token != first.token for _ in range(10))
+    assert clock.slept == []
+
+def test_all_tokens_exhausted_waits_for_the_earliest_reset(clock):
+    pool = TokenPool(["a", "b"], reserve=50, clock=clock, sleep=clock.sleep)
+    a, b = pool.acquire(), pool.acquire()
+    pool.update(a, _headers(0, clock.now + 300))
+    pool.update(b, _headers(0, clock.now + 120))
+    start = clock.now
+    assert pool.acquire().token == b.token
+    assert clock.now - start == pytest.approx(120 + RESET_GRACE_SECONDS)
+
+def test_retry_after_blocks_only_that_token(clock):
+    pool = TokenPool(["a", "b"], clock=clock, sleep=clock.sleep)
+    a = pool.acquire()
+    pool.block(a, clock.now + 30)
+    assert pool.acquire().token != a.token
+    pool.block(pool.states[1], clock.now + 10)
+    pool.acquire()
+    assert clock.slept == [pytest.approx(10)]
+
+def test_unknown_reset_waits_once_then_recovers(clock):
+    # No X-RateLimit headers ever arrive: the pool assumes the default limit
+    pool = TokenPool(["a"], reserve=50, clock=clock, sleep=clock.sleep)
+    for _ in range(4950):
+        pool.acquire()
+    for _ in range(100):
+        pool.acquire()
+    assert sum(clock.slept) == pytest.approx(SECONDARY_LIMIT_WAIT + RESET_GRACE_SECONDS)
+
+def test_limit_below_the_reserve_still_sends(clock):
+    pool = TokenPool(["a"], reserve=50, pace_below=0, clock=clock, sleep=clock.sleep)
+    state = pool.acquire()
+    pool.update(state, _headers(39, clock.now + 60, limit=40))
+    for _ in range(10):
+        pool.acquire()
+    assert clock.slept == []
+
+# ------------------------------
+# Against the fake GitHub API
+# ------------------------------
+REPO = "octo/demo"
+
+def _client(base_url, tmp_path, tokens, clock, **pool_options):
+    pool = TokenPool(tokens, clock=clock, sleep=clock.sleep, **pool_options)
+    return GitHubClient(tokens, base_url=base_url, cache=EtagCache(str(tmp_path / "http")),
+                        pool_size=2, token_pool=pool, sleep=clock.sleep)
+
+def test_tokens_rotate_before_the_server_refuses(tmp_path):
+    clock = FakeClock()
+    server, base_url = start_fake_api(repos=[REPO], n_issues=2500, n_commits=0, limit=30)
+    try:
+        client = _client(base_url, tmp_path, ["t1", "t2"], clock, pace_below=0)
+        results, failed = fetch_all([REPO], None, None, client=client, workers=1, report=False)
+    finally:
+        server.shutdown()
+    assert not failed
+    assert len(results[(REPO, "issues")]) == 2500
+    assert server.api.stats["rate_limited"] == 0
+    assert all(t["requests"] > 0 for t in client.tokens.stats())
+
+def test_retry_after_is_honoured(tmp_path):
+    clock = FakeClock()
+    api = FakeGitHub(repos=[REPO], n_issues=1000, n_commits=0, secondary_rate=0.3, retry_after=7, seed=3)
+    server, base_url = start_fake_api(api)
+    try:
+        client = _client(base_url, tmp_path, ["t1"], clock)
+        results, failed = fetch_all([REPO], None, None, client=client, workers=1, report=False)
+    finally:
+        server.shutdown()
+    assert not failed
+    assert len(results[(REPO, "issues")]) == 1000
+    assert api.stats["secondary"] > 0
+    assert client.stats["rate_limited"] == api.stats["secondary"]
+    # Every 429 parked the only token for its Retry-After
+    assert sum(clock.slept) >= 7 * api.stats["secondary"]
+
+def test_checkpoint_resumes_after_the_last_loaded_page(tmp_path):
+    server, base_url = start_fake_api(repos=[REPO], n_issues=500, n_commits=0)
+    path = str(tmp_path / "checkpoint.json")
+    loaded = []
+
+    def crash_after_two_pages(repo, endpoint, page):
+        if endpoint == "issues" and len(loaded) == 200:
+            raise RuntimeError("loader crashed")
+        loaded.extend(r["number"] for r in page if endpoint == "issues")
+
+    try:
+        clock = FakeClock()
+        client = _client(base_url, tmp_path, ["t1"], clock)
+        checkpoint = FetchCheckpoint("db", path)
+        _, failed = fetch_all([REPO], None, None, client=client, workers=1, on_page=crash_after_two_pages,
+                              collect=False, checkpoint=checkpoint, report=False)
+        assert list(failed) == [(REPO, "issues")]
+        assert checkpoint.is_done(REPO, "repo_info")
+
+        requests_before = server.api.stats["requests"]
+        resumed = FetchCheckpoint("db", path)
+        assert resumed.resumed
+        _, failed = fetch_all([REPO], None, None, client=_client(base_url, tmp_path, ["t1"], clock), workers=1,
+                              on_page=lambda repo, endpoint, page: loaded.extend(r["number"] for r in page),
+                              collect=False, checkpoint=resumed, report=False)
+    finally:
+        server.shutdown()
+    assert not failed
+    assert loaded == list(range(1, 501))
+    # Pages 3-5 only; repo_info was already done
+    assert server.api.stats["requests"] - requests_before == 3
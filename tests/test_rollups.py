@@ -0,0 +1,93 @@
+import datetime as dt
+import pandas as pd
+import pytest
+import db_insert
+import rollups
+
+REPO_URL = "https://api.github.com/repos/octo/demo"
+OTHER_URL = "https://api.github.com/repos/octo/other"
+
+def _issue(id, created, closed=None, updated=None, repo_url=REPO_URL):
+    return {"id": id, "repository_url": repo_url, "number": id, "state": "closed" if closed else "open",
+            "created_at": created, "updated_at": updated or closed or created, "closed_at": closed}
+
+def _commit(sha, committed, repo="octo/demo"):
+    return {"sha": sha, "url": f"https://api.github.com/repos/{repo}/commits/{sha}", "committed_at": committed}
+
+def _rows(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT * FROM {table} ORDER BY 1, 2;")
+        return cur.fetchall()
+
+def _assert_matches_rebuild(conn):
+    incremental = {t: _rows(conn, t) for t in ("daily_issue_activity", "daily_commit_activity")}
+    rollups.rebuild(conn)
+    rebuilt = {t: _rows(conn, t) for t in incremental}
+    # A recount may leave a zero row behind where the rebuild has none
+    for table, rows in incremental.items():
+        assert [r for r in rows if any(r[2:])] == rebuilt[table], table
+    return incremental
+
+@pytest.fixture
+def db(pg_conn):
+    db_insert.create_tables(pg_conn)
+    return pg_conn
+
+def _counts(conn):
+    return {(repo, day): (created, closed) for repo, day, created, closed in _rows(conn, "daily_issue_activity")}
+
+def test_insert_update_and_reopen_match_rebuild(db):
+    db_insert.insert_issues(db, pd.DataFrame([
+        _issue(1, "2024-03-01T10:00:00Z"),
+        _issue(2, "2024-03-01T12:00:00Z", closed="2024-03-03T09:00:00Z"),
+        _issue(3, "2024-03-02T08:00:00Z", repo_url=OTHER_URL),
+    ]))
+    _assert_matches_rebuild(db)
+    day = dt.date.fromisoformat
+    assert _counts(db)[("octo/demo", day("2024-03-03"))] == (0, 1)
+
+    # Update: issue 1 gets closed
+    db_insert.insert_issues(db, pd.DataFrame([_issue(1, "2024-03-01T10:00:00Z", closed="2024-03-04T10:00:00Z")]))
+    _assert_matches_rebuild(db)
+    assert _counts(db)[("octo/demo", day("2024-03-04"))] == (0, 1)
+
+    # Reopen: the old closed day must lose its count
+    db_insert.insert_issues(db, pd.DataFrame([
+        _issue(2, "2024-03-01T12:00:00Z", updated="2024-03-05T09:00:00Z"),
+    ]))
+    _assert_matches_rebuild(db)
+    assert _counts(db).get(("octo/demo", day("2024-03-03")), (0, 0)) == (0, 0)
+
+    # Reopened and closed again on another day
+    db_insert.insert_issues(db, pd.DataFrame([
+        _issue(2, "2024-03-01T12:00:00Z", closed="2024-03-06T09:00:00Z"),
+    ]))
+    _assert_matches_rebuild(db)
+    assert _counts(db)[("octo/demo", day("2024-03-06"))] == (0, 1)
+
+def test_issue_days_are_utc_days(db):
+    # 23:30 in New York on the 1st is already the 2nd in UTC
+    db_insert.insert_issues(db, pd.DataFrame([
+        _issue(1, "2024-03-01T23:30:00-05:00", closed="2024-03-02T00:30:00+02:00"),
+    ]))
+    _assert_matches_rebuild(db)
+    day = dt.date.fromisoformat
+    assert _counts(db) == {("octo/demo", day("2024-03-02")): (1, 0), ("octo/demo", day("2024-03-01")): (0, 1)}
+
+def test_commit_days_are_utc_days_whatever_the_session_zone(db):
+    with db.cursor() as cur:
+        cur.execute("SET TIME ZONE 'America/New_York';")
+    db_insert.insert_commits(db, pd.DataFrame([
+        _commit("a1", "2024-03-01T23:30:00-05:00"),
+        _commit("a2", "2024-03-02T01:00:00Z"),
+        _commit("b1", "2024-03-01T10:00:00Z", repo="octo/other"),
+    ]))
+    incremental = _assert_matches_rebuild(db)
+    assert incremental["daily_commit_activity"] == [
+        ("octo/demo", dt.date(2024, 3, 2), 2),
+        ("octo/other", dt.date(2024, 3, 1), 1),
+    ]
+
+    db_insert.insert_commits(db, pd.DataFrame([_commit("a3", "2024-03-02T20:00:00-05:00")]))
+    _assert_matches_rebuild(db)
+    assert ("octo/demo", dt.date(2024, 3, 3), 1) in _rows(db, "daily_commit_activity")
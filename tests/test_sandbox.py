@@ -0,0 +1,83 @@
+import time
+import pytest
+from agents.sandbox import SandboxPool, execute_script, resource
+
+def _kinds(code):
+    result = execute_script(code)
+    assert result["error"] is None, result["stdout"]
+    return [kind for kind, _ in result["outputs"]]
+
+def test_display_calls_are_recorded_in_order():
+    code = """
+import streamlit as st
+import pandas as pd
+import matplotlib.pyplot as plt
+
+st.title("Report")
+st.caption("forecast predates the latest data")
+st.dataframe(pd.DataFrame({"repo": ["a/b"], "stars": [3]}))
+fig, ax = plt.subplots()
+ax.plot([1, 2, 3])
+st.pyplot(fig)
+st.divider()
+st.metric("Stars", 3)
+"""
+    assert _kinds(code) == ["markdown", "caption", "dataframe", "image", "divider", "markdown"]
+
+def test_layout_helpers_record_into_the_same_list():
+    code = """
+import streamlit as st
+left, right = st.columns(2)
+with left:
+    st.write("left")
+right.info("right")
+with st.expander("more"):
+    st.text("inside")
+st.sidebar.warning("side")
+st.set_page_config(layout="wide")
+"""
+    assert _kinds(code) == ["markdown", "info", "text", "warning"]
+
+def test_unclosed_figures_are_still_shown():
+    code = """
+import matplotlib.pyplot as plt
+plt.plot([1, 2, 3])
+"""
+    assert _kinds(code) == ["image"]
+
+def test_script_errors_are_returned():
+    result = execute_script("print('before')\nraise ValueError('boom')")
+    assert result["error"] == "ValueError: boom"
+    assert "before" in result["stdout"]
+
+def test_memory_error_is_tagged_as_a_limit():
+    result = execute_script("data = [0] * 10\nraise MemoryError()")
+    assert result["limit"] == "memory"
+    assert result["error"].startswith("MemoryError")
+
+@pytest.mark.skipif(resource is None, reason="needs POSIX rlimits")
+def test_worker_reports_its_memory_limit():
+    pool = SandboxPool(size=1, memory_mb=2048, wall_seconds=60, warm_modules=[])
+    try:
+        result = pool.run("block = bytearray(8 * 1024 ** 3)")
+        assert result["limit"] == "memory"
+        assert result["error"] == "Memory limit exceeded (2048 MB)"
+        assert pool.stats["restarted"] == 1
+        # The replacement worker runs the next script normally
+        assert pool.run("print('ok')")["stdout"].strip() == "ok"
+    finally:
+        pool.close()
+
+def test_cancel_kills_the_worker_running_the_script():
+    pool = SandboxPool(size=1, wall_seconds=60, warm_modules=[])
+    try:
+        pool.warm_up()
+        deadline = time.monotonic() + 0.5
+        start = time.monotonic()
+        result = pool.run("while True:\n    pass", cancelled=lambda: time.monotonic() > deadline)
+        assert result["limit"] == "cancelled"
+        assert time.monotonic() - start < 5
+        assert pool.stats == {"runs": 1, "killed": 1, "restarted": 1}
+        assert pool.run("print('ok')")["stdout"].strip() == "ok"
+    finally:
+        pool.close()
@@ -0,0 +1,47 @@
+import pytest
+from agents.table_router import TableRouter
+
+# The Readme's test queries and the table each one needs
+README_QUERIES = [
+    ("Which repository has the most issues created in the last 2 months?", ["issues"]),
+    ("Create a table showing the total number of issues created on Monday, Tuesday, Wednesday, Thursday, "
+     "Friday, Saturday, and Sunday for every repository.", ["issues"]),
+    ("Which day of the week has the highest number of issues created across all repositories?", ["issues"]),
+    ("Which day of the week has the highest number of issues closed across all repositories?", ["issues"]),
+    ("Plot a line chart showing the total number of issues created over time for all repositories.", ["issues"]),
+    ("Create a pie chart showing the percentage distribution of issues created among all repositories.", ["issues"]),
+    ("Create a bar chart showing the number of stars for each repository.", ["repo_info"]),
+    ("Create a bar chart showing the number of forks for each repository.", ["repo_info"]),
+    ("Create a weekly bar chart showing the number of issues closed for each repository.", ["issues"]),
+    ("Create a stacked bar chart showing issues created and issues closed for each repository.", ["issues"]),
+    ("Use Prophet to forecast the number of issues created for each repository over the next 30 days.", ["issues"]),
+    ("Use Prophet to forecast the number of issues closed for each repository over the next 30 days.", ["issues"]),
+    ("Use Statsmodels to forecast the number of pull requests for each repository over the next 30 days.", ["commits"]),
+    ("Use Statsmodels to forecast the number of commits for each repository over the next 30 days.", ["commits"]),
+]
+
+@pytest.fixture(scope="module")
+def router(tmp_path_factory):
+    return TableRouter(backend="hashing", cache_file=str(tmp_path_factory.mktemp("router") / "emb.npz"))
+
+@pytest.mark.parametrize("query, tables", README_QUERIES)
+def test_readme_queries_reach_their_table(router, query, tables):
+    assert router.route(query) == tables
+
+def test_join_question_gets_every_table_it_names(router):
+    assert set(router.route("Compare commit activity with star counts per repository")) == {"commits", "repo_info"}
+    assert set(router.route("Which repositories have the most stars and the most open issues?")) == {"issues", "repo_info"}
+
+def test_keyword_boost_can_be_turned_off(tmp_path):
+    plain = TableRouter(backend="hashing", cache_file=str(tmp_path / "emb.npz"), keyword_boost=0)
+    query = README_QUERIES[3][0]
+    assert plain.named_tables(query) == {"issues"}
+    boosted = TableRouter(backend="hashing", cache_file=str(tmp_path / "emb.npz"))
+    assert boosted.scores(query)["issues"] == pytest.approx(plain.scores(query)["issues"] + 0.3, abs=1e-3)
+
+def test_embeddings_are_cached_on_disk(tmp_path):
+    path = tmp_path / "emb.npz"
+    first = TableRouter(backend="hashing", cache_file=str(path))
+    assert path.exists()
+    second = TableRouter(backend="hashing", cache_file=str(path))
+    assert (first.matrix == second.matrix).all()